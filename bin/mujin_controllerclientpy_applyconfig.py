@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import sys
 import six
 import copy
 import json
@@ -8,6 +9,7 @@ import argparse
 import tempfile
 import subprocess
 from mujincontrollerclient.controllerclientbase import ControllerClient
+from mujincontrollerclient import fleetutils
 
 import logging
 log = logging.getLogger(__name__)
@@ -187,6 +189,23 @@ def _ApplyTemplate(config, template, preservedpaths=None):
     return newconfig
 
 
+def _ApplyConfigOnController(url, username, password, template, preservedpaths=None, dryrun=False):
+    """Applies template on one controller without prompting. Used in fleet mode, so the diff is not printed to avoid interleaving output between controllers.
+    """
+    client = ControllerClient(url, *fleetutils.GetCredentialsForHost(url, username, password))
+    client.Ping()
+    config = client.GetConfig()
+
+    # _ApplyTemplate extends preservedpaths, so give each controller its own copy
+    newconfig = _ApplyTemplate(config, template, preservedpaths=list(preservedpaths) if preservedpaths is not None else None)
+    if config == newconfig:
+        return 'already up-to-date'
+    if dryrun:
+        return 'would change'
+    client.SetConfig(newconfig)
+    return 'applied'
+
+
 def _RunMain():
     parser = argparse.ArgumentParser(description='Apply configuration on controller from template')
     parser.add_argument('--loglevel', action='store', type=str, dest='loglevel', default=None, help='the python log level, e.g. DEBUG, VERBOSE, ERROR, INFO, WARNING, CRITICAL [default=%(default)s]')
@@ -199,6 +218,7 @@ def _RunMain():
     parser.add_argument('--force', action='store_true', dest='force', default=False, help='apply without confirmation [default=%(default)s]')
     parser.add_argument('--dryrun', action='store_true', dest='dryrun', default=False, help='shows differences and quit [default=%(default)s]')
     parser.add_argument('--oneline', action='store_true', dest='oneline', default=False, help='shows each difference in one line [default=%(default)s]')
+    fleetutils.AddFleetArguments(parser)
     options = parser.parse_args()
 
     # configure logging
@@ -222,6 +242,22 @@ def _RunMain():
                 if line:
                     preservedpaths.append(line)
 
+    # apply on all controllers in the hosts file
+    if options.hostsfile:
+        if not options.force and not options.dryrun:
+            log.error('need to supply either --force or --dryrun when using --hostsfile')
+            sys.exit(1)
+        results = fleetutils.RunOnFleet(
+            fleetutils.ReadHostsFile(options.hostsfile),
+            lambda url: _ApplyConfigOnController(url, options.username, options.password, template, preservedpaths=preservedpaths, dryrun=options.dryrun),
+            maxworkers=options.maxworkers,
+            hosttimeout=options.hosttimeout,
+            ratelimit=options.ratelimit,
+        )
+        if not fleetutils.LogFleetReport(results):
+            sys.exit(1)
+        return
+
     # construct client
     if options.controller:
         client = ControllerClient('http://%s' % options.controller, options.username, options.password)
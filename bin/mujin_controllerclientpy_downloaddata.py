@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 
 import logging
 log = logging.getLogger(__name__)
@@ -21,13 +22,17 @@ def _ParseArguments():
     parser.add_argument('--username', type=str, default='mujin', help='Username to login with (default: %(default)s)')
     parser.add_argument('--password', type=str, default='mujin', help='Password to login with (default: %(default)s)')
     parser.add_argument('--timeout', type=float, default=600, help='Timeout in seconds (default: %(default)s)')
+    from mujincontrollerclient import fleetutils
+    fleetutils.AddFleetArguments(parser)
     return parser.parse_args()
 
 def _CreateControllerClient(url, username, password):
-    from mujincontrollerclient import controllerclientbase
+    from mujincontrollerclient import controllerclientbase, fleetutils
 
     # create a controller client for the controller
-    log.info('connecting to %s', url) 
+    log.info('connecting to %s', fleetutils.RemoveCredentialsFromHost(url))
+    # credentials embedded in url take precedence over the command line ones
+    username, password = fleetutils.GetCredentialsForHost(url, username, password)
     return controllerclientbase.ControllerClient(
         controllerurl=url,
         controllerusername=username,
@@ -57,7 +62,7 @@ def _GetScenes(controllerClient):
 
     return sceneList
 
-def _DownloadBackup(controllerClient, sceneList, timeout=600.0):
+def _DownloadBackup(controllerClient, sceneList, timeout=600.0, directoryPrefix=''):
     import re
     import tarfile
 
@@ -70,19 +75,37 @@ def _DownloadBackup(controllerClient, sceneList, timeout=600.0):
 
     # extract the response, use the name supplied by webstack
     archiveFilename = re.findall('filename=(.+)', response.headers['Content-Disposition'])[0].strip('"')
-    downloadDirectory = os.path.join(os.getcwd(), archiveFilename.rstrip('.tar.gz'))
+    downloadDirectory = os.path.join(os.getcwd(), directoryPrefix + archiveFilename.rstrip('.tar.gz'))
     log.info('downloading and saving data to: %s', downloadDirectory)
     with tarfile.open(fileobj=response.raw, mode='r|gz') as tar:
         tar.extractall(path=downloadDirectory)
     log.info('download completed, data saved to: %s', downloadDirectory)
+    return downloadDirectory
+
+def _DownloadData(url, username, password, timeout=600.0, directoryPrefix=''):
+    controllerClient = _CreateControllerClient(url, username, password)
+    sceneList = _GetScenes(controllerClient)
+    return _DownloadBackup(controllerClient, sceneList, timeout=timeout, directoryPrefix=directoryPrefix)
 
 def _Main():
     options = _ParseArguments()
     _ConfigureLogging(options.loglevel)
 
-    controllerClient = _CreateControllerClient(options.url, options.username, options.password)
-    sceneList = _GetScenes(controllerClient)
-    _DownloadBackup(controllerClient, sceneList, timeout=options.timeout)
+    if options.hostsfile:
+        from mujincontrollerclient import fleetutils
+        results = fleetutils.RunOnFleet(
+            fleetutils.ReadHostsFile(options.hostsfile),
+            # prefix the directories with the host, since controllers can name their backups the same
+            lambda url: _DownloadData(url, options.username, options.password, timeout=options.timeout, directoryPrefix='%s-' % fleetutils.GetHostName(url).replace(':', '-')),
+            maxworkers=options.maxworkers,
+            hosttimeout=options.hosttimeout,
+            ratelimit=options.ratelimit,
+        )
+        if not fleetutils.LogFleetReport(results):
+            sys.exit(1)
+        return
+
+    _DownloadData(options.url, options.username, options.password, timeout=options.timeout)
 
 if __name__ == "__main__":
     _Main()
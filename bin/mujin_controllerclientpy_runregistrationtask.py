@@ -1,53 +1,25 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import sys
 import json
 import time
+import six
 import datetime
 import argparse
 from mujincontrollerclient.controllerclientbase import ControllerClient
 from mujincontrollerclient import uriutils
+from mujincontrollerclient import fleetutils
 
 import logging
 log = logging.getLogger(__name__)
 
 
-def _RunMain():
-    parser = argparse.ArgumentParser(description='Run registration task on remote controller')
-    parser.add_argument('--logLevel', action='store', type=str, dest='logLevel', default='INFO', help='the python log level, e.g. DEBUG, VERBOSE, ERROR, INFO, WARNING, CRITICAL [default=%(default)s]')
-    parser.add_argument('--controllerUrl', action='store', type=str, dest='controllerUrl', required=True, help='controller url e.g http://controller123 [default=%(default)s]')
-    parser.add_argument('--controllerUsername', action='store', type=str, dest='controllerUsername', default='mujin', help='controller username [default=%(default)s]')
-    parser.add_argument('--controllerPassword', action='store', type=str, dest='controllerPassword', default='mujin', help='controller password [default=%(default)s]')
-    parser.add_argument('--scenepk', action='store', type=str, dest='scenepk', default=None, help='scene primary key, if not specified, will determine from remote system [default=%(default)s]')
-    parser.add_argument('--ftpHost', action='store', type=str, dest='ftpHost', required=True, help='ftp server hostname or ip address [default=%(default)s]')
-    parser.add_argument('--ftpPort', action='store', type=int, dest='ftpPort', default=21, help='ftp server port [default=%(default)r]')
-    parser.add_argument('--ftpUsername', action='store', type=str, dest='ftpUsername', default='anonymous', help='ftp username [default=%(default)s]')
-    parser.add_argument('--ftpPassword', action='store', type=str, dest='ftpPassword', default='', help='ftp password [default=%(default)s]')
-    parser.add_argument('--ftpPath', action='store', type=str, dest='ftpPath', default='', help='path on ftp server, if not supplied, will use home directory of the user [default=%(default)s]')
-    parser.add_argument('--syncMasterFile', action='store', type=str, dest='syncMasterFile', default=None, help='if supplied, will sync this master file on FTP, e.g. /somewhere/masterfile.txt [default=%(default)s]')
-    parser.add_argument('--backup', action='store_true', dest='backup', default=False, help='backup registration objects to ftp [default=%(default)s]')
-    parser.add_argument('--outputFilename', action='store', type=str, dest='outputFilename', default=None, help='If supplied, will output to file specified, otherwise file will be named after task name [default=%(default)s]')
-    options = parser.parse_args()
-
-    # configure logging
-    try:
-        from mujincommon import ConfigureRootLogger
-        ConfigureRootLogger(level=options.logLevel)
-    except ImportError:
-        logging.basicConfig(format='%(asctime)s %(name)s [%(levelname)s] [%(filename)s:%(lineno)s %(funcName)s] %(message)s', level=options.logLevel)
-
-
+def _RunRegistrationTask(controllerUrl, options, command, taskName, outputFilename):
     taskType = 'registration'
-    command = None
-    if options.syncMasterFile:
-        command = 'SyncMasterFile'
-    elif options.backup:
-        command = 'Backup'
-    else:
-        raise Exception('Have to sepecify either --syncMasterFile or --backup')
-    taskName = 'registration-%s-%s' % (command.lower(), datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
 
-    controllerclient = ControllerClient(options.controllerUrl, options.controllerUsername, options.controllerPassword)
+    controllerclient = ControllerClient(controllerUrl, *fleetutils.GetCredentialsForHost(controllerUrl, options.controllerUsername, options.controllerPassword))
     controllerclient.Ping()
 
     # cancel previous jobs
@@ -56,16 +28,17 @@ def _RunMain():
             controllerclient.DeleteJob(job['pk'])
 
     # determine scenepk
-    if options.scenepk is None:
-        options.scenepk = uriutils.GetPrimaryKeyFromURI(controllerclient.GetConfig()['sceneuri'])
+    scenepk = options.scenepk
+    if scenepk is None:
+        scenepk = uriutils.GetPrimaryKeyFromURI(controllerclient.GetConfig()['sceneuri'])
 
     # delete previous task
-    for task in controllerclient.GetSceneTasks(options.scenepk):
+    for task in controllerclient.GetSceneTasks(scenepk):
         if task['tasktype'] == taskType:
-            controllerclient.DeleteSceneTask(options.scenepk, task['pk'])
+            controllerclient.DeleteSceneTask(scenepk, task['pk'])
 
     # create task
-    task = controllerclient.CreateSceneTask(options.scenepk, {
+    task = controllerclient.CreateSceneTask(scenepk, {
         'tasktype': taskType,
         'name': taskName,
         'taskparameters': {
@@ -87,7 +60,7 @@ def _RunMain():
 
     # run task async
     jobpk = controllerclient._webclient.APICall('POST', 'job/', data={
-        'scenepk': options.scenepk,
+        'scenepk': scenepk,
         'target_pk': taskpk,
         'resource_type': 'task',
     }, expectedStatusCode=200)['jobpk']
@@ -131,7 +104,7 @@ def _RunMain():
     result = None
     startTime = time.time()
     while True:
-        task = controllerclient.GetSceneTask(options.scenepk, taskpk)
+        task = controllerclient.GetSceneTask(scenepk, taskpk)
         if len(task['binpickingresults']) > 0:
             result = controllerclient.GetBinpickingResult(task['binpickingresults'][0]['pk'])
             break
@@ -139,12 +112,69 @@ def _RunMain():
             raise Exception('Timed out waiting for task result')
 
     # write result
-    if not options.outputFilename:
-        options.outputFilename = '%s.json' % taskName
-    with open(options.outputFilename, 'w') as f:
+    with open(outputFilename, 'w') as f:
         json.dump(result, f, ensure_ascii=False, indent=2, separators=(',', ': '), sort_keys=True)
         f.write('\n')
-    log.info('result written to: %s', options.outputFilename)
+    log.info('result written to: %s', outputFilename)
+    return outputFilename
+
+
+def _RunMain():
+    parser = argparse.ArgumentParser(description='Run registration task on remote controller')
+    parser.add_argument('--logLevel', action='store', type=str, dest='logLevel', default='INFO', help='the python log level, e.g. DEBUG, VERBOSE, ERROR, INFO, WARNING, CRITICAL [default=%(default)s]')
+    parser.add_argument('--controllerUrl', action='store', type=str, dest='controllerUrl', default=None, help='controller url e.g http://controller123, required unless --hostsfile is specified [default=%(default)s]')
+    parser.add_argument('--controllerUsername', action='store', type=str, dest='controllerUsername', default='mujin', help='controller username [default=%(default)s]')
+    parser.add_argument('--controllerPassword', action='store', type=str, dest='controllerPassword', default='mujin', help='controller password [default=%(default)s]')
+    parser.add_argument('--scenepk', action='store', type=str, dest='scenepk', default=None, help='scene primary key, if not specified, will determine from remote system [default=%(default)s]')
+    parser.add_argument('--ftpHost', action='store', type=str, dest='ftpHost', required=True, help='ftp server hostname or ip address [default=%(default)s]')
+    parser.add_argument('--ftpPort', action='store', type=int, dest='ftpPort', default=21, help='ftp server port [default=%(default)r]')
+    parser.add_argument('--ftpUsername', action='store', type=str, dest='ftpUsername', default='anonymous', help='ftp username [default=%(default)s]')
+    parser.add_argument('--ftpPassword', action='store', type=str, dest='ftpPassword', default='', help='ftp password [default=%(default)s]')
+    parser.add_argument('--ftpPath', action='store', type=str, dest='ftpPath', default='', help='path on ftp server, if not supplied, will use home directory of the user [default=%(default)s]')
+    parser.add_argument('--syncMasterFile', action='store', type=str, dest='syncMasterFile', default=None, help='if supplied, will sync this master file on FTP, e.g. /somewhere/masterfile.txt [default=%(default)s]')
+    parser.add_argument('--backup', action='store_true', dest='backup', default=False, help='backup registration objects to ftp [default=%(default)s]')
+    parser.add_argument('--outputFilename', action='store', type=str, dest='outputFilename', default=None, help='If supplied, will output to file specified, otherwise file will be named after task name [default=%(default)s]')
+    fleetutils.AddFleetArguments(parser)
+    options = parser.parse_args()
+
+    # configure logging
+    try:
+        from mujincommon import ConfigureRootLogger
+        ConfigureRootLogger(level=options.logLevel)
+    except ImportError:
+        logging.basicConfig(format='%(asctime)s %(name)s [%(levelname)s] [%(filename)s:%(lineno)s %(funcName)s] %(message)s', level=options.logLevel)
+
+
+    command = None
+    if options.syncMasterFile:
+        command = 'SyncMasterFile'
+    elif options.backup:
+        command = 'Backup'
+    else:
+        raise Exception('Have to sepecify either --syncMasterFile or --backup')
+    taskName = 'registration-%s-%s' % (command.lower(), datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+
+    if options.hostsfile:
+        def _RunOnHost(controllerUrl):
+            # name the output after each controller so that results do not overwrite each other
+            hostname = six.moves.urllib.parse.urlparse(controllerUrl).hostname
+            root, ext = os.path.splitext(options.outputFilename or '%s.json' % taskName)
+            return _RunRegistrationTask(controllerUrl, options, command, taskName, '%s-%s%s' % (root, hostname, ext))
+
+        results = fleetutils.RunOnFleet(
+            fleetutils.ReadHostsFile(options.hostsfile),
+            _RunOnHost,
+            maxworkers=options.maxworkers,
+            hosttimeout=options.hosttimeout,
+            ratelimit=options.ratelimit,
+        )
+        if not fleetutils.LogFleetReport(results):
+            sys.exit(1)
+        return
+
+    if not options.controllerUrl:
+        raise Exception('Have to specify either --controllerUrl or --hostsfile')
+    _RunRegistrationTask(options.controllerUrl, options, command, taskName, options.outputFilename or '%s.json' % taskName)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks the transport and serialization hot paths of the client against a local FakeController and saves the results as json, to compare client versions. Run with python/ in PYTHONPATH, e.g.
+
+    PYTHONPATH=python devbin/mujin_controllerclientpy_benchmark.py --output before.json
+    PYTHONPATH=python devbin/mujin_controllerclientpy_benchmark.py --output after.json --compare before.json
+"""
+
+import os
+import sys
+import time
+import json
+import platform
+import threading
+import subprocess
+
+import logging
+log = logging.getLogger(__name__)
+
+_benchmarkNames = ['zmqroundtrip', 'fireandforget', 'apicall', 'graphql', 'stringifyqueryfields', 'uriutils', 'importtime']
+
+
+def _ConfigureLogging(level=None):
+    try:
+        import mujincommon
+        mujincommon.ConfigureRootLogger(level=level)
+    except ImportError:
+        logging.basicConfig(format='%(levelname)s %(name)s: %(funcName)s, %(message)s', level=logging.DEBUG)
+
+
+def _ParseArguments():
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the transport and serialization hot paths of the client against a local fake controller and save the results as json')
+    parser.add_argument('--loglevel', type=str, default=None, help='The python log level, e.g. DEBUG, VERBOSE, ERROR, INFO, WARNING, CRITICAL (default: %(default)s)')
+    parser.add_argument('--benchmarks', type=str, default=','.join(_benchmarkNames), help='Comma separated benchmarks to run (default: %(default)s)')
+    parser.add_argument('--numcommands', type=int, default=2000, help='Number of commands or requests per measurement (default: %(default)s)')
+    parser.add_argument('--responsesizes', type=str, default='0,10000,1000000', help='Comma separated response payload sizes in bytes of the zmq round trip benchmark (default: %(default)s)')
+    parser.add_argument('--poolsizes', type=str, default='1,4,10', help='Comma separated http connection pool sizes, one thread per connection (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of times each cpu bound operation is measured, the best time is reported (default: %(default)s)')
+    parser.add_argument('--output', type=str, default=None, help='Filename of the json results. Defaults to mujin_controllerclientpy_benchmark-<version>-<time>.json (default: %(default)s)')
+    parser.add_argument('--compare', type=str, default=None, help='Filename of previous json results to compare with (default: %(default)s)')
+    return parser.parse_args()
+
+
+def _Measure(repeat, fn, *args):
+    besttime = None
+    for index in range(repeat):
+        starttime = time.time()
+        result = fn(*args)
+        elapsedtime = time.time() - starttime
+        if besttime is None or elapsedtime < besttime:
+            besttime = elapsedtime
+    return besttime, result
+
+
+def _SummarizeLatencies(histogram, elapsedtime):
+    summary = histogram.GetSnapshot()
+    summary['throughput'] = histogram.count / elapsedtime if elapsedtime > 0 else None
+    return summary
+
+
+def _BenchmarkZmqRoundTrip(controller, options):
+    from mujincontrollerclient import metrics, zmqclient
+    results = {}
+    for responsesize in [int(size) for size in options.responsesizes.split(',')]:
+        controller.responsesize = responsesize
+        client = zmqclient.ZmqClient('127.0.0.1', controller.taskzmqport)
+        try:
+            command = {'fnname': 'RunCommand', 'taskparams': {'taskparameters': {'command': 'GetState'}}}
+            client.SendCommand(command, timeout=10)  # warm up the connection
+            histogram = metrics.LatencyHistogram()
+            numcommands = max(10, options.numcommands // max(1, responsesize // 10000))
+            starttime = time.time()
+            for index in range(numcommands):
+                commandstarttime = time.time()
+                client.SendCommand(command, timeout=10)
+                histogram.Record(time.time() - commandstarttime)
+            results['%dbytes' % responsesize] = _SummarizeLatencies(histogram, time.time() - starttime)
+        finally:
+            client.Destroy()
+    controller.responsesize = 0
+    return results
+
+
+def _BenchmarkFireAndForget(controller, options):
+    from mujincontrollerclient import zmqclient
+    client = zmqclient.ZmqClient('127.0.0.1', controller.taskzmqport)
+    try:
+        command = {'fnname': 'RunCommand', 'taskparams': {'taskparameters': {'command': 'SetJogModeVelocities'}}}
+        starttime = time.time()
+        for index in range(options.numcommands):
+            client.SendCommand(command, timeout=10, fireandforget=True)
+        sendtime = time.time() - starttime
+        poolstatistics = client.GetPoolStatistics()
+
+        # time until a blocking command gets through behind the storm
+        drainstarttime = time.time()
+        client.SendCommand({'fnname': 'RunCommand', 'taskparams': {'taskparameters': {'command': 'GetState'}}}, timeout=60)
+        return {
+            'numcommands': options.numcommands,
+            'sendtime': sendtime,
+            'sendthroughput': options.numcommands / sendtime if sendtime > 0 else None,
+            'draintime': time.time() - drainstarttime,
+            'pool': poolstatistics,
+        }
+    finally:
+        client.Destroy()
+
+
+def _RunConcurrently(numthreads, numcalls, callfn):
+    """Calls callfn numcalls times from numthreads threads, returns the histogram of the latencies and the elapsed time
+    """
+    from mujincontrollerclient import metrics
+    histogram = metrics.LatencyHistogram()
+    lock = threading.Lock()
+    remaining = [numcalls]
+
+    def _RunThread():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            callstarttime = time.time()
+            callfn()
+            elapsedtime = time.time() - callstarttime
+            with lock:
+                histogram.Record(elapsedtime)
+
+    threads = [threading.Thread(target=_RunThread) for index in range(numthreads)]
+    starttime = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return histogram, time.time() - starttime
+
+
+def _BenchmarkWeb(controller, options, callfn):
+    import requests.adapters
+    from mujincontrollerclient import controllerclientraw
+    results = {}
+    for poolsize in [int(size) for size in options.poolsizes.split(',')]:
+        webclient = controllerclientraw.ControllerWebClient(controller.controllerurl, controller.username, controller.password)
+        # the client mounts default adapters, replace them to size the connection pool
+        webclient._session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=poolsize, pool_maxsize=poolsize, max_retries=3))
+        try:
+            callfn(webclient)  # warm up
+            histogram, elapsedtime = _RunConcurrently(poolsize, options.numcommands, lambda: callfn(webclient))
+            results['poolsize%d' % poolsize] = _SummarizeLatencies(histogram, elapsedtime)
+        finally:
+            webclient.Destroy()
+    return results
+
+
+def _BenchmarkAPICall(controller, options):
+    for index in range(20):
+        controller.SetResource('scene', 'scene%d.mujin.dae' % index, {'name': 'scene%d' % index, 'uri': 'mujin:/scene%d.mujin.dae' % index})
+    return _BenchmarkWeb(controller, options, lambda webclient: webclient.APICall('GET', 'scene/', params={'limit': 0, 'offset': 0}))
+
+
+def _BenchmarkGraphQL(controller, options):
+    from mujincontrollerclient import controllergraphclientutils
+    from mujincontrollerclient.controllergraphclient import ControllerGraphClient
+    queryFields = controllergraphclientutils._StringifyQueryFields(ControllerGraphClient.typeDatabase, 'Body')
+    query = 'query GetBody($bodyId: String!, $environmentId: String!) {\n    GetBody(bodyId: $bodyId, environmentId: $environmentId) %s\n}' % queryFields
+    return _BenchmarkWeb(controller, options, lambda webclient: webclient.CallGraphAPI(query, {'bodyId': 'body', 'environmentId': 'test'}))
+
+
+def _BenchmarkStringifyQueryFields(options):
+    from mujincontrollerclient import controllergraphclientutils
+    from mujincontrollerclient.controllergraphclient import ControllerGraphClient
+    typeDatabase = ControllerGraphClient.typeDatabase
+    results = {}
+    for typeName in sorted(typeDatabase):
+        besttime, queryFields = _Measure(options.repeat, controllergraphclientutils._StringifyQueryFields, typeDatabase, typeName)
+        results[typeName] = {'time': besttime, 'querysize': len(queryFields)}
+    slowest = sorted(results.items(), key=lambda item: item[1]['time'], reverse=True)[:5]
+    for typeName, result in slowest:
+        log.info('slowest _StringifyQueryFields %s: %.3fms for %d characters', typeName, result['time'] * 1000, result['querysize'])
+    return {
+        'totaltime': sum(result['time'] for result in results.values()),
+        'types': results,
+    }
+
+
+def _BenchmarkURIUtils(options):
+    from mujincontrollerclient import uriutils
+    primaryKeys = [uriutils.GetPrimaryKeyFromFilename(u'テスト%d/box%d.mujin.dae' % (index, index)) for index in range(1000)]
+    uris = [uriutils.GetURIFromPrimaryKey(primaryKey) for primaryKey in primaryKeys]
+    conversions = [
+        ('GetURIFromPrimaryKey', uriutils.GetURIFromPrimaryKey, primaryKeys),
+        ('GetPrimaryKeyFromURI', uriutils.GetPrimaryKeyFromURI, uris),
+        ('GetFilenameFromURI', uriutils.GetFilenameFromURI, uris),
+        ('GetPartTypeFromURI', uriutils.GetPartTypeFromURI, uris),
+        ('GetFilenameFromPrimaryKey', uriutils.GetFilenameFromPrimaryKey, primaryKeys),
+    ]
+    results = {}
+    for name, convertfn, values in conversions:
+        besttime, _ = _Measure(options.repeat, lambda: [convertfn(value) for value in values])
+        results[name] = {'throughput': len(values) / besttime if besttime > 0 else None}
+    return results
+
+
+def _BenchmarkImportTime(options):
+    results = {}
+    for modulename in ['mujincontrollerclient', 'mujincontrollerclient.planningclient', 'mujincontrollerclient.binpickingcontrollerclient', 'mujincontrollerclient.controllergraphclient']:
+        times = []
+        for index in range(options.repeat):
+            # each import is measured in a new process, so that nothing is cached in sys.modules
+            output = subprocess.check_output([sys.executable, '-c', 'import time; starttime = time.time(); import %s; print(time.time() - starttime)' % modulename], env=os.environ)
+            times.append(float(output.decode('utf-8').strip().splitlines()[-1]))
+        times.sort()
+        results[modulename] = {'min': times[0], 'median': times[len(times) // 2]}
+    return results
+
+
+def _Compare(results, baseline, path=''):
+    """Logs the relative change of every number of results present in baseline
+    """
+    if isinstance(results, dict) and isinstance(baseline, dict):
+        for key in sorted(results):
+            if key in baseline:
+                _Compare(results[key], baseline[key], '%s.%s' % (path, key) if path else key)
+    elif isinstance(results, (int, float)) and isinstance(baseline, (int, float)) and not isinstance(results, bool) and baseline != 0:
+        log.info('%-80s %12.6g -> %12.6g (%+.1f%%)', path, baseline, results, (results - baseline) * 100.0 / baseline)
+
+
+def _Main():
+    options = _ParseArguments()
+    _ConfigureLogging(options.loglevel)
+    # logging every request would dominate the measurements
+    for loggername in ['urllib3', 'mujintestcontrollerclient', 'mujincontrollerclient.zmqclient']:
+        logging.getLogger(loggername).setLevel(logging.WARNING)
+
+    import mujincontrollerclient
+    from mujincontrollerclient import jsoncodec
+    from mujintestcontrollerclient.fakecontroller import FakeController
+
+    benchmarkNames = [name.strip() for name in options.benchmarks.split(',') if name.strip()]
+    for name in benchmarkNames:
+        if name not in _benchmarkNames:
+            raise ValueError('unknown benchmark %r, expected one of %s' % (name, ', '.join(_benchmarkNames)))
+
+    results = {}
+    with FakeController() as controller:
+        benchmarks = {
+            'zmqroundtrip': lambda: _BenchmarkZmqRoundTrip(controller, options),
+            'fireandforget': lambda: _BenchmarkFireAndForget(controller, options),
+            'apicall': lambda: _BenchmarkAPICall(controller, options),
+            'graphql': lambda: _BenchmarkGraphQL(controller, options),
+            'stringifyqueryfields': lambda: _BenchmarkStringifyQueryFields(options),
+            'uriutils': lambda: _BenchmarkURIUtils(options),
+            'importtime': lambda: _BenchmarkImportTime(options),
+        }
+        for name in benchmarkNames:
+            log.info('running benchmark %s', name)
+            results[name] = benchmarks[name]()
+
+    report = {
+        'version': mujincontrollerclient.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'jsoncodec': jsoncodec.GetCodecName(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'options': vars(options),
+        'results': results,
+    }
+    output = options.output or 'mujin_controllerclientpy_benchmark-%s-%s.json' % (mujincontrollerclient.__version__, time.strftime('%Y%m%d-%H%M%S'))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    log.info('saved results to %s', output)
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        log.info('comparing with version %s from %s', baseline.get('version'), options.compare)
+        _Compare(results, baseline.get('results', {}))
+
+
+if __name__ == "__main__":
+    _Main()
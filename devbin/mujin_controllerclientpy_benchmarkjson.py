@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import random
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _ConfigureLogging(level=None):
+    try:
+        import mujincommon
+        mujincommon.ConfigureRootLogger(level=level)
+    except ImportError:
+        logging.basicConfig(format='%(levelname)s %(name)s: %(funcName)s, %(message)s', level=logging.DEBUG)
+
+
+def _ParseArguments():
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare the json codecs supported by jsoncodec on representative payloads')
+    parser.add_argument('--loglevel', type=str, default=None, help='The python log level, e.g. DEBUG, VERBOSE, ERROR, INFO, WARNING, CRITICAL (default: %(default)s)')
+    parser.add_argument('--codecs', type=str, default=None, help='Comma separated codecs to compare, e.g. orjson,ujson,json. Defaults to all installed codecs (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of times each operation is measured, the best time is reported (default: %(default)s)')
+    return parser.parse_args()
+
+
+def _GenerateEnvState(numobjects=500):
+    """Similar to the state sent by UpdateObjects
+    """
+    return [{
+        'name': 'detected_%d' % index,
+        'object_uri': u'mujin:/box%d.mujin.dae' % (index % 10),
+        'quaternion': [random.random() for _ in range(4)],
+        'translation_': [random.uniform(-1000, 1000) for _ in range(3)],
+        'isPickable': index % 3 != 0,
+        'dofvalues': [],
+        'confidence': {'global_confidence': random.random()},
+        'sensortimestamp': 1700000000000 + index,
+    } for index in range(numobjects)]
+
+
+def _GenerateTrajectoryLog(numtrajectories=10, numpoints=2000, dof=7):
+    """Similar to the response of GetTrajectoryLog with includejointvalues
+    """
+    trajectories = []
+    for index in range(numtrajectories):
+        timedjointvalues = []
+        for ipoint in range(numpoints):
+            timedjointvalues += [random.uniform(-3.14, 3.14) for _ in range(dof)] + [ipoint * 0.004]
+        trajectories.append({
+            'timestarted': 1700000000000 + index * 1000,
+            'name': 'movingtodest',
+            'numpoints': numpoints,
+            'duration': numpoints * 0.004,
+            'timedjointvalues': timedjointvalues,
+        })
+    return {'total': numtrajectories, 'trajectories': trajectories}
+
+
+def _GenerateEnvironmentGraph(numbodies=50, numlinks=8, numgeometries=4):
+    """Similar to the response of a graph api ListEnvironments query with bodies, links and geometries
+    """
+    return {'ListEnvironments': {'environments': [{
+        'id': 'scene.mujin.msgpack',
+        'name': u'シーン',
+        'bodies': [{
+            'id': 'body%d' % ibody,
+            'name': 'body%d' % ibody,
+            'transform': [random.random() for _ in range(7)],
+            'links': [{
+                'id': 'link%d' % ilink,
+                'name': 'link%d' % ilink,
+                'transform': [random.random() for _ in range(7)],
+                'geometries': [{
+                    'id': 'geometry%d' % igeometry,
+                    'type': 'box',
+                    'halfExtents': [random.uniform(1, 100) for _ in range(3)],
+                    'transform': [random.random() for _ in range(7)],
+                    'visible': True,
+                } for igeometry in range(numgeometries)],
+            } for ilink in range(numlinks)],
+        } for ibody in range(numbodies)],
+    }]}}
+
+
+def _Measure(repeat, fn, *args):
+    besttime = None
+    for index in range(repeat):
+        starttime = time.time()
+        result = fn(*args)
+        elapsedtime = time.time() - starttime
+        if besttime is None or elapsedtime < besttime:
+            besttime = elapsedtime
+    return besttime, result
+
+
+def _Main():
+    options = _ParseArguments()
+    _ConfigureLogging(options.loglevel)
+
+    from mujincontrollerclient import jsoncodec
+
+    codecnames = options.codecs.split(',') if options.codecs else jsoncodec.GetAvailableCodecs()
+    payloads = [
+        ('envstate', _GenerateEnvState()),
+        ('trajectorylog', _GenerateTrajectoryLog()),
+        ('environmentgraph', _GenerateEnvironmentGraph()),
+    ]
+    for payloadname, payload in payloads:
+        for codecname in codecnames:
+            if jsoncodec.SelectCodec([codecname]) != codecname:
+                log.warn('codec %s is not installed, skipping', codecname)
+                continue
+            dumpstime, data = _Measure(options.repeat, jsoncodec.Dumps, payload)
+            loadstime, _ = _Measure(options.repeat, jsoncodec.Loads, data)
+            log.info('%-16s %-6s size=%7.1fKB dumps=%7.2fms loads=%7.2fms', payloadname, codecname, len(data) / 1024.0, dumpstime * 1000, loadstime * 1000)
+
+
+if __name__ == "__main__":
+    _Main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _ConfigureLogging(level=None):
+    try:
+        import mujincommon
+        mujincommon.ConfigureRootLogger(level=level)
+    except ImportError:
+        logging.basicConfig(format='%(levelname)s %(name)s: %(funcName)s, %(message)s', level=logging.DEBUG)
+
+
+def _ParseArguments():
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare json and binary encodings of a triangle mesh')
+    parser.add_argument('--loglevel', type=str, default=None, help='The python log level, e.g. DEBUG, VERBOSE, ERROR, INFO, WARNING, CRITICAL (default: %(default)s)')
+    parser.add_argument('--numtriangles', type=int, default=1000000, help='Approximate number of triangles of the generated mesh (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of times each encoding is measured, the best time is reported (default: %(default)s)')
+    return parser.parse_args()
+
+
+def _GenerateGridMesh(numtriangles):
+    """Generates a wavy grid with about numtriangles triangles
+    """
+    import numpy
+    size = max(2, int((numtriangles // 2) ** 0.5) + 1)
+    x, y = numpy.meshgrid(numpy.linspace(0, 1000, size), numpy.linspace(0, 1000, size))
+    vertices = numpy.stack([x.ravel(), y.ravel(), 10 * numpy.sin(x.ravel() / 50.0)], axis=1)
+    corners = (numpy.arange(size - 1)[:, numpy.newaxis] * size + numpy.arange(size - 1)).ravel()
+    indices = numpy.concatenate([
+        numpy.stack([corners, corners + 1, corners + size], axis=1),
+        numpy.stack([corners + 1, corners + size + 1, corners + size], axis=1),
+    ]).astype(numpy.uint32)
+    return vertices, indices
+
+
+def _Measure(repeat, fn, *args):
+    besttime = None
+    for index in range(repeat):
+        starttime = time.time()
+        result = fn(*args)
+        elapsedtime = time.time() - starttime
+        if besttime is None or elapsedtime < besttime:
+            besttime = elapsedtime
+    return besttime, result
+
+
+def _Main():
+    options = _ParseArguments()
+    _ConfigureLogging(options.loglevel)
+
+    from mujincontrollerclient import json
+    from mujincontrollerclient import meshutils
+
+    vertices, indices = _GenerateGridMesh(options.numtriangles)
+    log.info('generated mesh with %d vertices and %d triangles', len(vertices), len(indices))
+
+    encodings = [
+        ('json', lambda: json.dumps(meshutils.EncodeGraphMeshInput(vertices, indices)), lambda data: meshutils.DecodeGraphMesh(json.loads(data))),
+        ('stl', lambda: meshutils.EncodeBinarySTL(vertices, indices), meshutils.DecodeBinarySTL),
+        ('packed', lambda: meshutils.EncodePackedMesh(vertices, indices), meshutils.DecodePackedMesh),
+    ]
+    for name, encode, decode in encodings:
+        encodetime, data = _Measure(options.repeat, encode)
+        decodetime, (decodedvertices, decodedindices) = _Measure(options.repeat, decode, data)
+        assert len(decodedindices) == len(indices)
+        log.info('%-6s size=%8.1fMB encode=%7.3fs decode=%7.3fs', name, len(data) / 1024.0 / 1024.0, encodetime, decodetime)
+
+
+if __name__ == "__main__":
+    _Main()
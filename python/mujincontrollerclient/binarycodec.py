@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Binary encoding of zmq messages using msgpack. Large numpy arrays are sent out-of-band as separate frames of a multipart message, so they are neither converted to text nor copied into the msgpack buffer.
+
+A message is a list of frames. The first frame is the msgpack encoded object, where each out-of-band array is replaced by a reference to one of the following frames holding the raw array data.
+
+msgpack is optional, use IsAvailable to check before using this encoding. numpy is only needed when arrays are sent or received.
+"""
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+import logging
+log = logging.getLogger(__name__)
+
+ENCODING_JSON = 'json'
+ENCODING_MSGPACK = 'msgpack'
+
+_extTypeOutOfBandArray = 1  # array in another frame, packed as [frameindex, dtype, shape]
+_extTypeInlineArray = 2  # small array inline, packed as [dtype, shape, data]
+
+_minOutOfBandBytes = 1024  # arrays smaller than this are sent inline, since an extra frame costs more than copying them
+
+
+def IsAvailable():
+    """Returns True if msgpack is installed and the binary encoding can be used
+    """
+    return msgpack is not None
+
+
+def _GetUnpackOptions():
+    options = {'raw': False}
+    if msgpack.version >= (1, 0, 0):
+        options['strict_map_key'] = False
+    return options
+
+
+def EncodeMessage(obj, minoutofbandbytes=_minOutOfBandBytes):
+    """Encodes obj into a list of frames to be sent with send_multipart
+
+    :param obj: Object to encode, can contain numpy arrays and numpy scalars
+    :param minoutofbandbytes: Arrays with at least this many bytes are sent in their own frame
+    :return: List of frames, the first one is the msgpack data
+    """
+    buffers = []
+
+    def _Default(value):
+        import numpy
+        if isinstance(value, numpy.ndarray):
+            if value.dtype.hasobject:
+                return value.tolist()
+            value = numpy.ascontiguousarray(value)
+            if value.nbytes >= minoutofbandbytes:
+                buffers.append(value)
+                return msgpack.ExtType(_extTypeOutOfBandArray, msgpack.packb([len(buffers), value.dtype.str, list(value.shape)], use_bin_type=True))
+            return msgpack.ExtType(_extTypeInlineArray, msgpack.packb([value.dtype.str, list(value.shape), value.tobytes()], use_bin_type=True))
+        if isinstance(value, numpy.generic):
+            return value.item()
+        raise TypeError('cannot encode object of type %s' % type(value))
+
+    header = msgpack.packb(obj, use_bin_type=True, default=_Default)
+    return [header] + [memoryview(value.reshape(-1)) for value in buffers]
+
+
+def DecodeMessage(frames):
+    """Decodes a list of frames received with recv_multipart
+
+    Out-of-band arrays are read-only views over the received frames.
+    """
+    unpackoptions = _GetUnpackOptions()
+
+    def _ExtHook(code, data):
+        if code == _extTypeOutOfBandArray:
+            import numpy
+            frameindex, dtype, shape = msgpack.unpackb(data, **unpackoptions)
+            return numpy.frombuffer(frames[frameindex], dtype=numpy.dtype(dtype)).reshape(shape)
+        if code == _extTypeInlineArray:
+            import numpy
+            dtype, shape, arraydata = msgpack.unpackb(data, **unpackoptions)
+            return numpy.frombuffer(arraydata, dtype=numpy.dtype(dtype)).reshape(shape)
+        return msgpack.ExtType(code, data)
+
+    return msgpack.unpackb(frames[0], ext_hook=_ExtHook, **unpackoptions)
@@ -195,6 +195,27 @@ class BinpickingControllerClient(realtimerobotclient.RealtimeRobotControllerClie
         taskparameters.update(kwargs)
         return self.ExecuteCommand(taskparameters, toolname=toolname, timeout=timeout)
 
+    def ComputeIKBatch(self, ikparams, toolname=None, dof=None, chunksize=8, maxchunksize=256, targetchunkduration=None, maxworkers=4, usewebapi=None, timeout=10, iktype=None, **kwargs):
+        """Computes ik for many ik parameters. They are sent in chunks with ComputeIKBatch, or with one ComputeIK each if the server does not support it. Chunks run concurrently, each worker thread through its own zmq command socket. The chunk size adapts so that each chunk takes about targetchunkduration, and chunks that time out are split and retried.
+        :param ikparams: List of dicts of ComputeIK parameters, e.g. {'iktype': 'Transform6D', 'quaternion': [1,0,0,0], 'translation': [0,0,500]}, or a poseutils.PoseBatch or (N,7) array of [qw,qx,qy,qz,x,y,z]
+        :param dof: Number of joint values per solution, inferred from the solutions if None
+        :param iktype: ik type of the ik parameters that do not have one. Poses default to Transform6D. Every ik parameter must end up with an iktype
+        :param chunksize: Initial number of ik parameters per request
+        :param maxchunksize: Maximum number of ik parameters per request
+        :param targetchunkduration: Seconds each request should take, defaults to a quarter of timeout
+        :param maxworkers: Maximum number of concurrent requests
+        :param timeout: Timeout in seconds of each request
+        :param kwargs: Other ComputeIK parameters common to all ik parameters, e.g. limit, filteroptions
+        :return: A dictionary of:
+        - success: (N,) bool numpy array, whether a solution was found
+        - solutions: (N, dof) numpy array of the first solution of each ik parameter, NaN where no solution was found
+        - errors: list of N error messages, None where a solution was found
+        """
+        from . import ikutils
+        if usewebapi is None:
+            usewebapi = self._usewebapi
+        return ikutils.ComputeIKBatch(self, ikparams, toolname=toolname, dof=dof, chunksize=chunksize, maxchunksize=maxchunksize, targetchunkduration=targetchunkduration, maxworkers=maxworkers, usewebapi=usewebapi, timeout=timeout, iktype=iktype, **kwargs)
+
     def InitializePartsWithPhysics(self, timeout=10, **kwargs):
         """Start a physics simulation where the parts drop down into the bin. The method returns as soon as the physics is initialized, user has to wait for the "duration" or call StopPhysicsThread command.
         :param targeturi: the target uri to initialize the scene with
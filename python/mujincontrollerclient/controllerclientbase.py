@@ -7,7 +7,6 @@ Mujin controller client
 # System imports
 import os
 import datetime
-import base64
 import email.utils
 
 # Mujin imports
@@ -18,6 +17,8 @@ from . import json
 from . import urlparse
 from . import uriutils
 from . import controllergraphclient
+from . import filesyncutils
+from . import profiler
 
 # Logging
 import logging
@@ -106,6 +107,9 @@ class ControllerClient(object):
 
     _webclient = None
     _userinfo = None  # A dict storing user info, like locale
+    _metrics = None  # metrics.MetricsRegistry enabled with EnableMetrics
+    _tracer = None  # tracing.Tracer set with SetTracer
+    _recorder = None  # recording.TrafficRecorder set with SetRecorder
 
     controllerurl = ''  # URl to controller
     controllerusername = ''  # Username to login with
@@ -150,6 +154,9 @@ class ControllerClient(object):
         }
         self._webclient = controllerclientraw.ControllerWebClient(self.controllerurl, self.controllerusername, self.controllerpassword, author=author, userAgent=userAgent, additionalHeaders=additionalHeaders)
 
+        # Profile the client side when requested by the environment
+        profiler.StartProfilerFromEnvironment()
+
     def __del__(self):
         self.Destroy()
 
@@ -174,6 +181,52 @@ class ControllerClient(object):
         """
         self._webclient.SetUserAgent(userAgent)
 
+    def EnableMetrics(self, metrics=None):
+        """Starts recording the latency of each phase of the requests and commands, and their error and timeout counts
+
+        :param metrics: metrics.MetricsRegistry to record into, possibly shared with other clients. If None, creates a new one
+        :return: The metrics.MetricsRegistry
+        """
+        if metrics is None:
+            from . import metrics as metricsmodule
+            metrics = metricsmodule.MetricsRegistry()
+        self._metrics = metrics
+        self._webclient.SetMetrics(metrics)
+        return metrics
+
+    def DisableMetrics(self):
+        """Stops recording metrics
+        """
+        self._metrics = None
+        self._webclient.SetMetrics(None)
+
+    def GetMetrics(self):
+        """Returns the metrics.MetricsRegistry enabled with EnableMetrics, or None
+        """
+        return self._metrics
+
+    def SetTracer(self, tracer):
+        """Starts a span for each request and command, and propagates its traceparent in the http headers and zmq commands. Spans started by the caller, e.g. for a pick cycle, become the parents of the spans of the calls made from the same thread.
+
+        :param tracer: tracing.Tracer, or None to stop tracing
+        """
+        self._tracer = tracer
+        self._webclient.SetTracer(tracer)
+
+    def GetTracer(self):
+        return self._tracer
+
+    def SetRecorder(self, recorder):
+        """Appends the request and response of each call to a traffic log, to replay it offline with recording.TrafficReplayer. Calls nested in a recorded call are not recorded.
+
+        :param recorder: recording.TrafficRecorder, possibly shared with other clients, or None to stop recording
+        """
+        self._recorder = recorder
+        self._webclient.SetRecorder(recorder)
+
+    def GetRecorder(self):
+        return self._recorder
+
     @property
     def graphApi(self):
         return controllergraphclient.ControllerGraphClient(self._webclient)
@@ -461,6 +514,26 @@ class ControllerClient(object):
         params = {'unit': unit}
         return self._webclient.APICall('PUT', u'object/%s/geometry/%s/' % (objectpk, geometrypk), params=params, data=data, headers=headers, timeout=timeout)
 
+    def SetObjectGeometryMeshFromArrays(self, objectpk, geometrypk, vertices, indices, unit='mm', usewebapi=True, timeout=5):
+        """Upload a triangle mesh given as numpy arrays to be set as the mesh for the geometry. The mesh is sent as binary stl.
+
+        :param vertices: (N, 3) array of vertex positions in unit
+        :param indices: (M, 3) array of triangle vertex indices
+        """
+        from . import meshutils
+        return self.SetObjectGeometryMesh(objectpk, geometrypk, meshutils.EncodeBinarySTL(vertices, indices), formathint='stl', unit=unit, usewebapi=usewebapi, timeout=timeout)
+
+    def GetMeshArrays(self, meshId, meshUnit=None, resolveReferences=None, units=None, dtype=None, timeout=None):
+        """Get a mesh through the graph api as numpy arrays
+
+        :param dtype: dtype of the vertices, either numpy.float64 (default) or numpy.float32
+        :return: A tuple of (vertices, indices), (N, 3) and uint32 (M, 3) arrays
+        """
+        import numpy
+        from . import meshutils
+        mesh = self.graphApi.GetMesh(meshId, meshUnit=meshUnit, resolveReferences=resolveReferences, units=units, fields=['vertices', 'indices'], timeout=timeout)
+        return meshutils.DecodeGraphMesh(mesh or {}, dtype=dtype or numpy.float64)
+
     def DeleteObjectGeometry(self, objectpk, geometrypk, usewebapi=True, timeout=5):
         assert usewebapi
         return self._webclient.APICall('DELETE', u'object/%s/geometry/%s/' % (objectpk, geometrypk), timeout=timeout)
@@ -741,23 +814,25 @@ class ControllerClient(object):
     # Geometry related
     #
 
-    def GetObjectGeometry(self, objectpk, usewebapi=True, timeout=5):
+    def GetObjectGeometry(self, objectpk, usewebapi=True, timeout=5, dtype=None, lazy=False, merged=False, copy=True):
         """Return list of geometries (a dictionary with keys: positions, indices) of the given object
+
+        :param dtype: dtype of the positions, either numpy.float64 (default) or numpy.float32
+        :param lazy: If True, return LazyGeometry mappings which decode each array on first access
+        :param merged: If True, return a single dictionary with all geometries merged, see meshutils.MergeGeometries
+        :param copy: If False, arrays are decoded without copying where possible and are read-only. Merged arrays are always writable
         """
         import numpy
+        from . import meshutils
         assert usewebapi
+        if dtype is None:
+            dtype = numpy.float64
         response = self._webclient.APICall('GET', u'object/%s/scenejs/' % objectpk, timeout=timeout)
-        geometries = []
-        for encodedGeometry in response['geometries']:
-            geometry = {}
-            positions = numpy.fromstring(base64.b64decode(encodedGeometry['positions_base64']), dtype=float)
-            positions.resize(len(positions) / 3, 3)
-            geometry['positions'] = positions
-            indices = numpy.fromstring(base64.b64decode(encodedGeometry['indices_base64']), dtype=numpy.uint32)
-            indices.resize(len(indices) / 3, 3)
-            geometry['indices'] = indices
-            geometries.append(geometry)
-        return geometries
+        if merged:
+            return meshutils.MergeGeometries(response['geometries'], dtype=dtype)
+        if lazy:
+            return [meshutils.LazyGeometry(encodedGeometry, dtype=dtype, copy=copy) for encodedGeometry in response['geometries']]
+        return [meshutils.DecodeGeometry(encodedGeometry, dtype=dtype, copy=copy) for encodedGeometry in response['geometries']]
 
     #
     # File related
@@ -897,6 +972,21 @@ class ControllerClient(object):
         if response.status_code != 200:
             raise ControllerClientError(response.content.decode('utf-8'), response=response)
 
+    def SyncDirectory(self, localdir, remotedir, direction=filesyncutils.SYNC_DIRECTION_UPLOAD, delete=False, usehash=False, dryrun=False, maxworkers=4, timeout=10):
+        """Incrementally mirrors a local directory to the controller, or the other way around. Only files whose size or modification time (or SHA-1 hash, if usehash is True) differ are transferred.
+
+        :param localdir: Local directory
+        :param remotedir: Directory on the controller, relative to the user media directory
+        :param direction: "upload" to mirror localdir to remotedir, "download" to mirror remotedir to localdir
+        :param delete: If True, files in the destination that do not exist in the source are deleted
+        :param usehash: If True, compares content hashes instead of modification times
+        :param dryrun: If True, only computes the plan, nothing is transferred or deleted
+        :param maxworkers: Maximum number of concurrent transfers
+        :param timeout: Timeout in seconds for each request
+        :return: A dict with "plan" (lists of files to "transfer", "delete" and "unchanged"), "transferred", "deleted", "failed", "transferredBytes" and "elapsedTime"
+        """
+        return filesyncutils.SyncDirectory(self, localdir, remotedir, direction=direction, delete=delete, usehash=usehash, dryrun=dryrun, maxworkers=maxworkers, timeout=timeout)
+
     #
     # Log related
     #
@@ -19,8 +19,11 @@ import requests.auth
 import requests.adapters
 
 from . import _
-from . import json
-from . import APIServerError, ControllerClientError, ControllerGraphClientException
+from . import jsoncodec
+from . import metrics as metricsmodule
+from . import recording as recordingmodule
+from . import tracing
+from . import APIServerError, ControllerClientError, ControllerGraphClientException, GetMonotonicTime
 
 import logging
 log = logging.getLogger(__name__)
@@ -34,6 +37,10 @@ class ControllerWebClient(object):
     _headers = None  # Prepared headers for all requests
     _isok = False  # Flag to stop
     _session = None  # Requests session object
+    _metrics = None  # metrics.MetricsRegistry recording the latency of each request, None to not record
+    _metricscomponent = 'web'  # Component name of the recorded metrics
+    _tracer = None  # tracing.Tracer starting a span for each request, None to not trace
+    _recorder = None  # recording.TrafficRecorder recording each APICall and CallGraphAPI, None to not record
 
     def __init__(self, baseurl, username, password, locale=None, author=None, userAgent=None, additionalHeaders=None):
         self._baseurl = baseurl
@@ -105,7 +112,30 @@ class ControllerWebClient(object):
         else:
             self._headers.pop('User-Agent', None)
 
-    def Request(self, method, path, timeout=5, headers=None, **kwargs):
+    def SetMetrics(self, metrics, component='web'):
+        """Records the latency of the request round trip and response decoding of each call, and error and timeout counts, into metrics
+
+        :param metrics: metrics.MetricsRegistry, or None to stop recording
+        :param component: Component name of the recorded metrics
+        """
+        self._metrics = metrics
+        self._metricscomponent = component
+
+    def SetTracer(self, tracer):
+        """Starts a span for each request and sends its traceparent header
+
+        :param tracer: tracing.Tracer, or None to stop tracing
+        """
+        self._tracer = tracer
+
+    def SetRecorder(self, recorder):
+        """Records the request and response of each APICall and CallGraphAPI
+
+        :param recorder: recording.TrafficRecorder, or None to stop recording
+        """
+        self._recorder = recorder
+
+    def Request(self, method, path, timeout=5, headers=None, metricsname=None, **kwargs):
         if timeout < 1e-6:
             raise ControllerClientError(_('Timeout value (%s sec) is too small') % timeout)
 
@@ -119,15 +149,62 @@ class ControllerWebClient(object):
             # by default, disallow redirect since DELETE with redirection is too dangerous
             kwargs['allow_redirects'] = method in ('GET',)
 
-        response = self._session.request(method=method, url=url, timeout=timeout, headers=headers, **kwargs)
+        tracer = self._tracer
+        if tracer is not None:
+            span = tracer.StartSpan('http', {'transport': 'http', 'method': method, 'path': path})
+            headers[tracing.TRACEPARENT_HEADER] = span.GetTraceParent()
+            if span.sampled and isinstance(kwargs.get('data'), (bytes, type(u''))):
+                span.SetAttribute('payloadsize', len(kwargs['data']))
+            try:
+                response = self._Request(method, path, url, timeout, headers, metricsname, kwargs)
+            except Exception as e:
+                span.End(error=e)
+                raise
+            if span.sampled:
+                span.SetAttribute('statuscode', response.status_code)
+                if 'Content-Length' in response.headers:
+                    span.SetAttribute('responsesize', int(response.headers['Content-Length']))
+            span.End(outcome='ok' if response.status_code < 400 else 'error')
+        else:
+            response = self._Request(method, path, url, timeout, headers, metricsname, kwargs)
 
         # in verbose logging, log the caller
         if log.isEnabledFor(5): # logging.VERBOSE might not be available in the system
             log.verbose('request %s %s response %s took %.03f seconds:\n%s', method, url, response.status_code, response.elapsed.total_seconds(), '\n'.join([line.strip() for line in traceback.format_stack()[:-1]]))
         return response
 
+    def _Request(self, method, path, url, timeout, headers, metricsname, kwargs):
+        metrics = self._metrics
+        if metrics is None:
+            response = self._session.request(method=method, url=url, timeout=timeout, headers=headers, **kwargs)
+        else:
+            metricsname = metricsname or '%s %s' % (method, path)
+            starttime = GetMonotonicTime()
+            try:
+                response = self._session.request(method=method, url=url, timeout=timeout, headers=headers, **kwargs)
+            except requests.exceptions.RequestException as e:
+                metrics.RecordError(self._metricscomponent, metricsname, istimeout=isinstance(e, requests.exceptions.Timeout))
+                raise
+            metrics.Record(self._metricscomponent, metricsname, metricsmodule.PHASE_WAIT, GetMonotonicTime() - starttime)
+            if response.status_code >= 400:
+                metrics.RecordError(self._metricscomponent, metricsname)
+        return response
+
     # Python port of the javascript API Call function
     def APICall(self, method, path='', params=None, fields=None, data=None, headers=None, expectedStatusCode=None, timeout=5):
+        recorder = self._recorder
+        if recorder is None:
+            return self._APICall(method, path, params=params, fields=fields, data=data, headers=headers, expectedStatusCode=expectedStatusCode, timeout=timeout)
+        record = recorder.StartRecord(recordingmodule.RECORD_APICALL, {'method': method, 'path': path, 'params': dict(params) if params is not None else None, 'fields': fields, 'data': data, 'expectedStatusCode': expectedStatusCode, 'timeout': timeout})
+        try:
+            content = self._APICall(method, path, params=params, fields=fields, data=data, headers=headers, expectedStatusCode=expectedStatusCode, timeout=timeout)
+        except Exception as e:
+            recorder.EndRecord(record, error=e)
+            raise
+        recorder.EndRecord(record, response=content)
+        return content
+
+    def _APICall(self, method, path='', params=None, fields=None, data=None, headers=None, expectedStatusCode=None, timeout=5):
         path = '/api/v1/' + path.lstrip('/')
         if not path.endswith('/'):
             path += '/'
@@ -153,33 +230,38 @@ class ControllerWebClient(object):
         # Default to json content type
         if 'Content-Type' not in headers:
             headers['Content-Type'] = 'application/json'
-            data = json.dumps(data)
+            data = jsoncodec.Dumps(data)
 
         if 'Accept' not in headers:
             headers['Accept'] = 'application/json'
 
         method = method.upper()
-        response = self.Request(method, path, params=params, data=data, headers=headers, timeout=timeout)
+        metricsname = '%s %s' % (method, path)
+        starttime = GetMonotonicTime()
+        response = self.Request(method, path, params=params, data=data, headers=headers, timeout=timeout, metricsname=metricsname)
 
-        # Try to parse response
-        raw = response.content.decode('utf-8', 'replace').strip()
+        # Try to parse response, decoding straight from bytes. The text is only decoded for error messages
+        decodestarttime = GetMonotonicTime()
+        rawcontent = response.content.strip()
         content = None
-        if len(raw) > 0:
+        if len(rawcontent) > 0:
             try:
-                content = json.loads(raw)
+                content = jsoncodec.Loads(rawcontent)
             except ValueError as e:
+                raw = rawcontent.decode('utf-8', 'replace')
                 log.exception('caught exception parsing json response: %s: %s', e, raw)
                 raise APIServerError(_('Unable to parse server response %d: %s') % (response.status_code, raw))
+        self._RecordMetricsDecode(metricsname, starttime, decodestarttime)
 
         # First check error
         if content is not None and 'error_message' in content:
             raise APIServerError(content['error_message'], errorcode=content.get('error_code', None), inputcommand=path, detailInfoType=content.get('detailInfoType',None), detailInfo=content.get('detailInfo',None))
 
         if content is not None and 'error' in content:
-            raise APIServerError(content['error'].get('message', raw), inputcommand=path)
+            raise APIServerError(content['error'].get('message', rawcontent.decode('utf-8', 'replace')), inputcommand=path)
         
         if response.status_code >= 400:
-            raise APIServerError(_('Unexpected server response %d: %s') % (response.status_code, raw))
+            raise APIServerError(_('Unexpected server response %d: %s') % (response.status_code, rawcontent.decode('utf-8', 'replace')))
 
         # TODO(ziyan): Figure out the expected status code from method
         #              Some APIs were mis-implemented to not return standard status code.
@@ -193,42 +275,65 @@ class ControllerWebClient(object):
 
         # Check expected status code
         if response.status_code != expectedStatusCode:
-            log.error('response status code is %d, expecting %d for %s %s: %s', response.status_code, expectedStatusCode, method, path, raw)
-            raise APIServerError(_('Unexpected server response %d: %s') % (response.status_code, raw))
+            log.error('response status code is %d, expecting %d for %s %s: %s', response.status_code, expectedStatusCode, method, path, rawcontent.decode('utf-8', 'replace'))
+            raise APIServerError(_('Unexpected server response %d: %s') % (response.status_code, rawcontent.decode('utf-8', 'replace')))
 
         return content
 
+    def _RecordMetricsDecode(self, metricsname, starttime, decodestarttime):
+        metrics = self._metrics
+        if metrics is not None:
+            endtime = GetMonotonicTime()
+            metrics.RecordPhases(self._metricscomponent, metricsname, metricsmodule.PHASE_DECODE, endtime - decodestarttime, metricsmodule.PHASE_TOTAL, endtime - starttime)
+
     def CallGraphAPI(self, query, variables=None, timeout=5.0):
+        recorder = self._recorder
+        if recorder is None:
+            return self._CallGraphAPI(query, variables=variables, timeout=timeout)
+        record = recorder.StartRecord(recordingmodule.RECORD_GRAPHQL, {'query': query, 'variables': variables, 'timeout': timeout})
+        try:
+            data = self._CallGraphAPI(query, variables=variables, timeout=timeout)
+        except Exception as e:
+            recorder.EndRecord(record, error=e)
+            raise
+        recorder.EndRecord(record, response=data)
+        return data
+
+    def _CallGraphAPI(self, query, variables=None, timeout=5.0):
+        metricsname = 'POST /api/v2/graphql'
+        starttime = GetMonotonicTime()
         response = self.Request('POST', '/api/v2/graphql', headers={
             'Content-Type': 'application/json',
             'Accept': 'application/json',
-        }, data=json.dumps({
+        }, data=jsoncodec.Dumps({
             'query': query,
             'variables': variables or {},
-        }), timeout=timeout)
+        }), timeout=timeout, metricsname=metricsname)
 
         # try to parse response
-        raw = response.content.decode('utf-8', 'replace').strip()
+        rawcontent = response.content.strip()
 
         # repsonse must be 200 OK
         statusCode = response.status_code
         if statusCode != 200:
-            raise ControllerGraphClientException(_('Unexpected server response %d: %s') % (statusCode, raw), statusCode=statusCode, response=response)
+            raise ControllerGraphClientException(_('Unexpected server response %d: %s') % (statusCode, rawcontent.decode('utf-8', 'replace')), statusCode=statusCode, response=response)
 
-        # decode the response content
+        # decode the response content straight from bytes
+        decodestarttime = GetMonotonicTime()
         content = None
-        if len(raw) > 0:
+        if len(rawcontent) > 0:
             try:
-                content = json.loads(raw)
+                content = jsoncodec.Loads(rawcontent)
             except ValueError as e:
-                log.exception('caught exception parsing json response: %s: %s', e, raw)
+                log.exception('caught exception parsing json response: %s: %s', e, rawcontent.decode('utf-8', 'replace'))
+        self._RecordMetricsDecode(metricsname, starttime, decodestarttime)
 
         # raise any error returned
         if content is not None and 'errors' in content and len(content['errors']) > 0:
-            message = content['errors'][0].get('message', raw)
+            message = content['errors'][0].get('message', rawcontent.decode('utf-8', 'replace'))
             raise ControllerGraphClientException(message, statusCode=statusCode, content=content, response=response)
 
         if content is None or 'data' not in content:
-            raise ControllerGraphClientException(_('Unexpected server response %d: %s') % (statusCode, raw), statusCode=statusCode, response=response)
+            raise ControllerGraphClientException(_('Unexpected server response %d: %s') % (statusCode, rawcontent.decode('utf-8', 'replace')), statusCode=statusCode, response=response)
 
         return content['data']
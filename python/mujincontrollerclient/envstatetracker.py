@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Tracker of the envstate last acknowledged by UpdateObjects, so that frequent vision updates only send the objects that were added, removed or moved.
+"""
+
+import math
+
+from . import GetMonotonicTime
+
+import logging
+log = logging.getLogger(__name__)
+
+_translationkeys = ('translation_', 'translation')
+_quaternionkeys = ('quat_', 'quaternion')
+
+
+def _GetPoseValue(envobject, keys):
+    for key in keys:
+        value = envobject.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+def ComputeTranslationDistance(translation0, translation1):
+    return math.sqrt(sum((value0 - value1) ** 2 for value0, value1 in zip(translation0, translation1)))
+
+
+def ComputeQuaternionAngle(quat0, quat1):
+    """Returns the angle in radians of the rotation between two quaternions in w,x,y,z order, treating q and -q as the same rotation
+    """
+    norm0 = math.sqrt(sum(value * value for value in quat0))
+    norm1 = math.sqrt(sum(value * value for value in quat1))
+    if norm0 == 0 or norm1 == 0:
+        return math.pi
+    dot = abs(sum(value0 * value1 for value0, value1 in zip(quat0, quat1))) / (norm0 * norm1)
+    return 2.0 * math.acos(min(1.0, dot))
+
+
+class EnvStateTracker(object):
+    """Sends envstates to UpdateObjects incrementally.
+
+    The tracker remembers the objects acknowledged by the last successful UpdateObjects. The next update only sends objects that are new, whose non-pose fields changed, or that moved by more than the tolerances, with incremental=True and the names of removed objects in removedobjectnames. Poses are compared against the acknowledged pose, so slow drift is still sent once it exceeds the tolerance.
+
+    Incremental updates are only sent once the server confirmed it applies them, by setting incremental to true in the response of an UpdateObjects. A server that ignores incremental would take the changed objects as the whole scene, so until then, and whenever an incremental update is not confirmed, the whole envstate is sent.
+
+    When UpdateObjects fails, the acknowledged state becomes unknown and the next update is a full resync, sending the whole envstate without incremental. The unit changing or fullresyncinterval elapsing also forces a full resync. Not thread-safe.
+    """
+
+    _client = None  # RealtimeRobotControllerClient
+    _translationtolerance = None  # Translations closer than this, in the envstate unit, are not sent
+    _rotationtolerance = None  # Rotations closer than this, in radians, are not sent
+    _fullresyncinterval = None  # If not None, seconds after which a full resync is sent
+    _encodestate = True  # If True, state is sent as a json string, otherwise as an object, see RealtimeRobotControllerClient.UpdateObjects
+    _ackedobjects = None  # Dict mapping object names to the objects acknowledged by the server, None if unknown and a full resync is needed
+    _ackedunit = None  # Unit of _ackedobjects
+    _lastfullresynctime = None  # Monotonic time of the last full resync
+    _serversupportsincremental = False  # True if the response of the last full resync confirmed that the server applies incremental updates
+    _numfullresyncs = 0  # Number of full resyncs sent
+    _numincremental = 0  # Number of incremental updates sent
+    _numskipped = 0  # Number of updates skipped since nothing changed
+
+    def __init__(self, client, translationtolerance=0.5, rotationtolerance=0.001, fullresyncinterval=None, encodestate=True):
+        """
+        :param client: RealtimeRobotControllerClient
+        :param translationtolerance: Objects that moved less than this, in the envstate unit, are not sent
+        :param rotationtolerance: Objects that rotated less than this, in radians, are not sent
+        :param fullresyncinterval: If not None, seconds after which the whole envstate is sent again
+        :param encodestate: If True, state is sent as a json string. Set to False only if the server accepts state as an object, to avoid encoding it twice
+        """
+        self._client = client
+        self._translationtolerance = translationtolerance
+        self._rotationtolerance = rotationtolerance
+        self._fullresyncinterval = fullresyncinterval
+        self._encodestate = encodestate
+
+    @property
+    def numfullresyncs(self):
+        return self._numfullresyncs
+
+    @property
+    def numincremental(self):
+        return self._numincremental
+
+    @property
+    def numskipped(self):
+        return self._numskipped
+
+    def Reset(self):
+        """Forgets the acknowledged state, so the next update is a full resync
+        """
+        self._ackedobjects = None
+        self._ackedunit = None
+
+    def _HasChanged(self, ackedobject, envobject):
+        if ackedobject is None:
+            return True
+        ignoredkeys = _translationkeys + _quaternionkeys
+        for key in set(ackedobject.keys()) | set(envobject.keys()):
+            if key not in ignoredkeys and ackedobject.get(key) != envobject.get(key):
+                return True
+        ackedtranslation = _GetPoseValue(ackedobject, _translationkeys)
+        translation = _GetPoseValue(envobject, _translationkeys)
+        if (ackedtranslation is None) != (translation is None):
+            return True
+        if translation is not None and ComputeTranslationDistance(ackedtranslation, translation) > self._translationtolerance:
+            return True
+        ackedquat = _GetPoseValue(ackedobject, _quaternionkeys)
+        quat = _GetPoseValue(envobject, _quaternionkeys)
+        if (ackedquat is None) != (quat is None):
+            return True
+        if quat is not None and ComputeQuaternionAngle(ackedquat, quat) > self._rotationtolerance:
+            return True
+        return False
+
+    def ComputeChanges(self, envstate):
+        """Returns (changedobjects, removedobjectnames) of envstate relative to the acknowledged state. Every object is changed if the acknowledged state is unknown.
+        """
+        ackedobjects = self._ackedobjects or {}
+        changedobjects = [envobject for envobject in envstate if self._HasChanged(ackedobjects.get(envobject['name']), envobject)]
+        names = set(envobject['name'] for envobject in envstate)
+        removedobjectnames = sorted(name for name in ackedobjects if name not in names)
+        return changedobjects, removedobjectnames
+
+    def UpdateObjects(self, envstate, targetname=None, state=None, unit='mm', timeout=10, **kwargs):
+        """Sends the changes of envstate to UpdateObjects, see RealtimeRobotControllerClient.UpdateObjects
+
+        :return: Response of UpdateObjects, or None if nothing changed and no state was given
+        """
+        fullresync = self._ackedobjects is None or self._ackedunit != unit
+        if not fullresync and self._fullresyncinterval is not None and GetMonotonicTime() - self._lastfullresynctime >= self._fullresyncinterval:
+            fullresync = True
+
+        if not fullresync:
+            changedobjects, removedobjectnames = self.ComputeChanges(envstate)
+            if len(changedobjects) == 0 and len(removedobjectnames) == 0 and state is None:
+                self._numskipped += 1
+                return None
+            if not self._serversupportsincremental:
+                fullresync = True
+
+        if fullresync:
+            changedobjects, removedobjectnames = list(envstate), []
+        else:
+            kwargs['incremental'] = True
+            kwargs['removedobjectnames'] = removedobjectnames
+
+        # until acknowledged, the server state is unknown
+        ackedobjects = self._ackedobjects
+        self._ackedobjects = None
+        try:
+            response = self._client.UpdateObjects(changedobjects, targetname=targetname, state=state, unit=unit, timeout=timeout, encodestate=self._encodestate, **kwargs)
+        except Exception:
+            log.warn('UpdateObjects failed, sending a full resync next time')
+            raise
+
+        confirmedincremental = isinstance(response, dict) and bool(response.get('incremental'))
+        if not fullresync and not confirmedincremental:
+            # the server may have replaced its whole scene with the changed objects, so resend everything
+            log.warn('server did not confirm applying the incremental update, sending a full resync')
+            self._serversupportsincremental = False
+            kwargs.pop('incremental', None)
+            kwargs.pop('removedobjectnames', None)
+            return self.UpdateObjects(envstate, targetname=targetname, state=state, unit=unit, timeout=timeout, **kwargs)
+
+        if fullresync:
+            self._serversupportsincremental = confirmedincremental
+            ackedobjects = {}
+            self._lastfullresynctime = GetMonotonicTime()
+            self._numfullresyncs += 1
+        else:
+            for name in removedobjectnames:
+                ackedobjects.pop(name, None)
+            self._numincremental += 1
+        for envobject in changedobjects:
+            ackedobjects[envobject['name']] = dict(envobject)
+        self._ackedobjects = ackedobjects
+        self._ackedunit = unit
+        return response
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Incremental directory synchronization between a local directory and the controller media directory.
+
+A sync is done in two steps: a plan is computed by comparing size and modification time (or content hash) of the local and remote files, then only the files that differ are transferred, concurrently.
+"""
+
+import os
+import time
+import hashlib
+import calendar
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+import six
+
+from . import ControllerClientError
+from . import ugettext as _
+
+import logging
+log = logging.getLogger(__name__)
+
+SYNC_DIRECTION_UPLOAD = 'upload'  # local directory is the source, controller is the destination
+SYNC_DIRECTION_DOWNLOAD = 'download'  # controller is the source, local directory is the destination
+
+
+def _GetTimestampFromDatetime(dt):
+    """Converts a naive UTC datetime (as returned by HeadFile) to a unix timestamp
+    """
+    return calendar.timegm(dt.utctimetuple())
+
+
+def _ComputeFileHash(filename, blocksize=1024 * 1024):
+    """Computes the SHA-1 hex digest of a local file, the same hash the controller reports in HeadFile
+    """
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def _JoinRemotePath(*parts):
+    return '/'.join([part.strip('/') for part in parts if part and part.strip('/')])
+
+
+def ListLocalFiles(localdir, usehash=False):
+    """Recursively lists files under localdir
+
+    :param usehash: If True, also computes the SHA-1 hash of every file
+    :return: A dict mapping relative path (with / separator) to a dict of "size", "modified" (unix timestamp) and "hash" (or None)
+    """
+    files = {}
+    if not os.path.isdir(localdir):
+        return files
+    for dirpath, dirnames, filenames in os.walk(localdir):
+        dirnames.sort()
+        for filename in filenames:
+            fullpath = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(fullpath, localdir).replace(os.sep, '/')
+            stat = os.stat(fullpath)
+            files[relpath] = {
+                'size': stat.st_size,
+                'modified': stat.st_mtime,
+                'hash': _ComputeFileHash(fullpath) if usehash else None,
+            }
+    return files
+
+
+def _GetRemoteEntries(response):
+    """Normalizes a ListFiles response into a list of (name, isdir, size, modified) tuples. size and modified are None when not reported.
+
+    The response is expected to be either a list of entries, or a dict with the list of entries under "files" or "entries". Each entry is either:
+
+    - a name, ending with / for a directory, e.g. "scene.mujin.dae" or "parts/"
+    - a dict with the name under "filename" or "name", and optionally "isdir" or "isDirectory" (otherwise a name ending with / is a directory), "size" in bytes and "modified" as a unix timestamp
+
+    Entries whose size or modified time are not reported are completed with HeadFile by ListRemoteFiles.
+    """
+    if isinstance(response, dict):
+        response = response.get('files', response.get('entries', []))
+    entries = []
+    for entry in response or []:
+        if isinstance(entry, six.string_types):
+            entries.append((entry.rstrip('/'), entry.endswith('/'), None, None))
+            continue
+        name = entry.get('filename', entry.get('name', ''))
+        isdir = bool(entry.get('isdir', entry.get('isDirectory', name.endswith('/'))))
+        modified = entry.get('modified')
+        if not isinstance(modified, (six.integer_types, float)):
+            modified = None
+        entries.append((name.rstrip('/'), isdir, entry.get('size'), modified))
+    return entries
+
+
+def ListRemoteFiles(controllerclient, remotedir, usehash=False, maxworkers=4, timeout=10):
+    """Recursively lists files under remotedir on the controller by walking ListFiles
+
+    Metadata that ListFiles does not report (and the hash, if usehash is True) is fetched with HeadFile, concurrently.
+
+    :return: A dict mapping relative path to a dict of "size", "modified" (unix timestamp) and "hash" (or None)
+    """
+    files = {}
+    pendingdirs = ['']
+    while len(pendingdirs) > 0:
+        reldir = pendingdirs.pop()
+        for name, isdir, size, modified in _GetRemoteEntries(controllerclient.ListFiles(_JoinRemotePath(remotedir, reldir), timeout=timeout)):
+            relpath = _JoinRemotePath(reldir, os.path.basename(name))
+            if isdir:
+                pendingdirs.append(relpath)
+            else:
+                files[relpath] = {'size': size, 'modified': modified, 'hash': None}
+
+    incomplete = [relpath for relpath, info in six.iteritems(files) if usehash or info['size'] is None or info['modified'] is None]
+    if len(incomplete) > 0:
+        def _HeadFile(relpath):
+            return relpath, controllerclient.HeadFile(_JoinRemotePath(remotedir, relpath), timeout=timeout)
+
+        pool = ThreadPool(max(1, min(maxworkers, len(incomplete))))
+        try:
+            for relpath, head in pool.imap_unordered(_HeadFile, incomplete):
+                files[relpath] = {
+                    'size': head['size'],
+                    'modified': _GetTimestampFromDatetime(head['modified']),
+                    'hash': head.get('hash'),
+                }
+        finally:
+            pool.terminate()
+    return files
+
+
+def ComputeSyncPlan(localfiles, remotefiles, direction, delete=False, usehash=False, mtimetolerance=1.0):
+    """Computes which files need to be transferred or deleted to make the destination mirror the source
+
+    A file is transferred when it is missing in the destination, its size differs, or (when usehash is True) its content hash differs. Otherwise, it is transferred when the source is newer than the destination by more than mtimetolerance seconds. A destination newer than the source may only have been written later with the same content, e.g. by a previous upload, so its hashes are compared. If they are not known, the file is listed in "verify" and transferred until its hashes are compared.
+
+    :param localfiles: Output of ListLocalFiles
+    :param remotefiles: Output of ListRemoteFiles
+    :param direction: SYNC_DIRECTION_UPLOAD or SYNC_DIRECTION_DOWNLOAD
+    :param delete: If True, files in the destination that do not exist in the source are scheduled for deletion
+    :return: A dict with "direction", "transfer" (sorted relative paths), "delete", "unchanged", "verify" (relative paths also in "transfer" whose hashes would tell if they changed) and "transferBytes"
+    """
+    if direction == SYNC_DIRECTION_UPLOAD:
+        sourcefiles, destfiles = localfiles, remotefiles
+    elif direction == SYNC_DIRECTION_DOWNLOAD:
+        sourcefiles, destfiles = remotefiles, localfiles
+    else:
+        raise ControllerClientError(_('Invalid sync direction %r, expecting "%s" or "%s"') % (direction, SYNC_DIRECTION_UPLOAD, SYNC_DIRECTION_DOWNLOAD))
+
+    transfer = []
+    unchanged = []
+    verify = []
+    transferbytes = 0
+    for relpath, sourceinfo in six.iteritems(sourcefiles):
+        destinfo = destfiles.get(relpath)
+        changed = destinfo is None or sourceinfo['size'] != destinfo['size']
+        if not changed:
+            hashesknown = bool(sourceinfo.get('hash') and destinfo.get('hash'))
+            if usehash and hashesknown:
+                changed = sourceinfo['hash'] != destinfo['hash']
+            elif sourceinfo['modified'] - destinfo['modified'] > mtimetolerance:
+                changed = True
+            elif destinfo['modified'] - sourceinfo['modified'] > mtimetolerance:
+                # same size but written after the source, the content may still differ
+                if hashesknown:
+                    changed = sourceinfo['hash'] != destinfo['hash']
+                else:
+                    changed = True
+                    verify.append(relpath)
+        if changed:
+            transfer.append(relpath)
+            transferbytes += sourceinfo['size'] or 0
+        else:
+            unchanged.append(relpath)
+
+    deletions = []
+    if delete:
+        deletions = sorted([relpath for relpath in destfiles if relpath not in sourcefiles])
+
+    return {
+        'direction': direction,
+        'transfer': sorted(transfer),
+        'delete': deletions,
+        'unchanged': sorted(unchanged),
+        'verify': sorted(verify),
+        'transferBytes': transferbytes,
+    }
+
+
+def _UploadFile(controllerclient, localdir, remotedir, relpath, timeout):
+    with open(os.path.join(localdir, *relpath.split('/')), 'rb') as f:
+        controllerclient.UploadFiles([(_JoinRemotePath(remotedir, relpath), f)], timeout=timeout)
+
+
+def _DownloadFile(controllerclient, localdir, remotedir, relpath, remoteinfo, timeout):
+    filename = os.path.join(localdir, *relpath.split('/'))
+    dirname = os.path.dirname(filename)
+    if not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            if not os.path.isdir(dirname):  # another worker may have created it
+                raise
+
+    # write to a temporary file first so that a failed transfer never leaves a truncated file behind
+    response = controllerclient.DownloadFile(_JoinRemotePath(remotedir, relpath), timeout=timeout)
+    fd, tempfilename = tempfile.mkstemp(prefix='.sync-', dir=dirname)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+        if remoteinfo.get('modified') is not None:
+            # preserve the controller modification time so that the next sync sees the file as unchanged
+            os.utime(tempfilename, (time.time(), remoteinfo['modified']))
+        if os.path.exists(filename):
+            os.remove(filename)  # os.rename does not overwrite on windows
+        os.rename(tempfilename, filename)
+    except Exception:
+        if os.path.exists(tempfilename):
+            os.remove(tempfilename)
+        raise
+
+
+def ExecuteSyncPlan(controllerclient, localdir, remotedir, plan, sourcefiles, maxworkers=4, timeout=10):
+    """Transfers and deletes files according to a plan computed by ComputeSyncPlan
+
+    Transfers run concurrently with at most maxworkers in flight. A failure of one file does not stop the others, it is reported in the summary.
+
+    :param sourcefiles: The file listing of the sync source used to compute the plan
+
+    :return: A dict with "transferred", "deleted", "failed" (mapping relative path to error message), "transferredBytes" and "elapsedTime"
+    """
+    starttime = time.time()
+    direction = plan['direction']
+
+    def _Transfer(relpath):
+        try:
+            if direction == SYNC_DIRECTION_UPLOAD:
+                _UploadFile(controllerclient, localdir, remotedir, relpath, timeout)
+            else:
+                _DownloadFile(controllerclient, localdir, remotedir, relpath, sourcefiles[relpath], timeout)
+            return relpath, None
+        except Exception as e:
+            log.exception('failed to %s file %s: %s', direction, relpath, e)
+            return relpath, u'%s' % e
+
+    transferred = []
+    failed = {}
+    if len(plan['transfer']) > 0:
+        pool = ThreadPool(max(1, min(maxworkers, len(plan['transfer']))))
+        try:
+            for relpath, error in pool.imap_unordered(_Transfer, plan['transfer']):
+                if error is None:
+                    transferred.append(relpath)
+                    log.debug('%sed %s (%d/%d)', direction, relpath, len(transferred), len(plan['transfer']))
+                else:
+                    failed[relpath] = error
+        finally:
+            pool.terminate()
+
+    deleted = []
+    if len(plan['delete']) > 0:
+        if direction == SYNC_DIRECTION_UPLOAD:
+            try:
+                controllerclient.DeleteFiles([_JoinRemotePath(remotedir, relpath) for relpath in plan['delete']], timeout=timeout)
+                deleted = list(plan['delete'])
+            except Exception as e:
+                log.exception('failed to delete files on controller: %s', e)
+                failed.update([(relpath, u'%s' % e) for relpath in plan['delete']])
+        else:
+            for relpath in plan['delete']:
+                try:
+                    os.remove(os.path.join(localdir, *relpath.split('/')))
+                    deleted.append(relpath)
+                except OSError as e:
+                    failed[relpath] = u'%s' % e
+
+    return {
+        'transferred': sorted(transferred),
+        'deleted': sorted(deleted),
+        'failed': failed,
+        'transferredBytes': sum([sourcefiles[relpath]['size'] or 0 for relpath in transferred]),
+        'elapsedTime': time.time() - starttime,
+    }
+
+
+def _FillHashes(controllerclient, localdir, remotedir, relpaths, localfiles, remotefiles, maxworkers=4, timeout=10):
+    """Sets the missing hashes of relpaths in localfiles and remotefiles, fetching the remote ones with HeadFile concurrently
+    """
+    for relpath in relpaths:
+        if not localfiles[relpath].get('hash'):
+            localfiles[relpath]['hash'] = _ComputeFileHash(os.path.join(localdir, *relpath.split('/')))
+
+    def _HeadFile(relpath):
+        return relpath, controllerclient.HeadFile(_JoinRemotePath(remotedir, relpath), timeout=timeout)
+
+    remoterelpaths = [relpath for relpath in relpaths if not remotefiles[relpath].get('hash')]
+    if len(remoterelpaths) > 0:
+        pool = ThreadPool(max(1, min(maxworkers, len(remoterelpaths))))
+        try:
+            for relpath, head in pool.imap_unordered(_HeadFile, remoterelpaths):
+                remotefiles[relpath]['hash'] = head.get('hash')
+        finally:
+            pool.terminate()
+
+
+def SyncDirectory(controllerclient, localdir, remotedir, direction=SYNC_DIRECTION_UPLOAD, delete=False, usehash=False, dryrun=False, maxworkers=4, mtimetolerance=1.0, timeout=10):
+    """Mirrors localdir to remotedir on the controller (upload) or remotedir to localdir (download), transferring only changed files
+
+    :return: A dict with "plan" (see ComputeSyncPlan), "dryrun", and the keys of the ExecuteSyncPlan summary. When dryrun is True, nothing is transferred and the summary lists are empty.
+    """
+    starttime = time.time()
+    localfiles = ListLocalFiles(localdir, usehash=usehash)
+    remotefiles = ListRemoteFiles(controllerclient, remotedir, usehash=usehash, maxworkers=maxworkers, timeout=timeout)
+    plan = ComputeSyncPlan(localfiles, remotefiles, direction, delete=delete, usehash=usehash, mtimetolerance=mtimetolerance)
+    if len(plan['verify']) > 0:
+        # compare the hashes of the files whose modification times cannot tell if they changed
+        _FillHashes(controllerclient, localdir, remotedir, plan['verify'], localfiles, remotefiles, maxworkers=maxworkers, timeout=timeout)
+        plan = ComputeSyncPlan(localfiles, remotefiles, direction, delete=delete, usehash=usehash, mtimetolerance=mtimetolerance)
+    log.debug('sync plan for %s %s: %d to transfer (%d bytes), %d to delete, %d unchanged', direction, remotedir, len(plan['transfer']), plan['transferBytes'], len(plan['delete']), len(plan['unchanged']))
+
+    if dryrun:
+        summary = {
+            'transferred': [],
+            'deleted': [],
+            'failed': {},
+            'transferredBytes': 0,
+            'elapsedTime': time.time() - starttime,
+        }
+    else:
+        sourcefiles = localfiles if direction == SYNC_DIRECTION_UPLOAD else remotefiles
+        summary = ExecuteSyncPlan(controllerclient, localdir, remotedir, plan, sourcefiles, maxworkers=maxworkers, timeout=timeout)
+        summary['elapsedTime'] = time.time() - starttime
+    summary['plan'] = plan
+    summary['dryrun'] = dryrun
+    return summary
@@ -3,9 +3,14 @@
 # Mujin controller client for bin picking task
 
 # System imports
+import threading
+import traceback
+from multiprocessing.pool import ThreadPool
 
 # Mujin imports
+from . import json
 from . import planningclient
+from . import GetMonotonicTime
 
 # Logging
 import logging
@@ -16,6 +21,8 @@ class HandEyeCalibrationControllerClient(planningclient.PlanningControllerClient
     """Mujin controller client for the hand-eye calibration task
     """
     tasktype = 'handeyecalibration'
+    _samplecache = None  # Valid calibration samples, dict mapping (cameracontainername, primarysensorname, secondarysensornames, parametersdump) to a dict mapping gridindex to result
+    _samplecachelock = None  # Protects _samplecache
 
     def __init__(self, robot, **kwargs):
         """Logs into the mujin controller, initializes hand eye calibration task, and sets up parameters
@@ -27,6 +34,8 @@ class HandEyeCalibrationControllerClient(planningclient.PlanningControllerClient
         """
         super(HandEyeCalibrationControllerClient, self).__init__(tasktype=self.tasktype, **kwargs)
         self.robot = robot
+        self._samplecache = {}
+        self._samplecachelock = threading.Lock()
 
     def ComputeCalibrationPoses(self, cameracontainername, primarysensorname, secondarysensornames, numsamples, calibboardvisibility, calibboardLinkName=None, calibboardGeomName=None, timeout=3000, **kwargs):
         taskparameters = {
@@ -60,6 +69,94 @@ class HandEyeCalibrationControllerClient(planningclient.PlanningControllerClient
             taskparameters['robot'] = self.robot
         return self.ExecuteCommand(taskparameters, timeout=timeout, usewebapi=True)
 
+    @staticmethod
+    def _GetSampleCacheKey(cameracontainername, primarysensorname, secondarysensornames, calibboardvisibility, kwargs):
+        """Samples are only reused for the same sensors, calibration board visibility and other sampling parameters
+        """
+        parametersdump = json.dumps({'calibboardvisibility': calibboardvisibility, 'kwargs': kwargs}, sort_keys=True)
+        return (cameracontainername, primarysensorname, tuple(sorted(secondarysensornames or [])), parametersdump)
+
+    def SampleCalibrationConfigurations(self, cameracontainername, primarysensorname, secondarysensornames, gridindices, calibboardvisibility, maxworkers=4, numvalidsamples=None, isvalidfn=None, usecache=True, timeout=3000, **kwargs):
+        """Samples many grid indices concurrently and yields the samples as they finish, in completion order.
+
+        Valid samples are cached per camera container, sensor set, calibboardvisibility and other sampling parameters. When usecache is True, cached samples that isvalidfn accepts are yielded first and their grid indices are not sampled again.
+
+        Stops dispatching once numvalidsamples valid samples were yielded, or when the caller stops iterating. Requests already in flight are not interrupted, but their results are still cached.
+
+        :param gridindices: Grid indices to sample, in the order they should be dispatched
+        :param maxworkers: Maximum number of concurrent SampleCalibrationConfiguration calls
+        :param numvalidsamples: If set, stop once this many valid samples were found
+        :param isvalidfn: Function taking a result and returning whether the sample is valid. Defaults to any non-empty result
+        :param usecache: Whether to use and update the cache of valid samples
+        :param timeout: Timeout in seconds of each SampleCalibrationConfiguration call
+        :return: Generator of dicts with keys gridindex, result, error, valid, cached, elapsedTime
+        """
+        if isvalidfn is None:
+            isvalidfn = bool
+        cachekey = self._GetSampleCacheKey(cameracontainername, primarysensorname, secondarysensornames, calibboardvisibility, kwargs)
+        numvalid = 0
+
+        pendinggridindices = []
+        with self._samplecachelock:
+            cachedresults = dict(self._samplecache.get(cachekey, {})) if usecache else {}
+        for gridindex in gridindices:
+            if gridindex in cachedresults and isvalidfn(cachedresults[gridindex]):
+                if numvalidsamples is not None and numvalid >= numvalidsamples:
+                    return
+                numvalid += 1
+                yield {'gridindex': gridindex, 'result': cachedresults[gridindex], 'error': None, 'valid': True, 'cached': True, 'elapsedTime': 0.0}
+            else:
+                pendinggridindices.append(gridindex)
+        if len(pendinggridindices) == 0 or (numvalidsamples is not None and numvalid >= numvalidsamples):
+            return
+
+        cancelled = threading.Event()
+
+        def _Sample(gridindex):
+            if cancelled.is_set():
+                return None
+            starttime = GetMonotonicTime()
+            sample = {'gridindex': gridindex, 'result': None, 'error': None, 'valid': False, 'cached': False}
+            try:
+                sample['result'] = self.SampleCalibrationConfiguration(cameracontainername, primarysensorname, secondarysensornames, gridindex, calibboardvisibility, timeout=timeout, **kwargs)
+                sample['valid'] = bool(isvalidfn(sample['result']))
+            except Exception as e:
+                log.debug('failed to sample grid index %s: %s', gridindex, traceback.format_exc())
+                sample['error'] = e
+            sample['elapsedTime'] = GetMonotonicTime() - starttime
+            if sample['valid'] and usecache:
+                with self._samplecachelock:
+                    self._samplecache.setdefault(cachekey, {})[gridindex] = sample['result']
+            return sample
+
+        pool = ThreadPool(max(1, min(maxworkers, len(pendinggridindices))))
+        try:
+            for sample in pool.imap_unordered(_Sample, pendinggridindices):
+                if sample is None:
+                    continue
+                if sample['valid']:
+                    numvalid += 1
+                yield sample
+                if numvalidsamples is not None and numvalid >= numvalidsamples:
+                    log.debug('found %d valid samples, cancelling remaining grid indices', numvalid)
+                    break
+        finally:
+            # the remaining queued grid indices return immediately, so this only waits for the requests in flight
+            cancelled.set()
+            pool.close()
+            pool.join()
+
+    def ClearCalibrationSampleCache(self, cameracontainername=None, primarysensorname=None, secondarysensornames=None):
+        """Drops the cached calibration samples of one camera container and sensor set, whatever their sampling parameters, or all of them if cameracontainername is None
+        """
+        with self._samplecachelock:
+            if cameracontainername is None:
+                self._samplecache.clear()
+            else:
+                sensorskey = self._GetSampleCacheKey(cameracontainername, primarysensorname, secondarysensornames, None, None)[:3]
+                for cachekey in [cachekey for cachekey in self._samplecache if cachekey[:3] == sensorskey]:
+                    self._samplecache.pop(cachekey)
+
     def ReloadModule(self, **kwargs):
         return self.ExecuteCommand({
             'command': 'ReloadModule',
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Batched inverse kinematics over many ik parameters, split into adaptively sized chunks that run concurrently. Requires numpy, so only import this module where numpy is needed.
+"""
+
+import threading
+import traceback
+from multiprocessing.pool import ThreadPool
+
+import numpy
+
+from . import APIServerError, ControllerClientError, TimeoutError, GetMonotonicTime
+from . import ugettext as _
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class AdaptiveChunker(object):
+    """Hands out [start, end) ranges of items whose size adapts so that each chunk takes about targetduration seconds. Chunks that time out can be split and handed out again. Thread-safe.
+    """
+
+    _numitems = None  # Total number of items
+    _nextstart = 0  # Start of the next range never handed out
+    _requeued = None  # List of (start, end) ranges handed out again after a split
+    _chunksize = None  # Size of the next chunk
+    _minchunksize = None
+    _maxchunksize = None
+    _targetduration = None  # Seconds each chunk should take
+    _lock = None  # Protects the members above
+
+    def __init__(self, numitems, chunksize=8, minchunksize=1, maxchunksize=256, targetduration=2.0):
+        self._numitems = numitems
+        self._requeued = []
+        self._chunksize = max(minchunksize, min(maxchunksize, chunksize))
+        self._minchunksize = minchunksize
+        self._maxchunksize = maxchunksize
+        self._targetduration = targetduration
+        self._lock = threading.Lock()
+
+    @property
+    def chunksize(self):
+        return self._chunksize
+
+    def Next(self):
+        """Returns the next (start, end) range, or None if no range is left
+        """
+        with self._lock:
+            if len(self._requeued) > 0:
+                return self._requeued.pop(0)
+            if self._nextstart >= self._numitems:
+                return None
+            start = self._nextstart
+            self._nextstart = min(self._numitems, start + self._chunksize)
+            return start, self._nextstart
+
+    def Done(self, start, end, elapsedtime):
+        """Adapts the chunk size from the time the range took
+        """
+        if end <= start or elapsedtime <= 0:
+            return
+        idealchunksize = int(self._targetduration * (end - start) / elapsedtime)
+        with self._lock:
+            # move half way to the ideal size to smooth out noisy timings
+            self._chunksize = max(self._minchunksize, min(self._maxchunksize, (self._chunksize + idealchunksize + 1) // 2))
+
+    def Split(self, start, end):
+        """Hands out the two halves of a range that failed, and shrinks the chunk size. Returns False if the range cannot be split
+        """
+        if end - start <= 1:
+            return False
+        middle = (start + end) // 2
+        with self._lock:
+            self._requeued += [(start, middle), (middle, end)]
+            self._chunksize = max(self._minchunksize, min(self._chunksize, middle - start))
+        return True
+
+
+def _GetFirstSolution(result):
+    if not isinstance(result, dict):
+        return None
+    solutions = result.get('solutions')
+    if not solutions:
+        return None
+    return solutions[0]
+
+
+def ComputeIKBatch(client, ikparams, toolname=None, dof=None, chunksize=8, maxchunksize=256, targetchunkduration=None, maxworkers=4, usewebapi=False, timeout=10, iktype=None, **kwargs):
+    """Computes ik for many ik parameters. See BinpickingControllerClient.ComputeIKBatch.
+    """
+    if hasattr(ikparams, 'ToIKParameters'):
+        # poseutils.PoseBatch
+        ikparams = ikparams.ToIKParameters(iktype=iktype or 'Transform6D')
+    elif isinstance(ikparams, numpy.ndarray):
+        from . import poseutils
+        ikparams = poseutils.PoseBatch(ikparams).ToIKParameters(iktype=iktype or 'Transform6D')
+    elif iktype is not None:
+        ikparams = [ikparam if 'iktype' in ikparam else dict(ikparam, iktype=iktype) for ikparam in ikparams]
+    ikparams = list(ikparams)
+    for index, ikparam in enumerate(ikparams):
+        if 'iktype' not in ikparam:
+            raise ControllerClientError(_('ik parameter %d has no iktype, and no iktype was given') % index)
+    numikparams = len(ikparams)
+    if targetchunkduration is None:
+        targetchunkduration = timeout * 0.25
+
+    chunker = AdaptiveChunker(numikparams, chunksize=chunksize, maxchunksize=maxchunksize, targetduration=targetchunkduration)
+    solutions = [None] * numikparams
+    errors = [None] * numikparams
+    state = {'usebatch': True, 'numchunks': 0}
+    statelock = threading.Lock()
+
+    def _ComputeSingle(ikparam):
+        taskparameters = {'command': 'ComputeIK'}
+        taskparameters.update(kwargs)
+        taskparameters.update(ikparam)
+        return client.ExecuteCommand(taskparameters, toolname=toolname, usewebapi=usewebapi, timeout=timeout)
+
+    def _ComputeChunk(start, end):
+        if state['usebatch']:
+            taskparameters = {
+                'command': 'ComputeIKBatch',
+                'ikparams': ikparams[start:end],
+            }
+            taskparameters.update(kwargs)
+            try:
+                output = client.ExecuteCommand(taskparameters, toolname=toolname, usewebapi=usewebapi, timeout=timeout)
+                if isinstance(output, dict) and len(output.get('results') or []) == end - start:
+                    return output['results']
+                log.debug('server did not return batch ik results, falling back to one ComputeIK per ik parameter')
+            except APIServerError as e:
+                log.debug('server does not support ComputeIKBatch, falling back to one ComputeIK per ik parameter: %s', e)
+            with statelock:
+                state['usebatch'] = False
+        results = []
+        for ikparam in ikparams[start:end]:
+            try:
+                results.append(_ComputeSingle(ikparam))
+            except APIServerError as e:
+                # ik failures are reported per ik parameter
+                results.append({'error': e.message})
+        return results
+
+    def _ComputeChunks():
+        while True:
+            chunk = chunker.Next()
+            if chunk is None:
+                break
+            start, end = chunk
+            starttime = GetMonotonicTime()
+            try:
+                results = _ComputeChunk(start, end)
+                chunker.Done(start, end, GetMonotonicTime() - starttime)
+            except TimeoutError as e:
+                if chunker.Split(start, end):
+                    log.debug('ik chunk [%d, %d) timed out, splitting it', start, end)
+                    continue
+                results = [{'error': u'%s' % e}]
+            except Exception as e:
+                log.error('failed to compute ik chunk [%d, %d): %s', start, end, traceback.format_exc())
+                results = [{'error': u'%s' % e}] * (end - start)
+            with statelock:
+                state['numchunks'] += 1
+            for index, result in zip(range(start, end), results):
+                solutions[index] = _GetFirstSolution(result)
+                if solutions[index] is None:
+                    errors[index] = (result.get('error') if isinstance(result, dict) else None) or u'no ik solution'
+
+    def _RunWorker(iworker):
+        if usewebapi:
+            _ComputeChunks()
+            return
+        # the command sockets are kept by the client, so later batches do not connect again
+        with client.UseWorkerCommandSocket():
+            _ComputeChunks()
+
+    numworkers = max(1, min(maxworkers, numikparams))
+    pool = ThreadPool(numworkers)
+    try:
+        pool.map(_RunWorker, range(numworkers), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    if dof is None:
+        dof = max([len(solution) for solution in solutions if solution is not None] or [0])
+    success = numpy.array([solution is not None for solution in solutions], dtype=bool)
+    solutionarray = numpy.full((numikparams, dof), numpy.nan, dtype=numpy.float64)
+    for index, solution in enumerate(solutions):
+        if solution is not None:
+            solutionarray[index, :len(solution)] = solution[:dof]
+    return {
+        'success': success,
+        'solutions': solutionarray,
+        'errors': errors,
+        'numchunks': state['numchunks'],
+        'usedbatch': state['usebatch'],
+    }
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Registered map of robot bridge IO variables. IO names are declared once, then polled as a compact index list, decoded from ASCII hex into typed values, and diffed against the previous snapshot so that callbacks only fire for signals that changed. Requires numpy, so only import this module where numpy is needed.
+"""
+
+import binascii
+
+import six
+import numpy
+
+from . import APIServerError, ControllerClientError
+from . import ugettext as _
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def DecodeIOValue(hexvalue, dtype=None):
+    """Decodes the ASCII hex of an IO variable.
+
+    :param hexvalue: ASCII hex string as returned by GetRobotBridgeIOVariables
+    :param dtype: numpy dtype of the value, e.g. '?', 'u1', '<i4', '<f4'. If None, returns the raw bytes
+    :return: bytes if dtype is None, a numpy scalar if the data holds one element of dtype, otherwise a read-only numpy array
+    """
+    data = binascii.unhexlify(hexvalue)
+    if dtype is None:
+        return data
+    value = numpy.frombuffer(data, dtype=dtype)
+    if len(value) == 1:
+        return value[0]
+    return value
+
+
+def EncodeIOValue(value, dtype=None):
+    """Encodes a value to the ASCII hex of an IO variable, the inverse of DecodeIOValue
+    """
+    if dtype is None:
+        data = bytes(value)
+    else:
+        data = numpy.asarray(value, dtype=dtype).tobytes()
+    hexvalue = binascii.hexlify(data)
+    if not isinstance(hexvalue, str):
+        hexvalue = hexvalue.decode('ascii')
+    return hexvalue
+
+
+class IOVariableMap(object):
+    """Polls a fixed set of robot bridge IO variables and tracks their changes.
+
+    The first poll asks the server to register the IO names with registeriomap. If the server returns an iomapid, later polls only send the indices of the requested IO names. Otherwise every poll sends the IO names, so the map also works with servers that do not support registration. If a poll by iomapid fails or returns another iomapid, e.g. after the server restarted, the poll is retried once by names and the IO names are registered again.
+
+    Changes are detected on the raw bytes of each IO, and only changed IOs are decoded. Not thread-safe, poll from one thread.
+    """
+
+    _client = None  # RealtimeRobotControllerClient
+    _robotname = None  # Name of the robot, or None for the default robot
+    _ionames = None  # List of registered IO names, the index of an IO name in this list is its index in the map
+    _ioindices = None  # Dict mapping an IO name to its index
+    _dtypes = None  # List of numpy dtypes of the IO values, None to keep raw bytes
+    _iomapid = None  # Id returned by the server when the IO names were registered, None if not registered
+    _registered = False  # Whether registration was already attempted
+    _rawvalues = None  # List of the raw bytes of each IO from the latest poll, None if never read
+    _values = None  # List of the decoded values of each IO from the latest poll
+    _callbacks = None  # List of (callback, set of IO indices or None for all)
+
+    def __init__(self, client, ionames, dtypes=None, robotname=None):
+        """
+        :param client: RealtimeRobotControllerClient
+        :param ionames: List of IO names to register
+        :param dtypes: Either one numpy dtype for all IOs, a dict mapping IO names to dtypes, or None to keep raw bytes. IOs missing from the dict keep raw bytes
+        :param robotname: Name of the robot
+        """
+        self._client = client
+        self._robotname = robotname
+        self._ionames = list(ionames)
+        self._ioindices = dict((ioname, index) for index, ioname in enumerate(self._ionames))
+        if len(self._ioindices) != len(self._ionames):
+            raise ControllerClientError(_('IO names must be unique'))
+        if isinstance(dtypes, dict):
+            self._dtypes = [dtypes.get(ioname) for ioname in self._ionames]
+        else:
+            self._dtypes = [dtypes] * len(self._ionames)
+        self._rawvalues = [None] * len(self._ionames)
+        self._values = [None] * len(self._ionames)
+        self._callbacks = []
+
+    @property
+    def ionames(self):
+        return list(self._ionames)
+
+    @property
+    def iomapid(self):
+        return self._iomapid
+
+    def AddCallback(self, callback, ionames=None):
+        """Registers a function called as callback(ioname, value, previousvalue) for every changed IO after each poll.
+
+        :param ionames: IO names to watch, None for all
+        """
+        ioindices = None
+        if ionames is not None:
+            ioindices = set(self._GetIndex(ioname) for ioname in ionames)
+        self._callbacks.append((callback, ioindices))
+
+    def RemoveCallback(self, callback):
+        self._callbacks = [(fn, ioindices) for fn, ioindices in self._callbacks if fn is not callback]
+
+    def _GetIndex(self, ioname):
+        index = self._ioindices.get(ioname)
+        if index is None:
+            raise ControllerClientError(_('IO name %r is not in the IO variable map') % ioname)
+        return index
+
+    def _ReadHexValues(self, ioindices, timeout):
+        """Returns the ASCII hex values of ioindices, in the same order
+        """
+        if self._iomapid is not None:
+            try:
+                response = self._client.GetRobotBridgeIOVariables(robotname=self._robotname, timeout=timeout, iomapid=self._iomapid, ioindices=ioindices)
+            except APIServerError as e:
+                # the server most likely lost the registration, e.g. it restarted, so read by names and register again
+                log.warn('failed to read IO map %s, registering again: %s', self._iomapid, e)
+                self._iomapid = None
+                self._registered = False
+                return self._ReadHexValues(ioindices, timeout)
+            if isinstance(response, dict) and response.get('iomapid', self._iomapid) != self._iomapid:
+                # registration was lost, e.g. the server restarted
+                log.warn('IO map %s is not registered anymore, registering again', self._iomapid)
+                self._iomapid = None
+                self._registered = False
+                return self._ReadHexValues(ioindices, timeout)
+        else:
+            ionames = [self._ionames[index] for index in ioindices]
+            kwargs = {}
+            if not self._registered:
+                # only register when reading the whole map, since the server returns indices relative to the names it got
+                if len(ioindices) == len(self._ionames):
+                    kwargs['registeriomap'] = True
+                    self._registered = True
+            response = self._client.GetRobotBridgeIOVariables(ionames=ionames, robotname=self._robotname, timeout=timeout, **kwargs)
+            if kwargs and isinstance(response, dict) and response.get('iomapid') is not None:
+                self._iomapid = response['iomapid']
+                log.debug('registered IO map %s with %d IO names', self._iomapid, len(ionames))
+        return self._ParseHexValues(response, ioindices)
+
+    def _ParseHexValues(self, response, ioindices):
+        # accept iovalues as a list in request order, or a dict mapping IO names to values
+        iovalues = response
+        if isinstance(response, dict) and 'iovalues' in response:
+            iovalues = response['iovalues']
+        if isinstance(iovalues, dict):
+            return [iovalues.get(self._ionames[index]) for index in ioindices]
+        if isinstance(iovalues, six.string_types) and len(ioindices) == 1:
+            return [iovalues]
+        if not isinstance(iovalues, (list, tuple)) or len(iovalues) != len(ioindices):
+            raise ControllerClientError(_('Unexpected IO values response for %d IO names: %r') % (len(ioindices), response))
+        return list(iovalues)
+
+    def Poll(self, ionames=None, timeout=10):
+        """Reads the IOs in one call, updates the snapshot and calls the callbacks of the IOs that changed.
+
+        :param ionames: IO names to read, None for all registered IOs
+        :return: Dict mapping the IO names that changed to their new values. All IOs are reported as changed on the first poll
+        """
+        if ionames is None:
+            ioindices = list(range(len(self._ionames)))
+        else:
+            ioindices = [self._GetIndex(ioname) for ioname in ionames]
+        hexvalues = self._ReadHexValues(ioindices, timeout)
+
+        changes = []
+        for index, hexvalue in zip(ioindices, hexvalues):
+            if hexvalue is None:
+                continue
+            rawvalue = binascii.unhexlify(hexvalue)
+            if rawvalue == self._rawvalues[index]:
+                continue
+            previousvalue = self._values[index]
+            self._rawvalues[index] = rawvalue
+            self._values[index] = DecodeIOValue(hexvalue, self._dtypes[index])
+            changes.append((index, previousvalue))
+
+        for callback, watchedindices in self._callbacks:
+            for index, previousvalue in changes:
+                if watchedindices is None or index in watchedindices:
+                    callback(self._ionames[index], self._values[index], previousvalue)
+        return dict((self._ionames[index], self._values[index]) for index, previousvalue in changes)
+
+    def GetValue(self, ioname):
+        """Returns the value of the IO from the latest poll, None if never read
+        """
+        return self._values[self._GetIndex(ioname)]
+
+    def GetValues(self):
+        """Returns a dict mapping every IO name to its value from the latest poll
+        """
+        return dict(zip(self._ionames, self._values))
+
+    def GetArray(self, ionames=None, dtype=None):
+        """Returns the latest values of ionames as one numpy array, e.g. for a map of single bits or registers of the same type
+
+        :param ionames: IO names, None for all registered IOs
+        :param dtype: dtype of the returned array, defaults to numpy's choice
+        """
+        if ionames is None:
+            values = self._values
+        else:
+            values = [self._values[self._GetIndex(ioname)] for ioname in ionames]
+        return numpy.array(values, dtype=dtype)
+
+    def SetValues(self, iovalues, onlychanged=True, timeout=10):
+        """Writes many IOs in one SetRobotBridgeIOVariables call. Values are encoded to ASCII hex with the dtype of each IO.
+
+        :param iovalues: Dict mapping IO names to values, or a list of (ioname, value)
+        :param onlychanged: If True, IOs whose encoded value equals the latest polled value are not sent
+        :return: List of the IO names that were sent
+        """
+        if isinstance(iovalues, dict):
+            iovalues = list(iovalues.items())
+        tosend = []
+        for ioname, value in iovalues:
+            index = self._GetIndex(ioname)
+            hexvalue = EncodeIOValue(value, self._dtypes[index])
+            if onlychanged and self._rawvalues[index] is not None and binascii.unhexlify(hexvalue) == self._rawvalues[index]:
+                continue
+            tosend.append((ioname, hexvalue))
+        if len(tosend) > 0:
+            self._client.SetRobotBridgeIOVariables([[ioname, hexvalue] for ioname, hexvalue in tosend], robotname=self._robotname, timeout=timeout)
+        return [ioname for ioname, hexvalue in tosend]
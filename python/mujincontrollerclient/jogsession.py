@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Jog session sending jog velocities to the robot at a fixed rate from a background thread, so that teleoperation does not queue up behind slow round trips.
+"""
+
+import threading
+import traceback
+
+from . import GetMonotonicTime
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class JogSession(object):
+    """Sends SetJogModeVelocities at a fixed rate with only the latest requested velocities.
+
+    SetVelocities can be called at any rate from any thread. Updates requested between two ticks are coalesced, so only the latest one is sent. Commands are fire-and-forget and carry an increasing jogsequence number, so the server can drop stale updates. The session sends its commands through its own zmq socket, leaving the client's socket to its owner thread.
+
+    Stop sends zero velocities and then EndJogMode through the same socket, both blocking and with the next jogsequence numbers, so that the server can tell they come after any update still in flight. Use the session as a context manager to make sure it stops.
+    """
+
+    _client = None  # RealtimeRobotControllerClient
+    _period = None  # Seconds between two ticks of the sender thread
+    _resendinterval = None  # If not None, seconds after which the latest non-zero velocities are sent again even if unchanged
+    _jogkwargs = None  # Extra arguments passed to every SetJogModeVelocities call
+    _endtimeout = None  # Timeout of each of the final zero velocities and EndJogMode calls
+
+    _lock = None  # Protects _movejointsigns and _pending
+    _movejointsigns = None  # Latest requested velocities
+    _pending = False  # Whether _movejointsigns was updated since the last send
+    _sequence = 0  # Sequence number of the last sent update
+    _numcoalesced = 0  # Number of updates replaced by a newer one before being sent
+    _isok = False  # If False, the sender thread stops
+    _thread = None  # Sender thread
+    _error = None  # Exception raised in the sender thread, if any
+
+    def __init__(self, client, rate=100.0, resendinterval=None, endtimeout=1.0, **jogkwargs):
+        """
+        :param client: RealtimeRobotControllerClient connected through zmq
+        :param rate: Number of ticks per second of the sender thread
+        :param resendinterval: If not None, seconds after which the latest non-zero velocities are sent again, for servers that stop jogging when no update arrives
+        :param endtimeout: Timeout of each of the final zero velocities and EndJogMode calls
+        :param jogkwargs: Extra arguments of SetJogModeVelocities, e.g. robotname, toolname, robotspeed, jogtype
+        """
+        self._client = client
+        self._period = 1.0 / rate
+        self._resendinterval = resendinterval
+        self._endtimeout = endtimeout
+        self._jogkwargs = jogkwargs
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.Stop()
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    @property
+    def numcoalesced(self):
+        return self._numcoalesced
+
+    def Start(self):
+        assert self._thread is None, 'jog session is already started'
+        self._isok = True
+        self._error = None
+        self._thread = threading.Thread(target=self._RunSenderThread, name='jogsession')
+        self._thread.start()
+
+    def Stop(self):
+        """Stops sending, brings the velocities to zero and ends the jog mode. Raises the error of the sender thread if it failed.
+        """
+        self._isok = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+    def SetVelocities(self, movejointsigns):
+        """Requests new jog velocities, replacing any update not sent yet
+        """
+        with self._lock:
+            if self._pending:
+                self._numcoalesced += 1
+            self._movejointsigns = list(movejointsigns)
+            self._pending = True
+
+    def _Send(self, movejointsigns, fireandforget=True, timeout=1):
+        self._sequence += 1
+        self._client.SetJogModeVelocities(movejointsigns, usewebapi=False, timeout=timeout, fireandforget=fireandforget, jogsequence=self._sequence, **self._jogkwargs)
+
+    def _RunSenderThread(self):
+        commandsocket = self._client.CreateCommandSocket()
+        try:
+            with self._client.UseCommandSocket(commandsocket):
+                lastmovejointsigns = None
+                lastsendtime = None
+                nexttick = GetMonotonicTime()
+                try:
+                    while self._isok:
+                        with self._lock:
+                            movejointsigns = self._movejointsigns if self._pending else None
+                            self._pending = False
+
+                        now = GetMonotonicTime()
+                        if movejointsigns is None and self._resendinterval is not None and lastsendtime is not None and now - lastsendtime >= self._resendinterval and any(lastmovejointsigns or []):
+                            movejointsigns = lastmovejointsigns
+                        if movejointsigns is not None:
+                            self._Send(movejointsigns)
+                            lastmovejointsigns = movejointsigns
+                            lastsendtime = now
+
+                        # sleep until the next tick, skipping ticks if sending fell behind instead of bursting
+                        nexttick += self._period
+                        waittime = nexttick - GetMonotonicTime()
+                        if waittime > 0:
+                            threading.Event().wait(waittime)
+                        else:
+                            nexttick = GetMonotonicTime()
+                except Exception as e:
+                    log.error('jog session failed, stopping jog mode: %s', traceback.format_exc())
+                    self._error = e
+                finally:
+                    # always try to stop the robot, waiting for each reply so that EndJogMode is only sent once the zero velocities are applied
+                    try:
+                        if lastmovejointsigns is not None:
+                            self._Send([0] * len(lastmovejointsigns), fireandforget=False, timeout=self._endtimeout)
+                        self._sequence += 1
+                        self._client.EndJogMode(usewebapi=False, timeout=self._endtimeout, fireandforget=False, jogsequence=self._sequence)
+                    except Exception as e:
+                        log.exception('failed to end jog mode: %s', e)
+                        if self._error is None:
+                            self._error = e
+        finally:
+            commandsocket.Destroy()
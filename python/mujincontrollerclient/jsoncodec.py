@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+JSON codec shared by the web client, the zmq clients and the heartbeat subscriber.
+
+ujson is selected at import if installed, otherwise the standard json module. Both round trip NaN, Infinity and integers wider than 64 bits like the previous wire format. orjson is faster on large payloads but is only used when requested with the MUJIN_CONTROLLERCLIENT_JSONCODEC environment variable, e.g. "orjson,json", or with SelectCodec, because it encodes NaN and Infinity as null.
+"""
+
+import os
+import json as _stdlibjson
+
+import six
+
+import logging
+log = logging.getLogger(__name__)
+
+CODEC_ORJSON = 'orjson'
+CODEC_UJSON = 'ujson'
+CODEC_STDLIB = 'json'
+
+CODECS = (CODEC_ORJSON, CODEC_UJSON, CODEC_STDLIB)  # All the codecs, fastest first
+DEFAULT_CODEC_PREFERENCE = (CODEC_UJSON, CODEC_STDLIB)  # Codecs keeping the previous wire format, orjson has to be requested explicitly
+
+_codecname = None  # Name of the selected codec
+_dumps = None  # Function serializing an object to utf-8 encoded bytes
+_loads = None  # Function parsing bytes or text
+
+
+def _CreateOrjsonCodec():
+    import orjson
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    stdlibdumps, stdlibloads = _CreateStdlibCodec()
+
+    def _Dumps(obj):
+        try:
+            return orjson.dumps(obj, option=options)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits
+            return stdlibdumps(obj)
+
+    def _Loads(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. NaN and Infinity tokens sent by python servers, raises ValueError if the json is really invalid
+            return stdlibloads(data)
+
+    return _Dumps, _Loads
+
+
+def _CreateUjsonCodec():
+    import ujson
+
+    def _Dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    def _Loads(data):
+        if not isinstance(data, six.text_type):
+            data = bytes(data).decode('utf-8')
+        return ujson.loads(data)
+
+    return _Dumps, _Loads
+
+
+def _CreateStdlibCodec():
+    def _Dumps(obj):
+        data = _stdlibjson.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        return data
+
+    def _Loads(data):
+        if not isinstance(data, six.text_type):
+            data = bytes(data).decode('utf-8')
+        return _stdlibjson.loads(data)
+
+    return _Dumps, _Loads
+
+
+_codecfactories = {
+    CODEC_ORJSON: _CreateOrjsonCodec,
+    CODEC_UJSON: _CreateUjsonCodec,
+    CODEC_STDLIB: _CreateStdlibCodec,
+}
+
+
+def GetAvailableCodecs():
+    """Returns the names of the codecs that can be selected, in order of preference
+    """
+    available = []
+    for codecname in CODECS:
+        try:
+            _codecfactories[codecname]()
+        except ImportError:
+            continue
+        available.append(codecname)
+    return available
+
+
+def SelectCodec(codecnames=None):
+    """Selects the first installed codec among codecnames
+
+    :param codecnames: Codec names in order of preference, defaults to ujson, json. The standard json module is always used as the last resort. orjson encodes NaN and Infinity as null.
+    :return: Name of the selected codec
+    """
+    global _codecname, _dumps, _loads
+    if codecnames is None:
+        codecnames = DEFAULT_CODEC_PREFERENCE
+    for codecname in list(codecnames) + [CODEC_STDLIB]:
+        if codecname not in _codecfactories:
+            raise ValueError('unknown json codec %r, expected one of %s' % (codecname, ', '.join(CODECS)))
+        try:
+            _dumps, _loads = _codecfactories[codecname]()
+        except ImportError:
+            log.debug('json codec %s is not installed', codecname)
+            continue
+        _codecname = codecname
+        return codecname
+
+
+def GetCodecName():
+    """Returns the name of the selected codec
+    """
+    return _codecname
+
+
+def Dumps(obj):
+    """Serializes obj to utf-8 encoded json bytes with the selected codec
+    """
+    return _dumps(obj)
+
+
+def Loads(data):
+    """Parses json from bytes, bytearray, memoryview or text with the selected codec. Raises ValueError on invalid json.
+    """
+    return _loads(data)
+
+
+def _SelectCodecFromEnvironment():
+    codecnames = [codecname.strip() for codecname in os.environ.get('MUJIN_CONTROLLERCLIENT_JSONCODEC', '').split(',') if codecname.strip()]
+    try:
+        return SelectCodec(codecnames or None)
+    except ValueError as e:
+        log.warn('ignoring MUJIN_CONTROLLERCLIENT_JSONCODEC: %s', e)
+        return SelectCodec()
+
+
+_SelectCodecFromEnvironment()
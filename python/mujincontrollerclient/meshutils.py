@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Helpers to convert mesh data exchanged with the controller from and to numpy arrays. Requires numpy, so only import this module where numpy is needed.
+"""
+
+import base64
+import struct
+
+import numpy
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping  # python 2
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _DecodeBase64Buffer(encoded, itemsize):
+    """Decodes base64 data into one bytes buffer, making sure it contains a whole number of vertices or triangles
+    """
+    data = base64.b64decode(encoded)
+    if len(data) % (itemsize * 3) != 0:
+        raise ValueError('mesh buffer of %d bytes is not a multiple of %d' % (len(data), itemsize * 3))
+    return data
+
+
+def DecodePositions(encoded, dtype=numpy.float64, copy=True):
+    """Decodes base64 encoded float64 vertex positions into an (N, 3) array
+
+    :param dtype: Either numpy.float64 or numpy.float32
+    :param copy: If False and dtype is float64, the returned array is a read-only view over the decoded buffer, no data is copied. Otherwise the array is writable
+    """
+    positions = numpy.frombuffer(_DecodeBase64Buffer(encoded, 8), dtype=numpy.float64).reshape(-1, 3)
+    if positions.dtype != dtype:
+        positions = positions.astype(dtype)
+    elif copy:
+        positions = positions.copy()
+    return positions
+
+
+def DecodeIndices(encoded, copy=True):
+    """Decodes base64 encoded uint32 triangle indices into an (M, 3) array
+
+    :param copy: If False, the returned array is a read-only view over the decoded buffer, no data is copied. Otherwise the array is writable
+    """
+    indices = numpy.frombuffer(_DecodeBase64Buffer(encoded, 4), dtype=numpy.uint32).reshape(-1, 3)
+    if copy:
+        indices = indices.copy()
+    return indices
+
+
+def DecodeGeometry(encodedGeometry, dtype=numpy.float64, copy=True):
+    """Decodes one geometry from the scenejs API into a dictionary with keys: positions, indices
+
+    :param copy: If False, the arrays are read-only views over the decoded buffers where possible, see DecodePositions
+    """
+    return {
+        'positions': DecodePositions(encodedGeometry['positions_base64'], dtype=dtype, copy=copy),
+        'indices': DecodeIndices(encodedGeometry['indices_base64'], copy=copy),
+    }
+
+
+class LazyGeometry(Mapping):
+    """Read-only mapping with keys positions and indices that decodes each array on first access
+    """
+
+    _encodedGeometry = None  # Geometry as returned by the scenejs API, dropped once everything is decoded
+    _dtype = None  # dtype of the positions
+    _copy = True  # If False, the arrays are read-only views over the decoded buffers where possible
+    _decoded = None  # Already decoded arrays, keyed by name
+
+    def __init__(self, encodedGeometry, dtype=numpy.float64, copy=True):
+        self._encodedGeometry = encodedGeometry
+        self._dtype = dtype
+        self._copy = copy
+        self._decoded = {}
+
+    def __getitem__(self, key):
+        if key not in self._decoded:
+            if key == 'positions':
+                self._decoded[key] = DecodePositions(self._encodedGeometry['positions_base64'], dtype=self._dtype, copy=self._copy)
+            elif key == 'indices':
+                self._decoded[key] = DecodeIndices(self._encodedGeometry['indices_base64'], copy=self._copy)
+            else:
+                raise KeyError(key)
+            if len(self._decoded) == 2:
+                self._encodedGeometry = None
+        return self._decoded[key]
+
+    def __iter__(self):
+        return iter(('positions', 'indices'))
+
+    def __len__(self):
+        return 2
+
+    def __repr__(self):
+        return '<LazyGeometry(decoded=%r)>' % sorted(self._decoded.keys())
+
+
+def MergeGeometries(encodedGeometries, dtype=numpy.float64):
+    """Decodes all geometries of an object into one positions array and one indices array
+
+    Indices are shifted so that they refer to the merged positions. Each geometry is decoded directly into its slice of the preallocated output.
+
+    :return: A dictionary with keys:
+        positions: (N, 3) array of all vertex positions
+        indices: (M, 3) uint32 array of all triangles
+        positionOffsets: (len(geometries) + 1,) array, positions of geometry i are positions[positionOffsets[i]:positionOffsets[i+1]]
+        indexOffsets: (len(geometries) + 1,) array, triangles of geometry i are indices[indexOffsets[i]:indexOffsets[i+1]]
+    """
+    positionBuffers = []
+    indexBuffers = []
+    for encodedGeometry in encodedGeometries:
+        positionBuffers.append(_DecodeBase64Buffer(encodedGeometry['positions_base64'], 8))
+        indexBuffers.append(_DecodeBase64Buffer(encodedGeometry['indices_base64'], 4))
+
+    positionOffsets = numpy.zeros(len(positionBuffers) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(data) // 24 for data in positionBuffers], out=positionOffsets[1:])
+    indexOffsets = numpy.zeros(len(indexBuffers) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(data) // 12 for data in indexBuffers], out=indexOffsets[1:])
+
+    positions = numpy.empty((positionOffsets[-1], 3), dtype=dtype)
+    indices = numpy.empty((indexOffsets[-1], 3), dtype=numpy.uint32)
+    for igeometry, (positionData, indexData) in enumerate(zip(positionBuffers, indexBuffers)):
+        positions[positionOffsets[igeometry]:positionOffsets[igeometry + 1]] = numpy.frombuffer(positionData, dtype=numpy.float64).reshape(-1, 3)
+        numpy.add(
+            numpy.frombuffer(indexData, dtype=numpy.uint32).reshape(-1, 3),
+            numpy.uint32(positionOffsets[igeometry]),
+            out=indices[indexOffsets[igeometry]:indexOffsets[igeometry + 1]],
+        )
+    return {
+        'positions': positions,
+        'indices': indices,
+        'positionOffsets': positionOffsets,
+        'indexOffsets': indexOffsets,
+    }
+
+
+#
+# Binary mesh encoding
+#
+
+# One triangle of a binary STL file: normal, three vertices and an attribute byte count, 50 bytes in total
+_stlTriangleDtype = numpy.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attributeByteCount', '<u2'),
+])
+
+_packedMeshMagic = b'MJMS'
+_packedMeshVersion = 1
+_packedMeshHeader = struct.Struct('<4sIII')  # magic, version, number of vertices, number of triangles
+
+
+def _CheckMeshArrays(vertices, indices):
+    vertices = numpy.asarray(vertices).reshape(-1, 3)
+    indices = numpy.asarray(indices).reshape(-1, 3)
+    if len(indices) > 0 and (indices.min() < 0 or indices.max() >= len(vertices)):
+        raise ValueError('mesh indices out of range for %d vertices' % len(vertices))
+    return vertices, indices
+
+
+def EncodeBinarySTL(vertices, indices, header=b''):
+    """Encodes a triangle mesh into binary STL, the format accepted by SetObjectGeometryMesh
+
+    :param vertices: (N, 3) array of vertex positions
+    :param indices: (M, 3) array of triangle vertex indices
+    :param header: Optional bytes stored in the 80-byte STL header
+    :return: Bytes of the STL file, 84 + 50 * M bytes
+    """
+    vertices, indices = _CheckMeshArrays(vertices, indices)
+    triangles = numpy.zeros(len(indices), dtype=_stlTriangleDtype)
+    triangles['vertices'] = vertices[indices]
+    normals = numpy.cross(
+        triangles['vertices'][:, 1] - triangles['vertices'][:, 0],
+        triangles['vertices'][:, 2] - triangles['vertices'][:, 0],
+    )
+    lengths = numpy.linalg.norm(normals, axis=1)
+    nonzero = lengths > 0
+    normals[nonzero] /= lengths[nonzero, numpy.newaxis]
+    triangles['normal'] = normals
+    return header[:80].ljust(80, b'\0') + struct.pack('<I', len(triangles)) + triangles.tobytes()
+
+
+def DecodeBinarySTL(data):
+    """Decodes binary STL into a triangle mesh. STL stores each triangle separately, so every triangle gets its own three vertices.
+
+    :return: A tuple of (vertices, indices), float32 (3M, 3) and uint32 (M, 3) arrays
+    """
+    if len(data) < 84:
+        raise ValueError('binary stl data is too short: %d bytes' % len(data))
+    numtriangles = struct.unpack_from('<I', data, 80)[0]
+    if len(data) < 84 + numtriangles * _stlTriangleDtype.itemsize:
+        raise ValueError('binary stl data is truncated, expected %d triangles' % numtriangles)
+    triangles = numpy.frombuffer(data, dtype=_stlTriangleDtype, count=numtriangles, offset=84)
+    vertices = triangles['vertices'].reshape(-1, 3)
+    indices = numpy.arange(len(vertices), dtype=numpy.uint32).reshape(-1, 3)
+    return vertices, indices
+
+
+def EncodePackedMesh(vertices, indices):
+    """Encodes a triangle mesh into a compact buffer: a 16-byte header followed by float32 vertices and uint32 indices. Unlike STL, shared vertices are only stored once.
+    """
+    vertices, indices = _CheckMeshArrays(vertices, indices)
+    return b''.join([
+        _packedMeshHeader.pack(_packedMeshMagic, _packedMeshVersion, len(vertices), len(indices)),
+        numpy.ascontiguousarray(vertices, dtype='<f4').tobytes(),
+        numpy.ascontiguousarray(indices, dtype='<u4').tobytes(),
+    ])
+
+
+def DecodePackedMesh(data):
+    """Decodes a buffer produced by EncodePackedMesh without copying
+
+    :return: A tuple of (vertices, indices), read-only float32 (N, 3) and uint32 (M, 3) arrays
+    """
+    magic, version, numvertices, numtriangles = _packedMeshHeader.unpack_from(data, 0)
+    if magic != _packedMeshMagic or version != _packedMeshVersion:
+        raise ValueError('not a packed mesh buffer, or unsupported version %d' % version)
+    offset = _packedMeshHeader.size
+    vertices = numpy.frombuffer(data, dtype='<f4', count=numvertices * 3, offset=offset).reshape(-1, 3)
+    offset += numvertices * 12
+    indices = numpy.frombuffer(data, dtype='<u4', count=numtriangles * 3, offset=offset).reshape(-1, 3)
+    return vertices, indices
+
+
+def DecodeGraphMesh(mesh, dtype=numpy.float64):
+    """Converts a Mesh returned by the graph api into arrays
+
+    :param mesh: Dictionary with flat vertices and indices lists, as returned by GetMesh
+    :return: A tuple of (vertices, indices), (N, 3) and uint32 (M, 3) arrays
+    """
+    vertices = numpy.array(mesh.get('vertices') or [], dtype=dtype).reshape(-1, 3)
+    indices = numpy.array(mesh.get('indices') or [], dtype=numpy.uint32).reshape(-1, 3)
+    return vertices, indices
+
+
+def EncodeGraphMeshInput(vertices, indices):
+    """Converts arrays into a MeshInput for graph api mutations
+    """
+    vertices, indices = _CheckMeshArrays(vertices, indices)
+    return {
+        'vertices': vertices.ravel().tolist(),
+        'indices': indices.ravel().tolist(),
+    }
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Low overhead latency metrics. Histograms use HDR-style log-linear buckets preallocated at creation, so recording a value only increments counters.
+"""
+
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+# Phases recorded by the clients
+PHASE_TOTAL = 'total'  # Whole call
+PHASE_ACQUIRE = 'acquire'  # Acquiring a zmq socket from the pool
+PHASE_SEND = 'send'  # Encoding and sending the request
+PHASE_WAIT = 'wait'  # Waiting for the server to respond
+PHASE_RECEIVE = 'receive'  # Receiving the response
+PHASE_DECODE = 'decode'  # Decoding the response
+
+
+class LatencyHistogram(object):
+    """Histogram of durations in microseconds with 2**subbucketbits linear sub-buckets per power of two, so the relative error of percentiles is below 2**-subbucketbits. Not thread-safe, see MetricsRegistry.
+    """
+
+    _subbucketbits = None
+    _subbucketcount = None  # 2**subbucketbits
+    _counts = None  # Preallocated list of counts per bucket
+    _maxmicroseconds = None  # Values above are counted in the last bucket
+    count = 0  # Number of values recorded
+    totalmicroseconds = 0  # Sum of the values recorded
+    minmicroseconds = None
+    maxmicroseconds = None
+
+    def __init__(self, subbucketbits=4, maxseconds=3600.0):
+        self._subbucketbits = subbucketbits
+        self._subbucketcount = 1 << subbucketbits
+        self._maxmicroseconds = int(maxseconds * 1000000)
+        self._counts = [0] * (self._GetBucketIndex(self._maxmicroseconds) + 1)
+
+    def _GetBucketIndex(self, microseconds):
+        if microseconds < self._subbucketcount:
+            return microseconds
+        shift = microseconds.bit_length() - self._subbucketbits - 1
+        return self._subbucketcount * (shift + 1) + (microseconds >> shift) - self._subbucketcount
+
+    def _GetBucketUpperBound(self, index):
+        """Returns the largest value in microseconds counted in the bucket
+        """
+        if index < self._subbucketcount:
+            return index
+        shift = index // self._subbucketcount - 1
+        sub = index % self._subbucketcount
+        return ((self._subbucketcount + sub + 1) << shift) - 1
+
+    def Record(self, seconds):
+        microseconds = int(seconds * 1000000)
+        if microseconds < 0:
+            microseconds = 0
+        elif microseconds > self._maxmicroseconds:
+            microseconds = self._maxmicroseconds
+        self._counts[self._GetBucketIndex(microseconds)] += 1
+        self.count += 1
+        self.totalmicroseconds += microseconds
+        if self.minmicroseconds is None or microseconds < self.minmicroseconds:
+            self.minmicroseconds = microseconds
+        if self.maxmicroseconds is None or microseconds > self.maxmicroseconds:
+            self.maxmicroseconds = microseconds
+
+    def Reset(self):
+        for index in range(len(self._counts)):
+            self._counts[index] = 0
+        self.count = 0
+        self.totalmicroseconds = 0
+        self.minmicroseconds = None
+        self.maxmicroseconds = None
+
+    def GetPercentile(self, percentile):
+        """Returns the value in seconds below which percentile percent of the values fall, None if empty
+        """
+        if self.count == 0:
+            return None
+        threshold = max(1, int(self.count * percentile / 100.0 + 0.5))
+        accumulated = 0
+        for index, count in enumerate(self._counts):
+            accumulated += count
+            if accumulated >= threshold:
+                return min(self._GetBucketUpperBound(index), self.maxmicroseconds) * 1e-6
+        return self.maxmicroseconds * 1e-6
+
+    def GetSnapshot(self, percentiles=(50, 90, 99, 99.9)):
+        """Returns a dict with count, mean, min, max and percentiles in seconds
+        """
+        snapshot = {
+            'count': self.count,
+            'mean': self.totalmicroseconds * 1e-6 / self.count if self.count > 0 else None,
+            'min': self.minmicroseconds * 1e-6 if self.minmicroseconds is not None else None,
+            'max': self.maxmicroseconds * 1e-6 if self.maxmicroseconds is not None else None,
+        }
+        for percentile in percentiles:
+            snapshot['p%s' % ('%g' % percentile).replace('.', '_')] = self.GetPercentile(percentile)
+        return snapshot
+
+    def GetBuckets(self):
+        """Returns a list of (upperboundseconds, count) for the non-empty buckets, e.g. to export the full distribution
+        """
+        return [(self._GetBucketUpperBound(index) * 1e-6, count) for index, count in enumerate(self._counts) if count > 0]
+
+
+class OperationMetrics(object):
+    """Latency histograms per phase and error counters of one operation, e.g. one command
+    """
+
+    histograms = None  # Dict mapping phase names to LatencyHistogram
+    numerrors = 0
+    numtimeouts = 0
+    _subbucketbits = None
+
+    def __init__(self, subbucketbits=4):
+        self.histograms = {}
+        self._subbucketbits = subbucketbits
+
+    def Record(self, phase, seconds):
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = LatencyHistogram(subbucketbits=self._subbucketbits)
+        histogram.Record(seconds)
+
+    def Reset(self):
+        for histogram in self.histograms.values():
+            histogram.Reset()
+        self.numerrors = 0
+        self.numtimeouts = 0
+
+    def GetSnapshot(self):
+        return {
+            'phases': dict((phase, histogram.GetSnapshot()) for phase, histogram in self.histograms.items()),
+            'numerrors': self.numerrors,
+            'numtimeouts': self.numtimeouts,
+        }
+
+
+class MetricsRegistry(object):
+    """Thread-safe collection of OperationMetrics per component (e.g. zmq, web, command) and operation name (e.g. the command name).
+
+    Enable it on a client with PlanningControllerClient.EnableMetrics. Use GetSnapshot to read, Reset to start a new window, and export hooks to push snapshots to a monitoring system.
+    """
+
+    _operations = None  # Dict mapping (component, name) to OperationMetrics
+    _lock = None  # Protects _operations and the histograms
+    _exporthooks = None  # List of functions called with snapshots by Export
+    _subbucketbits = None
+
+    def __init__(self, subbucketbits=4):
+        self._operations = {}
+        self._lock = threading.Lock()
+        self._exporthooks = []
+        self._subbucketbits = subbucketbits
+
+    def _GetOperation(self, component, name):
+        key = (component, name)
+        operation = self._operations.get(key)
+        if operation is None:
+            operation = self._operations[key] = OperationMetrics(subbucketbits=self._subbucketbits)
+        return operation
+
+    def Record(self, component, name, phase, seconds):
+        with self._lock:
+            self._GetOperation(component, name).Record(phase, seconds)
+
+    def RecordPhases(self, component, name, *phaseseconds):
+        """Records many phases of one call at once under one lock, phaseseconds alternating phase names and durations
+        """
+        with self._lock:
+            operation = self._GetOperation(component, name)
+            for index in range(0, len(phaseseconds), 2):
+                operation.Record(phaseseconds[index], phaseseconds[index + 1])
+
+    def RecordError(self, component, name, istimeout=False):
+        with self._lock:
+            operation = self._GetOperation(component, name)
+            if istimeout:
+                operation.numtimeouts += 1
+            else:
+                operation.numerrors += 1
+
+    def Reset(self):
+        with self._lock:
+            for operation in self._operations.values():
+                operation.Reset()
+
+    def GetSnapshot(self, reset=False):
+        """Returns a dict mapping component names to dicts mapping operation names to their snapshots
+
+        :param reset: If True, resets the metrics atomically after taking the snapshot
+        """
+        snapshot = {}
+        with self._lock:
+            for (component, name), operation in self._operations.items():
+                snapshot.setdefault(component, {})[name] = operation.GetSnapshot()
+                if reset:
+                    operation.Reset()
+        return snapshot
+
+    def GetSlowestOperations(self, phase=PHASE_TOTAL, percentile=99, num=10):
+        """Returns up to num (component, name, seconds) tuples with the highest percentile of phase, e.g. to find which commands exceed a cycle time budget
+        """
+        with self._lock:
+            results = []
+            for (component, name), operation in self._operations.items():
+                histogram = operation.histograms.get(phase)
+                if histogram is not None and histogram.count > 0:
+                    results.append((component, name, histogram.GetPercentile(percentile)))
+        results.sort(key=lambda result: result[2], reverse=True)
+        return results[:num]
+
+    def AddExportHook(self, hook):
+        """Adds a function called with the snapshot on every Export
+        """
+        self._exporthooks.append(hook)
+
+    def RemoveExportHook(self, hook):
+        self._exporthooks = [exporthook for exporthook in self._exporthooks if exporthook is not hook]
+
+    def Export(self, reset=False):
+        """Takes a snapshot and passes it to every export hook. Errors of hooks are logged. Returns the snapshot.
+        """
+        snapshot = self.GetSnapshot(reset=reset)
+        for hook in list(self._exporthooks):
+            try:
+                hook(snapshot)
+            except Exception as e:
+                log.exception('metrics export hook %r failed: %s', hook, e)
+        return snapshot
@@ -7,12 +7,18 @@ Planning client
 # System imports
 import threading
 import weakref
+import contextlib
 import os
 import time
+from multiprocessing.pool import ThreadPool
 
 # Mujin imports
-from . import APIServerError, GetMonotonicTime
-from . import controllerclientbase, zmqclient
+from . import APIServerError, TimeoutError, GetMonotonicTime
+from . import json
+from . import controllerclientbase, zmqclient, binarycodec, jsoncodec
+from . import metrics as metricsmodule
+from . import recording as recordingmodule
+from . import tracing
 from . import zmq
 
 # Logging
@@ -39,6 +45,40 @@ def GetAPIServerErrorFromZMQ(response):
         # something happened so raise exception
         return APIServerError(u'Resulting status is %s' % response['status'])
 
+# Commands that stop or pause the robot and are sent on the high priority channel by default, see SetHighPriorityCommands
+DEFAULT_HIGH_PRIORITY_COMMANDS = frozenset([
+    'PausePickPlace',
+    'SetStopPickPlaceAfterExecutionCycle',
+    'StopPickPlaceThread',
+    'StopITLProgram',
+    'SetRobotBridgePause',
+    'PauseExecuteTrajectory',
+    'StopGripper',
+])
+
+
+class _InFlightCommand(object):
+    """Command executed by one thread, whose output is shared with the threads sending the same command meanwhile
+    """
+    event = None  # Set once output or error is available
+    output = None
+    error = None
+    finishtime = None  # Monotonic time when the command finished
+    freshness = 0  # Seconds after finishtime during which output can be reused
+
+    def __init__(self):
+        self.event = threading.Event()
+
+
+def _CopyException(error):
+    """Returns a new exception with the same type and attributes as error, so that each thread raising it gets its own traceback
+    """
+    errorcopy = error.__class__.__new__(error.__class__)
+    errorcopy.args = error.args
+    errorcopy.__dict__.update(error.__dict__)
+    return errorcopy
+
+
 class PlanningControllerClient(controllerclientbase.ControllerClient):
     """Mujin controller client for planning tasks
     """
@@ -53,14 +93,26 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
     _taskstate = None  # Latest task status from heartbeat message
     _commandsocket = None  # zmq client to the command port
     _configsocket = None  # zmq client to the config port
-
-    def __init__(self, taskzmqport, taskheartbeatport, taskheartbeattimeout, tasktype, scenepk, usewebapi=True, ctx=None, slaverequestid=None, **kwargs):
+    _threadlocal = None  # threading.local holding the command socket override of each thread, see UseCommandSocket
+    _workercommandsockets = None  # List of idle command sockets kept for worker threads, see UseWorkerCommandSocket
+    _workercommandsocketslock = None  # Protects _workercommandsockets
+    _commandencoding = binarycodec.ENCODING_JSON  # Encoding of commands sent to the command port, negotiated with NegotiateCommandEncoding
+    _coalescedcommands = None  # Dict mapping read-only command names to the seconds their output can be reused, see EnableCommandCoalescing
+    _coalescedrequests = None  # Dict mapping request keys to the _InFlightCommand in flight or recently finished
+    _coalescinglock = None  # Protects _coalescedcommands and _coalescedrequests
+    _highprioritycommands = None  # Set of command names sent through _highprioritysocket
+    _highprioritysocket = None  # zmq client connected ahead of time, used only for high priority commands so that they do not wait for a socket behind bulk commands
+    _highprioritylock = None  # Serializes the commands sent through _highprioritysocket, which can come from any thread
+
+    def __init__(self, taskzmqport, taskheartbeatport, taskheartbeattimeout, tasktype, scenepk, usewebapi=True, ctx=None, slaverequestid=None, taskhighpriorityport=None, highprioritycommands=None, **kwargs):
         """Logs into the mujin controller and initializes the task's zmq connection
         :param taskzmqport: Port of the task's zmq server, e.g. 7110
         :param taskheartbeatport: Port of the task's zmq server's heartbeat publisher, e.g. 7111
         :param taskheartbeattimeout: Seconds until reinitializing task's zmq server if no heartbeat is received, e.g. 7
         :param tasktype: Type of the task
         :param scenepk: Primary key (pk) of the bin picking task scene, e.g. irex2013.mujin.dae
+        :param taskhighpriorityport: Port the task serves concurrently with bulk commands, used for high priority commands. Required for the high priority channel, since a connection to taskzmqport still waits on the server behind bulk commands. If None or equal to taskzmqport, high priority commands are sent like other commands
+        :param highprioritycommands: Command names sent on the high priority channel. Defaults to DEFAULT_HIGH_PRIORITY_COMMANDS
         """
         super(PlanningControllerClient, self).__init__(**kwargs)
         self._slaverequestid = slaverequestid
@@ -74,6 +126,14 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
         # Connects to task's zmq server
         self._commandsocket = None
         self._configsocket = None
+        self._threadlocal = threading.local()
+        self._workercommandsockets = []
+        self._workercommandsocketslock = threading.Lock()
+        self._coalescedcommands = {}
+        self._coalescedrequests = {}
+        self._coalescinglock = threading.Lock()
+        self._highprioritycommands = set(DEFAULT_HIGH_PRIORITY_COMMANDS if highprioritycommands is None else highprioritycommands)
+        self._highprioritylock = threading.Lock()
         if taskzmqport is not None:
             if ctx is None:
                 self._ctx = zmq.Context()
@@ -83,6 +143,11 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
             self.taskzmqport = taskzmqport
             self._commandsocket = zmqclient.ZmqClient(self.controllerIp, taskzmqport, ctx)
             self._configsocket = zmqclient.ZmqClient(self.controllerIp, taskzmqport + 2, ctx)
+            if taskhighpriorityport is not None and taskhighpriorityport != taskzmqport:
+                self._highprioritysocket = zmqclient.ZmqClient(self.controllerIp, taskhighpriorityport, ctx, checkcallerthread=False)
+                self._highprioritysocket.Connect()
+            elif taskhighpriorityport is not None:
+                log.warn('taskhighpriorityport is the same as taskzmqport %d, high priority commands are queued behind other commands on the server, so not using a high priority channel', taskzmqport)
 
             self.taskheartbeatport = taskheartbeatport
             self.taskheartbeattimeout = taskheartbeattimeout
@@ -109,6 +174,15 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
         if self._configsocket is not None:
             self._configsocket.Destroy()
             self._configsocket = None
+        if self._highprioritysocket is not None:
+            self._highprioritysocket.Destroy()
+            self._highprioritysocket = None
+        if self._workercommandsockets is not None:
+            with self._workercommandsocketslock:
+                workercommandsockets = self._workercommandsockets
+                self._workercommandsockets = []
+            for commandsocket in workercommandsockets:
+                commandsocket.Destroy()
         if self._ctxown is not None:
             try:
                 self._ctxown.destroy()
@@ -127,14 +201,154 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
         configsocket = self._configsocket
         if configsocket is not None:
             configsocket.SetDestroy()
+        highprioritysocket = self._highprioritysocket
+        if highprioritysocket is not None:
+            highprioritysocket.SetDestroy()
+        for commandsocket in list(self._workercommandsockets or []):
+            commandsocket.SetDestroy()
         super(PlanningControllerClient, self).SetDestroy()
 
+    def EnableMetrics(self, metrics=None):
+        """Starts recording the latency of each phase of the requests and commands, and their error and timeout counts. The components of the metrics are:
+
+        - command: total time of each command executed, by command name
+        - zmq, zmqconfig, zmqhighpriority: phases of the commands sent on the command, config and high priority sockets, by command name
+        - web: phases of the web api calls, by method and path
+
+        :param metrics: metrics.MetricsRegistry to record into, possibly shared with other clients. If None, creates a new one
+        :return: The metrics.MetricsRegistry
+        """
+        metrics = super(PlanningControllerClient, self).EnableMetrics(metrics)
+        self._SetSocketMetrics(metrics)
+        return metrics
+
+    def DisableMetrics(self):
+        super(PlanningControllerClient, self).DisableMetrics()
+        self._SetSocketMetrics(None)
+
+    def _SetSocketMetrics(self, metrics):
+        for socket, component in ((self._commandsocket, 'zmq'), (self._configsocket, 'zmqconfig'), (self._highprioritysocket, 'zmqhighpriority')):
+            if socket is not None:
+                socket.SetMetrics(metrics, component=component)
+        with self._workercommandsocketslock:
+            for socket in self._workercommandsockets:
+                socket.SetMetrics(metrics)
+
     def GetSlaveRequestId(self):
         return self._slaverequestid
 
     def GetCommandSocketRaw(self):
         return self._commandsocket
 
+    def CreateCommandSocket(self, checkcallerthread=True):
+        """Creates a new zmq client to the task's command port. ZmqClient must only be used from one thread, so a thread other than the owner of this client sends its commands through its own socket with UseCommandSocket. The caller has to Destroy the returned client.
+        :param checkcallerthread: If False, the socket can be handed from one thread to another, as long as only one thread uses it at a time
+        """
+        commandsocket = zmqclient.ZmqClient(self.controllerIp, self.taskzmqport, self._ctx, checkcallerthread=checkcallerthread)
+        if self._metrics is not None:
+            commandsocket.SetMetrics(self._metrics)
+        return commandsocket
+
+    @contextlib.contextmanager
+    def UseWorkerCommandSocket(self):
+        """Within the context, zmq commands executed from the calling thread are sent through one of the command sockets this client keeps for worker threads. The socket is kept connected and reused by later workers, so that fanning out commands does not connect again on every call. Does nothing if the client is not connected through zmq.
+        """
+        if self._commandsocket is None:
+            yield None
+            return
+        with self._workercommandsocketslock:
+            commandsocket = self._workercommandsockets.pop() if len(self._workercommandsockets) > 0 else None
+        if commandsocket is None:
+            commandsocket = self.CreateCommandSocket(checkcallerthread=False)
+        try:
+            with self.UseCommandSocket(commandsocket):
+                yield commandsocket
+        finally:
+            with self._workercommandsocketslock:
+                if self._isok:
+                    self._workercommandsockets.append(commandsocket)
+                    commandsocket = None
+            if commandsocket is not None:
+                commandsocket.Destroy()
+
+    @contextlib.contextmanager
+    def UseCommandSocket(self, commandsocket):
+        """Within the context, zmq commands executed from the calling thread are sent through commandsocket instead of the default command socket. Other threads are not affected.
+        """
+        previouscommandsocket = getattr(self._threadlocal, 'commandsocket', None)
+        self._threadlocal.commandsocket = commandsocket
+        try:
+            yield commandsocket
+        finally:
+            self._threadlocal.commandsocket = previouscommandsocket
+
+    def _GetCommandSocket(self):
+        """Returns the command socket of the calling thread
+        """
+        if self._threadlocal is not None:
+            commandsocket = getattr(self._threadlocal, 'commandsocket', None)
+            if commandsocket is not None:
+                return commandsocket
+        return self._commandsocket
+
+    def _ExecuteCommandsConcurrently(self, taskparameterslist, maxworkers=4, usewebapi=None, timeout=None):
+        """Executes independent commands concurrently and returns their outputs in the same order. Through zmq, each command is sent through one of the worker command sockets, see UseWorkerCommandSocket. Raises the first error after all commands finished.
+        """
+        if usewebapi is None:
+            usewebapi = self._usewebapi
+        if len(taskparameterslist) <= 1 or maxworkers <= 1:
+            return [self.ExecuteCommand(taskparameters, usewebapi=usewebapi, timeout=timeout) for taskparameters in taskparameterslist]
+
+        def _Execute(taskparameters):
+            if usewebapi:
+                return self.ExecuteCommand(taskparameters, usewebapi=usewebapi, timeout=timeout)
+            with self.UseWorkerCommandSocket():
+                return self.ExecuteCommand(taskparameters, usewebapi=usewebapi, timeout=timeout)
+
+        pool = ThreadPool(min(maxworkers, len(taskparameterslist)))
+        try:
+            return pool.map(_Execute, taskparameterslist, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    def SetHighPriorityCommands(self, commands):
+        """Sets the command names sent through the dedicated high priority zmq channel. These commands can be sent from any thread while other commands are in flight, without waiting behind them. Only used if the client was created with a separate taskhighpriorityport.
+        :param commands: Iterable of command names, e.g. DEFAULT_HIGH_PRIORITY_COMMANDS | {'SetRobotBridgeServoOn'}
+        """
+        self._highprioritycommands = set(commands)
+
+    def GetHighPriorityCommands(self):
+        return set(self._highprioritycommands)
+
+    def GetCommandEncoding(self):
+        """Returns the encoding used for commands sent through zmq, either binarycodec.ENCODING_JSON or binarycodec.ENCODING_MSGPACK
+        """
+        return self._commandencoding
+
+    def NegotiateCommandEncoding(self, encodings=None, timeout=5):
+        """Asks the task server which encoding to use for commands sent through zmq. Falls back to json if msgpack is not installed or if the server does not support negotiating.
+
+        With msgpack, numpy arrays in taskparameters are sent as raw binary frames, and large numeric results come back as numpy arrays.
+
+        :param encodings: Encodings in order of preference, defaults to msgpack then json
+        :return: The encoding now in use
+        """
+        if encodings is None:
+            encodings = [binarycodec.ENCODING_MSGPACK, binarycodec.ENCODING_JSON]
+        if not binarycodec.IsAvailable():
+            encodings = [encoding for encoding in encodings if encoding != binarycodec.ENCODING_MSGPACK]
+        encoding = binarycodec.ENCODING_JSON
+        if self._configsocket is not None and binarycodec.ENCODING_MSGPACK in encodings:
+            try:
+                output = self.SendConfig({'command': 'negotiateencoding', 'encodings': encodings}, timeout=timeout, fireandforget=False)
+                if output and output.get('encoding') in encodings:
+                    encoding = output['encoding']
+            except APIServerError as e:
+                log.warn('task server does not support encoding negotiation, using json: %s', e)
+        self._commandencoding = encoding
+        return encoding
+
     def DeleteJobs(self, usewebapi=True, timeout=5):
         """Cancels all jobs
         """
@@ -154,7 +368,7 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
             socket.setsockopt(zmq.TCP_KEEPALIVE_INTVL, 2) # the interval between subsequential keepalive probes, regardless of what the connection has exchanged in the meantime
             socket.setsockopt(zmq.TCP_KEEPALIVE_CNT, 2) # the number of unacknowledged probes to send before considering the connection dead and notifying the application layer
             socket.connect('tcp://%s:%s' % (self.controllerIp, self.taskheartbeatport))
-            socket.setsockopt(zmq.SUBSCRIBE, '')
+            socket.setsockopt(zmq.SUBSCRIBE, b'')
             poller = zmq.Poller()
             poller.register(socket, zmq.POLLIN)
             
@@ -163,7 +377,7 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
                 socks = dict(poller.poll(50))
                 if socket in socks and socks.get(socket) == zmq.POLLIN:
                     try:
-                        reply = socket.recv_json(zmq.NOBLOCK)
+                        reply = jsoncodec.Loads(socket.recv(zmq.NOBLOCK))
                         if 'slavestates' in reply:
                             self._taskstate = reply.get('slavestates', {}).get('slaverequestid-%s'%self._slaverequestid, None)
                             lastheartbeatts = GetMonotonicTime()
@@ -216,6 +430,18 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
         """
         return self.ExecuteTaskSync(self.scenepk, self.tasktype, taskparameters, slaverequestid=slaverequestid, timeout=timeout)
 
+    def _AcquireHighPriorityLock(self, highprioritysocket, timeout=None, checkpreempt=True):
+        """Waits for the high priority command in flight from another thread, at most timeout seconds
+        """
+        starttime = GetMonotonicTime()
+        while not self._highprioritylock.acquire(False):
+            elapsedtime = GetMonotonicTime() - starttime
+            if timeout is not None and elapsedtime > timeout:
+                raise TimeoutError(u'Timed out waiting for the high priority command in flight after %f seconds' % elapsedtime)
+            if checkpreempt:
+                highprioritysocket.CheckPreempt()
+            time.sleep(0.001)
+
     def _ExecuteCommandViaZMQ(self, taskparameters, slaverequestid='', timeout=None, fireandforget=None, checkpreempt=True, respawnopts=None):
         command = {
             'fnname': 'RunCommand',
@@ -229,7 +455,24 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
             'stamp': time.time(),
             'respawnopts': respawnopts,
         }
-        response = self._commandsocket.SendCommand(command, timeout=timeout, fireandforget=fireandforget, checkpreempt=checkpreempt)
+        tracer = self._tracer
+        if tracer is not None:
+            span = tracer.GetCurrentSpan()
+            if span is not None:
+                command[tracing.TRACEPARENT_HEADER] = span.GetTraceParent()
+        usemsgpack = self._commandencoding == binarycodec.ENCODING_MSGPACK
+        if self._highprioritysocket is not None and taskparameters.get('command') in self._highprioritycommands:
+            highprioritysocket = self._highprioritysocket
+            starttime = GetMonotonicTime()
+            self._AcquireHighPriorityLock(highprioritysocket, timeout=timeout, checkpreempt=checkpreempt)
+            try:
+                if timeout is not None:
+                    timeout = max(0.0, timeout - (GetMonotonicTime() - starttime))
+                response = highprioritysocket.SendCommand(command, timeout=timeout, fireandforget=fireandforget, checkpreempt=checkpreempt, sendmsgpack=usemsgpack, recvmsgpack=usemsgpack, metricsname=taskparameters.get('command'))
+            finally:
+                self._highprioritylock.release()
+        else:
+            response = self._GetCommandSocket().SendCommand(command, timeout=timeout, fireandforget=fireandforget, checkpreempt=checkpreempt, sendmsgpack=usemsgpack, recvmsgpack=usemsgpack, metricsname=taskparameters.get('command'))
 
         if fireandforget:
             # For fire and forget commands, no response will be available
@@ -245,6 +488,63 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
 
         return response['output']
 
+    def EnableCommandCoalescing(self, commands, freshness=0):
+        """Declares commands as read-only, so that identical concurrent calls share one request. Calls are identical when their parameters other than stamp are equal. The output is shared among the callers and must not be modified.
+        :param commands: List of command names, e.g. ['GetState', 'GetPickPlaceStatus'], or a dict mapping command names to their freshness
+        :param freshness: Seconds after a request finished during which its output is returned to identical calls without sending a new request. 0 only shares requests in flight
+        """
+        if not isinstance(commands, dict):
+            commands = dict((command, freshness) for command in commands)
+        with self._coalescinglock:
+            self._coalescedcommands.update(commands)
+
+    def DisableCommandCoalescing(self, commands=None):
+        """Stops coalescing commands, or all commands if None
+        """
+        with self._coalescinglock:
+            if commands is None:
+                self._coalescedcommands.clear()
+                self._coalescedrequests.clear()
+            else:
+                for command in commands:
+                    self._coalescedcommands.pop(command, None)
+
+    def _ExecuteCoalescedCommand(self, requestkey, freshness, executefn, timeout=None):
+        with self._coalescinglock:
+            inflight = self._coalescedrequests.get(requestkey)
+            isleader = inflight is None or (inflight.event.is_set() and GetMonotonicTime() - inflight.finishtime > freshness)
+            if isleader:
+                if len(self._coalescedrequests) >= 256:
+                    # drop finished requests that cannot be reused anymore
+                    now = GetMonotonicTime()
+                    for key, request in list(self._coalescedrequests.items()):
+                        if request.event.is_set() and now - request.finishtime > request.freshness:
+                            del self._coalescedrequests[key]
+                inflight = self._coalescedrequests[requestkey] = _InFlightCommand()
+                inflight.freshness = freshness
+
+        if not isleader:
+            # wait at most the timeout of this call, not the one of the call in flight
+            if not inflight.event.wait(timeout):
+                raise TimeoutError(u'Timed out after %f seconds waiting for the same command in flight' % timeout)
+            if inflight.error is not None:
+                raise _CopyException(inflight.error)
+        else:
+            try:
+                inflight.output = executefn()
+            except Exception as e:
+                inflight.error = e
+                raise
+            finally:
+                with self._coalescinglock:
+                    inflight.finishtime = GetMonotonicTime()
+                    if inflight.error is not None or freshness <= 0:
+                        # errors and outputs without freshness are only shared with the calls already waiting
+                        if self._coalescedrequests.get(requestkey) is inflight:
+                            del self._coalescedrequests[requestkey]
+                inflight.event.set()
+        return inflight.output
+
     def ExecuteCommand(self, taskparameters, usewebapi=None, slaverequestid=None, timeout=None, fireandforget=None, respawnopts=None):
         """Executes command with taskparameters
         :param taskparameters: Task parameters in json format
@@ -261,6 +561,56 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
         if usewebapi is None:
             usewebapi = self._usewebapi
 
+        if self._coalescedcommands and not fireandforget and taskparameters.get('command') in self._coalescedcommands:
+            freshness = self._coalescedcommands.get(taskparameters['command'])
+            requestkey = None
+            try:
+                requestkey = (usewebapi, slaverequestid, json.dumps(dict((key, value) for key, value in taskparameters.items() if key != 'stamp'), sort_keys=True))
+            except (TypeError, ValueError):
+                log.debug('cannot coalesce %s with parameters that are not json serializable', taskparameters['command'])
+            if requestkey is not None and freshness is not None:
+                return self._ExecuteCoalescedCommand(requestkey, freshness, lambda: self._ExecuteCommand(taskparameters, usewebapi=usewebapi, slaverequestid=slaverequestid, timeout=timeout, fireandforget=fireandforget, respawnopts=respawnopts), timeout=timeout)
+        return self._ExecuteCommand(taskparameters, usewebapi=usewebapi, slaverequestid=slaverequestid, timeout=timeout, fireandforget=fireandforget, respawnopts=respawnopts)
+
+    def _ExecuteCommand(self, taskparameters, usewebapi, slaverequestid, timeout=None, fireandforget=None, respawnopts=None):
+        metrics = self._metrics
+        tracer = self._tracer
+        recorder = self._recorder
+        if metrics is None and tracer is None and recorder is None:
+            return self._ExecuteCommandVia(taskparameters, usewebapi, slaverequestid, timeout=timeout, fireandforget=fireandforget, respawnopts=respawnopts)
+
+        commandname = taskparameters.get('command', 'unknown')
+        span = None
+        if tracer is not None:
+            span = tracer.StartSpan('command', {'command': commandname, 'transport': 'webapi' if usewebapi else 'zmq', 'fireandforget': bool(fireandforget)})
+            if span.sampled:
+                try:
+                    span.SetAttribute('payloadsize', len(jsoncodec.Dumps(taskparameters)))
+                except (TypeError, ValueError):
+                    pass
+        record = None
+        if recorder is not None:
+            record = recorder.StartRecord(recordingmodule.RECORD_COMMAND, {'taskparameters': dict(taskparameters), 'usewebapi': bool(usewebapi), 'timeout': timeout, 'fireandforget': fireandforget})
+        starttime = GetMonotonicTime()
+        try:
+            output = self._ExecuteCommandVia(taskparameters, usewebapi, slaverequestid, timeout=timeout, fireandforget=fireandforget, respawnopts=respawnopts)
+        except Exception as e:
+            if metrics is not None:
+                metrics.RecordError('command', commandname, istimeout=isinstance(e, TimeoutError))
+            if span is not None:
+                span.End(error=e)
+            if recorder is not None:
+                recorder.EndRecord(record, error=e)
+            raise
+        if metrics is not None:
+            metrics.Record('command', commandname, metricsmodule.PHASE_TOTAL, GetMonotonicTime() - starttime)
+        if span is not None:
+            span.End()
+        if recorder is not None:
+            recorder.EndRecord(record, response=output)
+        return output
+
+    def _ExecuteCommandVia(self, taskparameters, usewebapi, slaverequestid, timeout=None, fireandforget=None, respawnopts=None):
         if usewebapi:
             return self._ExecuteCommandViaWebAPI(taskparameters, timeout=timeout, slaverequestid=slaverequestid)
         else:
@@ -292,11 +642,21 @@ class PlanningControllerClient(controllerclientbase.ControllerClient):
         if slaverequestid is None:
             slaverequestid = self._slaverequestid
 
-        return self._SendConfigViaZMQ(command, slaverequestid=slaverequestid, timeout=timeout, fireandforget=fireandforget)
+        recorder = self._recorder
+        if recorder is None:
+            return self._SendConfigViaZMQ(command, slaverequestid=slaverequestid, timeout=timeout, fireandforget=fireandforget)
+        record = recorder.StartRecord(recordingmodule.RECORD_CONFIG, {'command': dict(command), 'timeout': timeout, 'fireandforget': fireandforget})
+        try:
+            output = self._SendConfigViaZMQ(command, slaverequestid=slaverequestid, timeout=timeout, fireandforget=fireandforget)
+        except Exception as e:
+            recorder.EndRecord(record, error=e)
+            raise
+        recorder.EndRecord(record, response=output)
+        return output
 
     def _SendConfigViaZMQ(self, command, slaverequestid='', timeout=None, fireandforget=None, checkpreempt=True):
         command['slaverequestid'] = slaverequestid
-        response = self._configsocket.SendCommand(command, timeout=timeout, fireandforget=fireandforget, checkpreempt=checkpreempt)
+        response = self._configsocket.SendCommand(command, timeout=timeout, fireandforget=fireandforget, checkpreempt=checkpreempt, metricsname=command.get('command'))
         if fireandforget:
             # For fire and forget commands, no response will be available
             return None
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Vectorized conversions of batches of poses between numpy arrays and the envstate, goal and ik parameter formats of the task commands. Poses are [qw,qx,qy,qz,x,y,z] like OpenRAVE poses. Requires numpy, so only import this module where numpy is needed.
+"""
+
+import numpy
+
+from . import ControllerClientError
+from . import ugettext as _
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def ComputeMatricesFromQuaternions(quaternions):
+    """Converts (N,4) unit quaternions in w,x,y,z order to (N,3,3) rotation matrices
+    """
+    quaternions = numpy.asarray(quaternions, dtype=numpy.float64)
+    qw, qx, qy, qz = quaternions[:, 0], quaternions[:, 1], quaternions[:, 2], quaternions[:, 3]
+    rotations = numpy.empty((len(quaternions), 3, 3), dtype=numpy.float64)
+    rotations[:, 0, 0] = 1 - 2 * (qy * qy + qz * qz)
+    rotations[:, 0, 1] = 2 * (qx * qy - qz * qw)
+    rotations[:, 0, 2] = 2 * (qx * qz + qy * qw)
+    rotations[:, 1, 0] = 2 * (qx * qy + qz * qw)
+    rotations[:, 1, 1] = 1 - 2 * (qx * qx + qz * qz)
+    rotations[:, 1, 2] = 2 * (qy * qz - qx * qw)
+    rotations[:, 2, 0] = 2 * (qx * qz - qy * qw)
+    rotations[:, 2, 1] = 2 * (qy * qz + qx * qw)
+    rotations[:, 2, 2] = 1 - 2 * (qx * qx + qy * qy)
+    return rotations
+
+
+def ComputeQuaternionsFromMatrices(rotations):
+    """Converts (N,3,3) rotation matrices to (N,4) unit quaternions in w,x,y,z order with qw >= 0
+    """
+    rotations = numpy.asarray(rotations, dtype=numpy.float64)
+    m00, m11, m22 = rotations[:, 0, 0], rotations[:, 1, 1], rotations[:, 2, 2]
+    # compute the four candidates and keep the numerically largest one of each row
+    candidates = numpy.empty((len(rotations), 4, 4), dtype=numpy.float64)
+    t = 1 + m00 + m11 + m22
+    candidates[:, 0] = numpy.stack([t, rotations[:, 2, 1] - rotations[:, 1, 2], rotations[:, 0, 2] - rotations[:, 2, 0], rotations[:, 1, 0] - rotations[:, 0, 1]], axis=1)
+    t = 1 + m00 - m11 - m22
+    candidates[:, 1] = numpy.stack([rotations[:, 2, 1] - rotations[:, 1, 2], t, rotations[:, 0, 1] + rotations[:, 1, 0], rotations[:, 0, 2] + rotations[:, 2, 0]], axis=1)
+    t = 1 - m00 + m11 - m22
+    candidates[:, 2] = numpy.stack([rotations[:, 0, 2] - rotations[:, 2, 0], rotations[:, 0, 1] + rotations[:, 1, 0], t, rotations[:, 1, 2] + rotations[:, 2, 1]], axis=1)
+    t = 1 - m00 - m11 + m22
+    candidates[:, 3] = numpy.stack([rotations[:, 1, 0] - rotations[:, 0, 1], rotations[:, 0, 2] + rotations[:, 2, 0], rotations[:, 1, 2] + rotations[:, 2, 1], t], axis=1)
+    best = numpy.argmax(numpy.stack([1 + m00 + m11 + m22, 1 + m00 - m11 - m22, 1 - m00 + m11 - m22, 1 - m00 - m11 + m22], axis=1), axis=1)
+    quaternions = candidates[numpy.arange(len(rotations)), best]
+    quaternions /= numpy.linalg.norm(quaternions, axis=1)[:, None]
+    quaternions[quaternions[:, 0] < 0] *= -1
+    return quaternions
+
+
+class PoseBatch(object):
+    """Batch of N poses stored as one (N,7) float64 array of [qw,qx,qy,qz,x,y,z]
+    """
+
+    _poses = None  # (N,7) array of [qw,qx,qy,qz,x,y,z]
+
+    def __init__(self, poses):
+        """
+        :param poses: (N,7) array of [qw,qx,qy,qz,x,y,z], or (N,4,4) homogeneous transforms
+        """
+        poses = numpy.asarray(poses, dtype=numpy.float64)
+        if poses.ndim == 3 and poses.shape[1:] == (4, 4):
+            poses = numpy.hstack([ComputeQuaternionsFromMatrices(poses[:, :3, :3]), poses[:, :3, 3]])
+        elif poses.ndim == 1 and len(poses) == 0:
+            poses = poses.reshape((0, 7))
+        if poses.ndim != 2 or poses.shape[1] != 7:
+            raise ControllerClientError(_('Poses must have shape (N,7) or (N,4,4), got %r') % (poses.shape,))
+        self._poses = poses
+
+    @classmethod
+    def FromQuaternionsTranslations(cls, quaternions, translations):
+        """
+        :param quaternions: (N,4) quaternions in w,x,y,z order
+        :param translations: (N,3) translations
+        """
+        return cls(numpy.hstack([numpy.asarray(quaternions, dtype=numpy.float64).reshape((-1, 4)), numpy.asarray(translations, dtype=numpy.float64).reshape((-1, 3))]))
+
+    @classmethod
+    def FromEnvState(cls, envstate):
+        """Reads the poses of the objects of an envstate, see ToEnvState. Also returns the object names.
+
+        :return: A tuple of (posebatch, names)
+        """
+        quaternions = [envobject.get('quat_', envobject.get('quaternion')) for envobject in envstate]
+        translations = [envobject.get('translation_', envobject.get('translation')) for envobject in envstate]
+        return cls.FromQuaternionsTranslations(quaternions, translations), [envobject['name'] for envobject in envstate]
+
+    @classmethod
+    def FromBytes(cls, data):
+        """Inverse of ToBytes
+        """
+        return cls(numpy.frombuffer(data, dtype='<f8').reshape((-1, 7)))
+
+    def __len__(self):
+        return len(self._poses)
+
+    def __getitem__(self, index):
+        """Returns a PoseBatch of the selected poses, index can be a slice, an index array or a boolean mask
+        """
+        return PoseBatch(self._poses[index].reshape((-1, 7)))
+
+    @property
+    def poses(self):
+        """(N,7) array of [qw,qx,qy,qz,x,y,z]
+        """
+        return self._poses
+
+    @property
+    def quaternions(self):
+        return self._poses[:, :4]
+
+    @property
+    def translations(self):
+        return self._poses[:, 4:]
+
+    def GetMatrices(self):
+        """Returns (N,4,4) homogeneous transforms
+        """
+        matrices = numpy.zeros((len(self._poses), 4, 4), dtype=numpy.float64)
+        matrices[:, :3, :3] = ComputeMatricesFromQuaternions(self.quaternions)
+        matrices[:, :3, 3] = self.translations
+        matrices[:, 3, 3] = 1
+        return matrices
+
+    def GetDirections(self, localdirection=(0, 0, 1)):
+        """Returns (N,3) world directions of localdirection rotated by each pose, e.g. the direction of translationdirection5d goals
+        """
+        return numpy.dot(ComputeMatricesFromQuaternions(self.quaternions), numpy.asarray(localdirection, dtype=numpy.float64))
+
+    def ValidateQuaternions(self, tolerance=1e-3):
+        """Raises ControllerClientError if any quaternion is not finite or its norm differs from 1 by more than tolerance
+        """
+        norms = numpy.linalg.norm(self.quaternions, axis=1)
+        invalid = numpy.flatnonzero(~numpy.isfinite(self._poses).all(axis=1) | ~(numpy.abs(norms - 1) <= tolerance))
+        if len(invalid) > 0:
+            raise ControllerClientError(_('%d of %d poses have invalid quaternions, e.g. pose %d: %r') % (len(invalid), len(self._poses), invalid[0], self._poses[invalid[0]].tolist()))
+
+    def Normalize(self):
+        """Returns a PoseBatch with unit quaternions having qw >= 0
+        """
+        poses = self._poses.copy()
+        poses[:, :4] /= numpy.linalg.norm(poses[:, :4], axis=1)[:, None]
+        poses[poses[:, 0] < 0, :4] *= -1
+        return PoseBatch(poses)
+
+    def Transform(self, transform):
+        """Returns a PoseBatch of transform * pose for each pose, e.g. to convert from a sensor frame to the world frame
+
+        :param transform: 4x4 homogeneous transform
+        """
+        matrices = numpy.matmul(numpy.asarray(transform, dtype=numpy.float64), self.GetMatrices())
+        return PoseBatch(matrices)
+
+    def ToEnvState(self, names, object_uri=None, perobject=None, **kwargs):
+        """Returns an envstate for UpdateObjects
+
+        :param names: List of N object names
+        :param object_uri: If not None, object_uri of all objects, e.g. mujin:/box.mujin.dae
+        :param perobject: Dict mapping keys to lists of N values, one per object, e.g. {'isPickable': [True, False, True]}
+        :param kwargs: Other keys with the same value for all objects
+        """
+        if len(names) != len(self._poses):
+            raise ControllerClientError(_('Got %d names for %d poses') % (len(names), len(self._poses)))
+        for key, values in (perobject or {}).items():
+            if len(values) != len(names):
+                raise ControllerClientError(_('Got %d values of %s for %d poses') % (len(values), key, len(names)))
+        quaternions = self.quaternions.tolist()
+        translations = self.translations.tolist()
+        envstate = []
+        for index, name in enumerate(names):
+            envobject = {'name': name, 'quat_': quaternions[index], 'translation_': translations[index]}
+            if object_uri is not None:
+                envobject['object_uri'] = object_uri
+            envstate.append(envobject)
+        for key, value in kwargs.items():
+            for envobject in envstate:
+                envobject[key] = value
+        for key, values in (perobject or {}).items():
+            if isinstance(values, numpy.ndarray):
+                values = values.tolist()
+            for envobject, value in zip(envstate, values):
+                envobject[key] = value.tolist() if isinstance(value, numpy.ndarray) else value
+        return envstate
+
+    def ToGoals(self, goaltype='transform6d', localdirection=(0, 0, 1)):
+        """Returns the flat goal list of MoveToHandPosition and MoveToolLinear
+
+        :param goaltype: transform6d ([qw,qx,qy,qz,x,y,z] per goal), translationdirection5d ([x,y,z,dx,dy,dz] per goal with the direction of localdirection) or translation3d ([x,y,z] per goal)
+        """
+        if goaltype == 'transform6d':
+            goals = self._poses
+        elif goaltype == 'translationdirection5d':
+            goals = numpy.hstack([self.translations, self.GetDirections(localdirection)])
+        elif goaltype == 'translation3d':
+            goals = self.translations
+        else:
+            raise ControllerClientError(_('Unsupported goal type %s') % goaltype)
+        return goals.ravel().tolist()
+
+    def ToIKParameters(self, iktype='Transform6D'):
+        """Returns a list of dicts with iktype, quaternion and translation per pose, e.g. for ComputeIK
+
+        :param iktype: ik type of the ik parameters, using the quaternion and translation of the poses
+        """
+        return [{'iktype': iktype, 'quaternion': quaternion, 'translation': translation} for quaternion, translation in zip(self.quaternions.tolist(), self.translations.tolist())]
+
+    def ToBytes(self):
+        """Returns the poses as little-endian float64 bytes, 56 bytes per pose
+        """
+        return numpy.ascontiguousarray(self._poses, dtype='<f8').tobytes()
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Opt-in sampling profiler for the client side of the commands, e.g. json encoding and decoding, socket polling and preempt callbacks. A background thread samples the stacks of all threads at a fixed interval and keeps the samples that go through the scoped modules, so the overhead does not depend on the number of calls. Profiles are dumped as collapsed stacks for flame graphs, or as pstats files, per time window, to compare with the captures of StartProfiling on the controller.
+
+Enable it with StartProfiler, or with environment variables when the first client is created:
+
+- MUJIN_CONTROLLERCLIENT_PROFILE: Directory to dump the profiles into
+- MUJIN_CONTROLLERCLIENT_PROFILE_INTERVAL: Seconds between samples, defaults to 0.01
+- MUJIN_CONTROLLERCLIENT_PROFILE_WINDOW: Seconds per dumped profile, defaults to 60
+- MUJIN_CONTROLLERCLIENT_PROFILE_FORMAT: collapsed or pstats, defaults to collapsed
+"""
+
+import marshal
+import os
+import sys
+import threading
+import time
+
+from . import GetMonotonicTime
+
+import logging
+log = logging.getLogger(__name__)
+
+FORMAT_COLLAPSED = 'collapsed'  # One line per stack, frames separated by ; followed by the number of samples, as used by flamegraph.pl and speedscope
+FORMAT_PSTATS = 'pstats'  # marshal dump readable with pstats.Stats, with sample counts as call counts
+
+DEFAULT_SCOPES = ('mujincontrollerclient',)
+
+
+class SamplingProfiler(object):
+    """Samples the stacks of all threads from a background thread. Not reentrant, one profiler per process is enough, see StartProfiler.
+    """
+
+    _interval = None  # Seconds between samples
+    _scopes = None  # Tuple of module name prefixes, only stacks with a frame in these modules are kept
+    _outputdir = None  # Directory to dump the profile of each window into, None to not dump
+    _windowduration = None  # Seconds per dumped profile
+    _format = None  # FORMAT_COLLAPSED or FORMAT_PSTATS
+    _stacks = None  # Dict mapping tuples of (filename, firstlineno, funcname, modulename), outermost first, to their number of samples
+    _windowstarttime = None  # Monotonic time when the current window started
+    _windowindex = 0  # Index of the next dumped window, keeps the filenames unique
+    _lock = None  # Protects _stacks
+    _stopevent = None
+    _thread = None
+
+    def __init__(self, interval=0.01, scopes=DEFAULT_SCOPES, outputdir=None, windowduration=60.0, format=FORMAT_COLLAPSED):
+        """
+        :param interval: Seconds between samples
+        :param scopes: Module name prefixes, only stacks going through these modules are kept. None to keep all stacks
+        :param outputdir: Directory to dump the profile of each window into, None to only read them with GetCollapsedStacks or Dump
+        :param windowduration: Seconds per dumped profile, None for one profile dumped on Stop
+        :param format: FORMAT_COLLAPSED or FORMAT_PSTATS
+        """
+        if format not in (FORMAT_COLLAPSED, FORMAT_PSTATS):
+            raise ValueError('unknown profile format %r' % format)
+        self._interval = interval
+        self._scopes = tuple(scopes) if scopes is not None else None
+        self._outputdir = outputdir
+        self._windowduration = windowduration
+        self._format = format
+        self._stacks = {}
+        self._lock = threading.Lock()
+        self._stopevent = threading.Event()
+
+    def __del__(self):
+        self.Stop()
+
+    def IsRunning(self):
+        return self._thread is not None
+
+    def Start(self):
+        if self._thread is not None:
+            return
+        if self._outputdir is not None and not os.path.isdir(self._outputdir):
+            os.makedirs(self._outputdir)
+        self._stopevent.clear()
+        self._windowstarttime = GetMonotonicTime()
+        self._thread = threading.Thread(target=self._RunSamplerThread, name='mujincontrollerclientprofiler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Stop(self):
+        """Stops sampling and dumps the last window if outputdir is set
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopevent.set()
+        if thread is not threading.current_thread():
+            thread.join()
+        self._thread = None
+        if self._outputdir is not None:
+            self._DumpWindow()
+
+    def Reset(self):
+        with self._lock:
+            self._stacks = {}
+
+    def _RunSamplerThread(self):
+        ownthreadid = threading.current_thread().ident
+        while not self._stopevent.wait(self._interval):
+            try:
+                self._Sample(ownthreadid)
+                if self._outputdir is not None and self._windowduration is not None and GetMonotonicTime() - self._windowstarttime >= self._windowduration:
+                    self._DumpWindow()
+            except Exception as e:
+                log.exception('failed to sample stacks: %s', e)
+
+    def _Sample(self, ownthreadid):
+        scopes = self._scopes
+        stacks = []
+        for threadid, frame in sys._current_frames().items():
+            if threadid == ownthreadid:
+                continue
+            stack = []
+            inscope = scopes is None
+            while frame is not None:
+                code = frame.f_code
+                modulename = frame.f_globals.get('__name__', '')
+                if not inscope and modulename.startswith(scopes):
+                    inscope = True
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name, modulename))
+                frame = frame.f_back
+            if inscope:
+                stack.reverse()
+                stacks.append(tuple(stack))
+        with self._lock:
+            for stack in stacks:
+                self._stacks[stack] = self._stacks.get(stack, 0) + 1
+
+    def _PopWindow(self):
+        with self._lock:
+            stacks = self._stacks
+            self._stacks = {}
+        self._windowstarttime = GetMonotonicTime()
+        return stacks
+
+    def _DumpWindow(self):
+        stacks = self._PopWindow()
+        if len(stacks) == 0:
+            return
+        filename = os.path.join(self._outputdir, 'mujincontrollerclient-%d-%s-%04d.%s' % (os.getpid(), time.strftime('%Y%m%d-%H%M%S'), self._windowindex, 'collapsed' if self._format == FORMAT_COLLAPSED else 'prof'))
+        self._windowindex += 1
+        self._WriteStacks(filename, stacks, self._format)
+        log.debug('dumped client profile of %d stacks to %s', len(stacks), filename)
+
+    def GetCollapsedStacks(self):
+        """Returns a dict mapping collapsed stacks, e.g. "main:Run;mujincontrollerclient.zmqclient:SendCommand", to their number of samples in the current window
+        """
+        with self._lock:
+            stacks = dict(self._stacks)
+        return _CollapseStacks(stacks)
+
+    def Dump(self, filename, format=None, reset=False):
+        """Writes the profile of the current window to filename
+
+        :param format: FORMAT_COLLAPSED or FORMAT_PSTATS, defaults to the format of the profiler
+        :param reset: If True, starts a new window
+        """
+        if reset:
+            stacks = self._PopWindow()
+        else:
+            with self._lock:
+                stacks = dict(self._stacks)
+        self._WriteStacks(filename, stacks, format or self._format)
+
+    def _WriteStacks(self, filename, stacks, format):
+        if format == FORMAT_PSTATS:
+            with open(filename, 'wb') as f:
+                marshal.dump(_ComputePstats(stacks, self._interval), f)
+        else:
+            with open(filename, 'w') as f:
+                for collapsedstack, count in sorted(_CollapseStacks(stacks).items()):
+                    f.write('%s %d\n' % (collapsedstack, count))
+
+
+def _CollapseStacks(stacks):
+    collapsedstacks = {}
+    for stack, count in stacks.items():
+        collapsedstack = ';'.join('%s:%s' % (modulename, funcname) for filename, firstlineno, funcname, modulename in stack)
+        collapsedstacks[collapsedstack] = collapsedstacks.get(collapsedstack, 0) + count
+    return collapsedstacks
+
+
+def _ComputePstats(stacks, interval):
+    """Converts sampled stacks to the dict dumped by cProfile, mapping (filename, line, funcname) to (primitive calls, calls, own time, cumulative time, callers). Calls are numbers of samples.
+    """
+    stats = {}
+
+    def _GetEntry(function):
+        entry = stats.get(function)
+        if entry is None:
+            entry = stats[function] = [0, 0, 0.0, 0.0, {}]
+        return entry
+
+    for stack, count in stacks.items():
+        functions = [(filename, firstlineno, funcname) for filename, firstlineno, funcname, modulename in stack]
+        seconds = count * interval
+        leafentry = _GetEntry(functions[-1])
+        leafentry[2] += seconds
+        seen = set()
+        for index, function in enumerate(functions):
+            entry = _GetEntry(function)
+            if function not in seen:
+                # recursive functions are only counted once per sample
+                seen.add(function)
+                entry[0] += count
+                entry[1] += count
+                entry[3] += seconds
+            if index > 0:
+                caller = functions[index - 1]
+                callercc, callernc, callertt, callerct = entry[4].get(caller, (0, 0, 0.0, 0.0))
+                entry[4][caller] = (callercc + count, callernc + count, callertt + (seconds if index == len(functions) - 1 else 0.0), callerct + seconds)
+    return dict((function, tuple(entry)) for function, entry in stats.items())
+
+
+_profiler = None  # SamplingProfiler started by StartProfiler
+_profilerlock = threading.Lock()
+_checkedenvironment = False  # If True, StartProfilerFromEnvironment already ran
+
+
+def StartProfiler(interval=0.01, scopes=DEFAULT_SCOPES, outputdir=None, windowduration=60.0, format=FORMAT_COLLAPSED):
+    """Starts the process wide profiler, see SamplingProfiler for the parameters. Returns the running profiler, which is left unchanged if already running.
+    """
+    global _profiler
+    with _profilerlock:
+        if _profiler is None or not _profiler.IsRunning():
+            _profiler = SamplingProfiler(interval=interval, scopes=scopes, outputdir=outputdir, windowduration=windowduration, format=format)
+            _profiler.Start()
+        return _profiler
+
+
+def StopProfiler():
+    """Stops the process wide profiler, dumping its last window. Returns the stopped profiler, or None if not started.
+    """
+    with _profilerlock:
+        profiler = _profiler
+    if profiler is not None:
+        profiler.Stop()
+    return profiler
+
+
+def GetProfiler():
+    return _profiler
+
+
+def StartProfilerFromEnvironment():
+    """Starts the process wide profiler if MUJIN_CONTROLLERCLIENT_PROFILE is set. Only checks the environment once per process.
+    """
+    global _checkedenvironment
+    if _checkedenvironment:
+        return _profiler
+    _checkedenvironment = True
+    outputdir = os.environ.get('MUJIN_CONTROLLERCLIENT_PROFILE', '').strip()
+    if not outputdir:
+        return None
+    try:
+        interval = float(os.environ.get('MUJIN_CONTROLLERCLIENT_PROFILE_INTERVAL', '') or 0.01)
+        windowduration = float(os.environ.get('MUJIN_CONTROLLERCLIENT_PROFILE_WINDOW', '') or 60.0)
+        profiler = StartProfiler(interval=interval, outputdir=outputdir, windowduration=windowduration, format=os.environ.get('MUJIN_CONTROLLERCLIENT_PROFILE_FORMAT', '').strip() or FORMAT_COLLAPSED)
+    except (ValueError, OSError) as e:
+        log.warn('ignoring MUJIN_CONTROLLERCLIENT_PROFILE: %s', e)
+        return None
+    log.info('profiling client into %s', outputdir)
+    return profiler
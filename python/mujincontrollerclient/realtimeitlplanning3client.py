@@ -2,8 +2,17 @@
 # Copyright (C) 2017 MUJIN Inc.
 # Mujin controller client for bin picking task
 
+# system imports
+import time
+import hashlib
+import threading
+import collections
+
 # mujin imports
+from . import json
 from . import realtimerobotclient
+from . import APIServerError, ControllerClientError, TimeoutError, GetMonotonicTime
+from . import ugettext as _
 
 # logging
 import logging
@@ -13,6 +22,11 @@ log = logging.getLogger(__name__)
 class RealtimeITLPlanning3ControllerClient(realtimerobotclient.RealtimeRobotControllerClient):
     """Mujin controller client for realtimeitlplanning3 task
     """
+    _executiongraphcache = None  # OrderedDict mapping (programName, programhash, commandTimeout, totalTimeout, kwargsdump) to (program, executiongraph), least recently used first
+    _executiongraphcachesize = 16  # Maximum number of execution graphs kept in _executiongraphcache
+    _executiongraphcachelock = None  # Protects _executiongraphcache
+    _incrementalexecutiongraph = False  # True once a GenerateExecutionGraph output had supportsPreviousExecutionGraph, so the previous graph is worth sending
+    _trajectorystreamcapabilities = None  # Dictionary returned by GetTrajectoryStreamCapabilities, empty if streaming is not supported, None until asked
 
     def __init__(self, **kwargs):
         """Logs into the mujin controller, initializes realtimeitlplanning3 task, and sets up parameters
@@ -33,6 +47,8 @@ class RealtimeITLPlanning3ControllerClient(realtimerobotclient.RealtimeRobotCont
         :param robotaccelmult: Optional multiplier for forcing the acceleration
         """
         super(RealtimeITLPlanning3ControllerClient, self).__init__(tasktype='realtimeitlplanning3', **kwargs)
+        self._executiongraphcache = collections.OrderedDict()
+        self._executiongraphcachelock = threading.Lock()
 
     def SetJointValues(self, jointvalues, robotname=None, timeout=10, usewebapi=True, **kwargs):
         taskparameters = {
@@ -67,6 +83,108 @@ class RealtimeITLPlanning3ControllerClient(realtimerobotclient.RealtimeRobotCont
             taskparameters['robotaccelmult'] = robotaccelmult
         return self.ExecuteCommand(taskparameters, usewebapi=usewebapi, timeout=timeout, fireandforget=fireandforget)
 
+    def GetTrajectoryStreamCapabilities(self, usewebapi=None, timeout=10):
+        """Asks the server whether it accepts streamed trajectory segments, without moving the robot. The answer is cached per client.
+
+        :return: Dictionary with at least streaming set to True if supported, or None if the server does not support streaming
+        """
+        if self._trajectorystreamcapabilities is None:
+            try:
+                capabilities = self.ExecuteCommand({'command': 'GetTrajectoryStreamCapabilities'}, usewebapi=usewebapi, timeout=timeout)
+            except APIServerError as e:
+                log.debug('server does not support streaming trajectories: %s', e)
+                capabilities = None
+            if not isinstance(capabilities, dict) or not capabilities.get('streaming'):
+                capabilities = {}
+            self._trajectorystreamcapabilities = capabilities
+        return self._trajectorystreamcapabilities or None
+
+    def ExecuteTrajectoryStream(self, identifier, trajectorysegments, statevalues=None, stepping=False, cycles=1, restorevalues=None, envclearance=15, robotspeed=None, robotaccelmult=None, usewebapi=None, timeout=10, retryinterval=0.05, maxretries=None, **kwargs):
+        """Executes trajectories sent as a stream of segments, so that the robot can start moving as soon as the first segment is received instead of waiting for the whole program.
+
+        Before any segment is sent, GetTrajectoryStreamCapabilities checks that the server supports streaming, so that a server that does not never executes a partial motion. Each segment is then sent as soon as the iterable yields it, as one ExecuteTrajectory command with streaming enabled, and the server acknowledges it with its segmentindex. If the server's segment queue is full, it replies with accepted set to false and the same segment is sent again after retryafter (or retryinterval) seconds, which bounds the number of queued segments. After the last segment, an empty segment flagged with islastsegment ends the stream. If the stream cannot be completed, e.g. the iterable raises or a segment times out, AbortTrajectoryStream is sent so that the server stops the motion instead of waiting for more segments.
+
+        :param identifier: Identifier of the trajectory execution, shared by all segments
+        :param trajectorysegments: Iterable (e.g. a generator) of segments, each one a list of trajectories as accepted by ExecuteTrajectory
+        :param timeout: Timeout in seconds for each segment to be accepted, including retries
+        :param retryinterval: Seconds to wait before sending a segment again when the server did not give retryafter
+        :param maxretries: Maximum number of times a segment is sent again, None for no limit other than timeout
+        :return: Dictionary with numsegments, numretries, timeToFirstAck and the last ack from the server
+        """
+        if self.GetTrajectoryStreamCapabilities(usewebapi=usewebapi, timeout=timeout) is None:
+            raise ControllerClientError(_('Server does not support streaming trajectories, cannot execute %s as a stream') % identifier)
+
+        taskparameters = {
+            'command': 'ExecuteTrajectory',
+            'identifier': identifier,
+            'streaming': True,
+            'statevalues': statevalues,
+            'stepping': stepping,
+            'envclearance': envclearance,
+            'cycles': cycles,
+        }
+        if restorevalues is not None:
+            taskparameters['restorevalues'] = restorevalues
+        if robotspeed is not None:
+            taskparameters['robotspeed'] = robotspeed
+        if robotaccelmult is not None:
+            taskparameters['robotaccelmult'] = robotaccelmult
+        taskparameters.update(kwargs)
+
+        starttime = GetMonotonicTime()
+        stats = {'numsegments': 0, 'numretries': 0, 'timeToFirstAck': None, 'ack': None}
+
+        def _SendSegment(segmentindex, segment, islastsegment):
+            segmentparameters = dict(taskparameters)
+            segmentparameters.update({
+                'trajectories': segment,
+                'segmentindex': segmentindex,
+                'islastsegment': islastsegment,
+            })
+            segmentstarttime = GetMonotonicTime()
+            numretries = 0
+            while True:
+                ack = self.ExecuteCommand(dict(segmentparameters), usewebapi=usewebapi, timeout=timeout) or {}
+                if ack.get('segmentindex') != segmentindex:
+                    raise ControllerClientError(_('Unexpected ack while streaming trajectory segment %d of %s: %r') % (segmentindex, identifier, ack))
+                if ack.get('accepted', True):
+                    break
+                elapsedtime = GetMonotonicTime() - segmentstarttime
+                if elapsedtime > timeout:
+                    raise TimeoutError(_('Timed out after %f seconds waiting for server to accept trajectory segment %d of %s') % (elapsedtime, segmentindex, identifier))
+                if maxretries is not None and numretries >= maxretries:
+                    raise ControllerClientError(_('Server did not accept trajectory segment %d of %s after %d retries') % (segmentindex, identifier, numretries))
+                numretries += 1
+                stats['numretries'] += 1
+                time.sleep(ack.get('retryafter', retryinterval))
+            if stats['timeToFirstAck'] is None:
+                stats['timeToFirstAck'] = GetMonotonicTime() - starttime
+            stats['ack'] = ack
+
+        started = False  # True once a segment may have reached the server
+        completed = False
+        try:
+            for segmentindex, segment in enumerate(trajectorysegments):
+                started = True
+                _SendSegment(segmentindex, segment, False)
+                stats['numsegments'] += 1
+            if stats['numsegments'] == 0:
+                raise ControllerClientError(_('No trajectory segment to execute for %s') % identifier)
+            _SendSegment(stats['numsegments'], [], True)
+            completed = True
+        finally:
+            if started and not completed:
+                self._AbortTrajectoryStream(identifier, usewebapi=usewebapi, timeout=timeout)
+        return stats
+
+    def _AbortTrajectoryStream(self, identifier, usewebapi=None, timeout=10):
+        """Tells the server to stop executing a stream that will not be completed. Errors are logged, so that the error that interrupted the stream is the one raised.
+        """
+        try:
+            self.ExecuteCommand({'command': 'AbortTrajectoryStream', 'identifier': identifier}, usewebapi=usewebapi, timeout=timeout)
+        except Exception as e:
+            log.exception('failed to abort trajectory stream %s: %s', identifier, e)
+
     def ExecuteTrajectoryStep(self, reverse=False, envclearance=15, robotspeed=None, robotaccelmult=None, usewebapi=True, timeout=10, fireandforget=False):
         taskparameters = {
             'command': 'ExecuteTrajectoryStep',
@@ -95,6 +213,37 @@ class RealtimeITLPlanning3ControllerClient(realtimerobotclient.RealtimeRobotCont
         taskparameters.update(kwargs)
         return self.ExecuteCommand(taskparameters, usewebapi=usewebapi, timeout=timeout, fireandforget=fireandforget)
 
+    def ComputeRobotConfigsForCommandVisualizationBatch(self, executiongraph, commandindices, usewebapi=True, timeout=2, **kwargs):
+        """Computes the robot configs for many commands of an execution graph in one request, sending the graph only once.
+
+        Falls back to one ComputeRobotConfigsForCommandVisualization call per command index if the server does not support commandindices.
+
+        :param commandindices: List of command indices
+        :param timeout: Timeout in seconds for the batch request, and for each request when falling back
+        :return: List of results, in the same order as commandindices
+        """
+        commandindices = list(commandindices)
+        if len(commandindices) == 0:
+            return []
+        batchcommand = 'ComputeRobotConfigsForCommandVisualizationBatch'
+        if batchcommand not in self._unsupportedbatchcommands:
+            taskparameters = {
+                'command': 'ComputeRobotConfigsForCommandVisualization',
+                'executiongraph': executiongraph,
+                'commandindices': commandindices,
+            }
+            taskparameters.update(kwargs)
+            try:
+                output = self.ExecuteCommand(taskparameters, usewebapi=usewebapi, timeout=timeout)
+                if isinstance(output, dict) and len(output.get('results') or []) == len(commandindices):
+                    return output['results']
+                log.debug('server did not return batch results for %d command indices, falling back to one request per command', len(commandindices))
+                self._unsupportedbatchcommands.add(batchcommand)
+            except APIServerError as e:
+                log.debug('server does not support batch command visualization, falling back to one request per command: %s', e)
+                self._unsupportedbatchcommands.add(batchcommand)
+        return [self.ComputeRobotConfigsForCommandVisualization(executiongraph, commandindex=commandindex, usewebapi=usewebapi, timeout=timeout, **kwargs) for commandindex in commandindices]
+
     def ComputeRobotJointValuesForCommandVisualization(self, program, commandindex=0, usewebapi=True, timeout=2, fireandforget=False, **kwargs):
         taskparameters = {
             'command': 'ComputeRobotJointValuesForCommandVisualization',
@@ -144,6 +293,77 @@ class RealtimeITLPlanning3ControllerClient(realtimerobotclient.RealtimeRobotCont
         taskparameters.update(kwargs)
         return self.ExecuteCommand(taskparameters, timeout=timeout, usewebapi=usewebapi, fireandforget=fireandforget)
 
+    @staticmethod
+    def _GetITLProgramCommands(program):
+        """Returns the list of commands of an itl program, used to find the unchanged prefix between two versions of a program
+        """
+        commands = program.get('commands')
+        if isinstance(commands, list):
+            return commands
+        programtext = program.get('program')
+        if programtext:
+            return programtext.splitlines()
+        return []
+
+    @staticmethod
+    def _ComputeITLProgramHash(program):
+        """Returns the sha1 of the content of an itl program, ignoring bookkeeping fields that change without changing the program
+        """
+        content = dict((key, value) for key, value in program.items() if key not in ('created', 'modified', 'lastModified', 'pk'))
+        return hashlib.sha1(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def GetExecutionGraph(self, programName, commandTimeout=0.2, totalTimeout=1.0, timeout=10, usewebapi=None, forceregenerate=False, **kwargs):
+        """Returns the execution graph of the itl program, only generating it when the program content changed since the last call.
+
+        The program is fetched with GetITLProgram and its content hash, with the timeouts and the other arguments, is the cache key. When the program changed and the server showed it supports it by setting supportsPreviousExecutionGraph in a generated graph, GenerateExecutionGraph is called with the previous graph as previousExecutionGraph and the number of leading commands that did not change as unchangedCommandCount, so that the server can reuse the unchanged prefix.
+
+        :param forceregenerate: If True, ignore the cache and always generate the graph
+        """
+        program = self.GetITLProgram(programName)
+        programhash = self._ComputeITLProgramHash(program)
+        cachekey = (programName, programhash, commandTimeout, totalTimeout, json.dumps(kwargs, sort_keys=True))
+        with self._executiongraphcachelock:
+            cached = self._executiongraphcache.get(cachekey)
+            if cached is not None and not forceregenerate:
+                # move to the end as the most recently used
+                self._executiongraphcache.pop(cachekey)
+                self._executiongraphcache[cachekey] = cached
+                return cached[1]
+
+            # find the most recent graph of the same program to reuse its unchanged prefix
+            previous = None
+            if self._incrementalexecutiongraph:
+                for key in reversed(self._executiongraphcache):
+                    if key[0] == programName and key[2:] == cachekey[2:]:
+                        previous = self._executiongraphcache[key]
+                        break
+
+        if previous is not None:
+            previousprogram, previousgraph = previous
+            unchangedcommandcount = 0
+            for previouscommand, command in zip(self._GetITLProgramCommands(previousprogram), self._GetITLProgramCommands(program)):
+                if previouscommand != command:
+                    break
+                unchangedcommandcount += 1
+            if unchangedcommandcount > 0:
+                kwargs.setdefault('previousExecutionGraph', previousgraph)
+                kwargs.setdefault('unchangedCommandCount', unchangedcommandcount)
+
+        executiongraph = self.GenerateExecutionGraph(programName, commandTimeout=commandTimeout, totalTimeout=totalTimeout, timeout=timeout, usewebapi=usewebapi, **kwargs)
+        self._incrementalexecutiongraph = isinstance(executiongraph, dict) and bool(executiongraph.get('supportsPreviousExecutionGraph'))
+        with self._executiongraphcachelock:
+            self._executiongraphcache.pop(cachekey, None)
+            self._executiongraphcache[cachekey] = (program, executiongraph)
+            while len(self._executiongraphcache) > self._executiongraphcachesize:
+                self._executiongraphcache.popitem(last=False)
+        return executiongraph
+
+    def ClearExecutionGraphCache(self):
+        """Drops all execution graphs cached by GetExecutionGraph
+        """
+        with self._executiongraphcachelock:
+            self._executiongraphcache.clear()
+
     def PlotContacts(self, report={}, usewebapi=False, timeout=1, fireandforget=True, **kwargs):
         taskparameters = {
             'command': 'PlotContacts',
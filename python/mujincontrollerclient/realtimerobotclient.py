@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 # Copyright (C) 2012-2015 MUJIN Inc
 
+import os
+
 from . import json
 from . import planningclient
+from . import APIServerError, ControllerClientError
+from . import ugettext as _
 
 import logging
 log = logging.getLogger(__name__)
@@ -14,6 +18,7 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
     _robotaccelmult = None  # Current robot accel mult
     _envclearance = None  # Environment clearance in millimeters, e.g. 20
     _robotBridgeConnectionInfo = None  # dict holding the connection info for the robot bridge.
+    _unsupportedbatchcommands = None  # Set of batch query commands, e.g. GetTransforms, that the server does not support
     
     def __init__(self, robotname, robotspeed=None, robotaccelmult=None, envclearance=10.0, robotBridgeConnectionInfo=None, **kwargs):
         """
@@ -38,6 +43,7 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
         self._robotaccelmult = robotaccelmult
         self._envclearance = envclearance
         self._robotBridgeConnectionInfo = robotBridgeConnectionInfo
+        self._unsupportedbatchcommands = set()
 
     def GetRobotConnectionInfo(self):
         """ """
@@ -156,12 +162,31 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
         taskparameters.update(kwargs)
         return self.ExecuteCommand(taskparameters, timeout=timeout)
 
+    def SubscribeRobotState(self, port, dof, capacity=1024, topic=b'', encoding='json', extractfn=None):
+        """Subscribes to robot joint states published by the controller, instead of polling GetJointValues.
+
+        Samples are received on a background thread into a preallocated ring buffer. Use GetLatest on the returned subscriber to read them. The subscriber shares the zmq context of this client, so Destroy it before destroying the client.
+
+        Args:
+            port (int): Port of the robot state publisher on the controller
+            dof (int): Number of joint values per sample
+            capacity (int, optional): Number of samples kept in the ring buffer. (Default: 1024)
+            topic (bytes, optional): Topic to subscribe to, sent by the publisher as the first frame when not empty
+            encoding (str, optional): Either 'json' or 'msgpack'. (Default: 'json')
+            extractfn (function, optional): Converts a decoded message to (timestamp, jointvalues). Defaults to reading timestamp and jointvalues keys.
+
+        Returns:
+            robotstatesubscriber.RobotStateSubscriber: Running subscriber
+        """
+        from . import robotstatesubscriber
+        return robotstatesubscriber.RobotStateSubscriber('tcp://%s:%d' % (self.controllerIp, port), dof, capacity=capacity, ctx=self._ctx, topic=topic, encoding=encoding, extractfn=extractfn)
+
     def MoveToolLinear(self, goaltype, goals, toolname=None, timeout=10, robotspeed=None, **kwargs):
         """Moves the tool linear
 
         Args:
             goaltype (str): Type of the goal, e.g. translationdirection5d
-            goals (list[float]): Flat list of goals, e.g. two 5D ik goals: [380,450,50,0,0,1, 380,450,50,0,0,-1]
+            goals (list[float]): Flat list of goals, e.g. two 5D ik goals: [380,450,50,0,0,1, 380,450,50,0,0,-1], or a poseutils.PoseBatch
             toolname (str, optional): Name of the manipulator. Default: self.toolname
             timeout (float, optional):  (Default: 10)
             robotspeed (float, optional):
@@ -175,6 +200,9 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
             workignorelastcollisionee (float): time, necessary in case goal is in collision, has to be multiples of step length?
             workignorefirstcollision (float):
         """
+        if hasattr(goals, 'ToGoals'):
+            # poseutils.PoseBatch
+            goals = goals.ToGoals(goaltype)
         taskparameters = {
             'command': 'MoveToolLinear',
             'goaltype': goaltype,
@@ -188,7 +216,7 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
 
         Args:
             goaltype (str): Type of the goal, e.g. translationdirection5d
-            goals (list[float]): Flat list of goals, e.g. two 5d ik goals: [380,450,50,0,0,1, 380,450,50,0,0,-1]
+            goals (list[float]): Flat list of goals, e.g. two 5d ik goals: [380,450,50,0,0,1, 380,450,50,0,0,-1], or a poseutils.PoseBatch
             toolname (str, optional): Name of the manipulator. Default: self.toolname
             envclearance (float): Clearance in millimeter. Default: self.envclearances
             closegripper: Whether to close gripper once the goal is reached. Default: 0
@@ -196,6 +224,9 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
             robotaccelmult (float, optional):
             timeout (float, optional):  (Default: 10)
         """
+        if hasattr(goals, 'ToGoals'):
+            # poseutils.PoseBatch
+            goals = goals.ToGoals(goaltype)
         taskparameters = {
             'command': 'MoveToHandPosition',
             'goaltype': goaltype,
@@ -205,7 +236,7 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
         taskparameters.update(kwargs)
         return self.ExecuteCommand(taskparameters, robotspeed=robotspeed, robotaccelmult=robotaccelmult, envclearance=envclearance, toolname=toolname, timeout=timeout)
 
-    def UpdateObjects(self, envstate, targetname=None, state=None, unit="mm", timeout=10, **kwargs):
+    def UpdateObjects(self, envstate, targetname=None, state=None, unit="mm", timeout=10, encodestate=True, **kwargs):
         """Updates objects in the scene with the envstate
 
         Args:
@@ -214,6 +245,7 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
             state (optional):
             unit (str, optional): Unit of envstate. Default: mm
             timeout (float, optional):  (Default: 10)
+            encodestate (bool, optional): If True, state is sent as a json string inside the command. If False, state is sent as an object, avoiding encoding it twice. (Default: True)
         """
         taskparameters = {
             'command': 'UpdateObjects',
@@ -224,8 +256,23 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
             taskparameters['object_uri'] = u'mujin:/%s.mujin.dae' % (targetname)
         taskparameters.update(kwargs)
         if state is not None:
-            taskparameters['state'] = json.dumps(state)
+            taskparameters['state'] = json.dumps(state) if encodestate else state
         return self.ExecuteCommand(taskparameters, timeout=timeout)
+
+    def CreateEnvStateTracker(self, translationtolerance=0.5, rotationtolerance=0.001, fullresyncinterval=None, encodestate=True):
+        """Creates a tracker whose UpdateObjects only sends the objects that were added, removed or moved since the last acknowledged update, and falls back to a full resync after an error.
+
+        Args:
+            translationtolerance (float, optional): Objects that moved less than this, in the envstate unit, are not sent. (Default: 0.5)
+            rotationtolerance (float, optional): Objects that rotated less than this, in radians, are not sent. (Default: 0.001)
+            fullresyncinterval (float, optional): If set, seconds after which the whole envstate is sent again.
+            encodestate (bool, optional): If True, state is sent as a json string. Set to False only if the server accepts state as an object. (Default: True)
+
+        Returns:
+            envstatetracker.EnvStateTracker: Tracker to call UpdateObjects on
+        """
+        from . import envstatetracker
+        return envstatetracker.EnvStateTracker(self, translationtolerance=translationtolerance, rotationtolerance=rotationtolerance, fullresyncinterval=fullresyncinterval, encodestate=encodestate)
     
     def Grab(self, targetname, toolname=None, timeout=10, **kwargs):
         """Grabs an object with tool
@@ -424,6 +471,130 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
         }
         taskparameters.update(kwargs)
         return self.ExecuteCommand(taskparameters, timeout=timeout)
+
+    def _ExecuteBatchQuery(self, command, targetnames=None, targetnamepattern=None, unit='mm', timeout=10, maxworkers=4, arraykeys=None, **kwargs):
+        """Executes the batch variant of a single target query, e.g. GetTransforms for GetTransform, falling back to concurrent single queries if the server does not support it.
+
+        The batch command gets targetnames or targetnamepattern and returns {'results': {targetname: result}}.
+
+        :param arraykeys: If not None, returns a dict with names and, for each key, a numpy array stacking that key of all results
+        :return: Dict mapping target names to the results of the single query
+        """
+        if targetnames is None and targetnamepattern is None:
+            raise ControllerClientError(_('Either targetnames or targetnamepattern must be specified'))
+        batchcommand = command + 's'
+        results = None
+        if batchcommand not in self._unsupportedbatchcommands:
+            taskparameters = {
+                'command': batchcommand,
+                'unit': unit,
+            }
+            if targetnames is not None:
+                taskparameters['targetnames'] = list(targetnames)
+            if targetnamepattern is not None:
+                taskparameters['targetnamepattern'] = targetnamepattern
+            taskparameters.update(kwargs)
+            try:
+                output = self.ExecuteCommand(taskparameters, timeout=timeout)
+                if isinstance(output, dict) and isinstance(output.get('results'), dict):
+                    results = output['results']
+                else:
+                    log.debug('server did not return batch results for %s, falling back to single queries', batchcommand)
+                    self._unsupportedbatchcommands.add(batchcommand)
+            except APIServerError as e:
+                log.debug('server does not support %s, falling back to single queries: %s', batchcommand, e)
+                self._unsupportedbatchcommands.add(batchcommand)
+
+        if results is None:
+            if targetnames is None:
+                raise ControllerClientError(_('Server does not support %s, so targetnamepattern %s cannot be resolved') % (batchcommand, targetnamepattern))
+            targetnames = list(targetnames)
+            taskparameterslist = []
+            for targetname in targetnames:
+                taskparameters = {
+                    'command': command,
+                    'targetname': targetname,
+                    'unit': unit,
+                }
+                taskparameters.update(kwargs)
+                taskparameterslist.append(taskparameters)
+            results = dict(zip(targetnames, self._ExecuteCommandsConcurrently(taskparameterslist, maxworkers=maxworkers, timeout=timeout)))
+
+        if arraykeys is None:
+            return results
+        import numpy
+        names = list(targetnames) if targetnames is not None else sorted(results.keys())
+        arrays = {'names': names}
+        for key in arraykeys:
+            arrays[key] = numpy.array([results[name][key] for name in names], dtype=numpy.float64)
+        return arrays
+
+    def GetTransforms(self, targetnames=None, targetnamepattern=None, unit='mm', timeout=10, maxworkers=4, asarrays=False, **kwargs):
+        """Gets the transforms of many objects in one command. If the server does not support it, calls GetTransform concurrently.
+
+        Args:
+            targetnames (list[str], optional): Names of the objects
+            targetnamepattern (str, optional): Regular expression matching the names of the objects, only supported by servers with batch queries
+            unit (str, optional): The unit of the given values. (Default: 'mm')
+            timeout (float, optional): Time in seconds after which the command is assumed to have failed. (Default: 10)
+            maxworkers (int, optional): Maximum number of concurrent GetTransform calls when falling back. (Default: 4)
+            asarrays (bool, optional): If True, returns a dict with names, and translation (N,3) and quaternion (N,4) numpy arrays in the same order
+
+        Returns:
+            dict: Dict mapping object names to transforms like GetTransform
+        """
+        return self._ExecuteBatchQuery('GetTransform', targetnames=targetnames, targetnamepattern=targetnamepattern, unit=unit, timeout=timeout, maxworkers=maxworkers, arraykeys=('translation', 'quaternion') if asarrays else None, **kwargs)
+
+    def GetOBBs(self, targetnames=None, targetnamepattern=None, unit='mm', timeout=10, maxworkers=4, asarrays=False, **kwargs):
+        """Gets the oriented bounding boxes (OBB) of many objects in one command. If the server does not support it, calls GetOBB concurrently.
+
+        Args:
+            targetnames (list[str], optional): Names of the objects
+            targetnamepattern (str, optional): Regular expression matching the names of the objects, only supported by servers with batch queries
+            unit (str, optional): The unit of the given values. (Default: 'mm')
+            timeout (float, optional): Time in seconds after which the command is assumed to have failed. (Default: 10)
+            maxworkers (int, optional): Maximum number of concurrent GetOBB calls when falling back. (Default: 4)
+            asarrays (bool, optional): If True, returns a dict with names, and extents (N,3), translation (N,3) and quaternion (N,4) numpy arrays in the same order
+            linkname (str, optional): Name of link to use for OBB. If not specified, uses entire target.
+
+        Returns:
+            dict: Dict mapping object names to OBBs like GetOBB
+        """
+        return self._ExecuteBatchQuery('GetOBB', targetnames=targetnames, targetnamepattern=targetnamepattern, unit=unit, timeout=timeout, maxworkers=maxworkers, arraykeys=('extents', 'translation', 'quaternion') if asarrays else None, **kwargs)
+
+    def GetInnerEmptyRegionOBBs(self, targetnames=None, targetnamepattern=None, unit='mm', timeout=10, maxworkers=4, asarrays=False, **kwargs):
+        """Gets the inner empty oriented bounding boxes (OBB) of many containers in one command. If the server does not support it, calls GetInnerEmptyRegionOBB concurrently.
+
+        Args:
+            targetnames (list[str], optional): Names of the containers
+            targetnamepattern (str, optional): Regular expression matching the names of the containers, only supported by servers with batch queries
+            unit (str, optional): The unit of the given values. (Default: 'mm')
+            timeout (float, optional): Time in seconds after which the command is assumed to have failed. (Default: 10)
+            maxworkers (int, optional): Maximum number of concurrent GetInnerEmptyRegionOBB calls when falling back. (Default: 4)
+            asarrays (bool, optional): If True, returns a dict with names, and extents (N,3), translation (N,3) and quaternion (N,4) numpy arrays in the same order
+            linkname (str, optional): Name of link to use for OBB. If not specified, uses entire target.
+
+        Returns:
+            dict: Dict mapping container names to OBBs like GetInnerEmptyRegionOBB
+        """
+        return self._ExecuteBatchQuery('GetInnerEmptyRegionOBB', targetnames=targetnames, targetnamepattern=targetnamepattern, unit=unit, timeout=timeout, maxworkers=maxworkers, arraykeys=('extents', 'translation', 'quaternion') if asarrays else None, **kwargs)
+
+    def GetAABBs(self, targetnames=None, targetnamepattern=None, unit='mm', timeout=10, maxworkers=4, asarrays=False, **kwargs):
+        """Gets the axis-aligned bounding boxes (AABB) of many objects in one command. If the server does not support it, calls GetAABB concurrently.
+
+        Args:
+            targetnames (list[str], optional): Names of the objects
+            targetnamepattern (str, optional): Regular expression matching the names of the objects, only supported by servers with batch queries
+            unit (str, optional): The unit of the given values. (Default: 'mm')
+            timeout (float, optional): Time in seconds after which the command is assumed to have failed. (Default: 10)
+            maxworkers (int, optional): Maximum number of concurrent GetAABB calls when falling back. (Default: 4)
+            asarrays (bool, optional): If True, returns a dict with names, and pos (N,3) and extents (N,3) numpy arrays in the same order
+            linkname (str, optional): Name of link to use for the AABB. If not specified, uses entire target.
+
+        Returns:
+            dict: Dict mapping object names to AABBs like GetAABB
+        """
+        return self._ExecuteBatchQuery('GetAABB', targetnames=targetnames, targetnamepattern=targetnamepattern, unit=unit, timeout=timeout, maxworkers=maxworkers, arraykeys=('pos', 'extents') if asarrays else None, **kwargs)
     
     def SetLocationTracking(self, timeout=10, usewebapi=None, fireandforget=False, **kwargs):
         """Resets the tracking of specific containers
@@ -585,6 +756,43 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
         taskparameters.update(kwargs)
         return self.ExecuteCommand(taskparameters, timeout=timeout)
 
+    def GetTrajectoryLogArrays(self, timeout=10, cachefilename=None, usecache=False, **kwargs):
+        """Gets the recent trajectories like GetTrajectoryLog with joint values, each timedjointvalues converted to a (numpoints, dof+1) numpy array whose last column is the trajectory time.
+
+        Args:
+            timeout (float, optional): Time in seconds after which the command is assumed to have failed. (Default: 10)
+            cachefilename (str, optional): If given, the fetched trajectories are saved to it as .npz, with the arguments.
+            usecache (bool, optional): If True and cachefilename holds trajectories fetched with the same arguments, trajectories are loaded from it instead of the controller. The server log is rotated and appended without any identity to compare against, so only use it when the log is known not to have changed since the cache was saved. (Default: False)
+            startindex (int): Start of the trajectory to get. If negative, will start counting from the end.
+            num (int): Number of trajectories from startindex to return. If 0 will return all the trajectories starting from startindex
+
+        Returns:
+            list: Trajectories, dicts with keys name, timestarted, numpoints, duration and timedjointvalues
+        """
+        from . import trajectoryutils
+        kwargs['includejointvalues'] = True
+        metadata = {'query': kwargs}
+        if usecache and cachefilename is not None and os.path.exists(cachefilename):
+            # compare in json form, which is how the query was saved
+            if trajectoryutils.LoadTrajectoriesMetadata(cachefilename) == json.loads(json.dumps(metadata)):
+                return trajectoryutils.LoadTrajectories(cachefilename)
+            log.debug('%s was fetched with other arguments, fetching trajectories again', cachefilename)
+        trajectories = [trajectoryutils.ConvertTrajectory(trajectory) for trajectory in self.GetTrajectoryLog(timeout=timeout, **kwargs).get('trajectories') or []]
+        if cachefilename is not None:
+            trajectoryutils.SaveTrajectories(cachefilename, trajectories, metadata=metadata)
+        return trajectories
+
+    def IterTrajectoryLog(self, startindex=0, pagesize=10, timeout=10):
+        """Iterates over the recent trajectories, fetching pagesize trajectories per GetTrajectoryLog call. Each trajectory is converted like in GetTrajectoryLogArrays.
+
+        Args:
+            startindex (int, optional): Index of the first trajectory. If negative, will start counting from the end.
+            pagesize (int, optional): Number of trajectories fetched per call. (Default: 10)
+            timeout (float, optional): Time in seconds after which each call is assumed to have failed. (Default: 10)
+        """
+        from . import trajectoryutils
+        return trajectoryutils.IterTrajectoryLog(self, startindex=startindex, pagesize=pagesize, timeout=timeout)
+
     def ChuckGripper(self, robotname=None, grippername=None, timeout=10, usewebapi=None, **kwargs):
         """Chucks the manipulator
 
@@ -857,6 +1065,20 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
         }
         taskparameters.update(kwargs)
         return self.ExecuteCommand(taskparameters, robotname=robotname, timeout=timeout, usewebapi=usewebapi)
+
+    def CreateIOVariableMap(self, ionames, dtypes=None, robotname=None):
+        """Creates a map of IO variables that are polled together. After the first poll, the server is queried with IO indices instead of names when it supports registration. Values are decoded from ASCII hex into typed values and callbacks only fire for IOs that changed.
+
+        Args:
+            ionames (list[str]): IO names to register
+            dtypes (str or dict, optional): numpy dtype of all IOs, or a dict mapping IO names to dtypes, e.g. {'bReady': '?', 'nCount': '<i4'}. IOs without a dtype are kept as raw bytes.
+            robotname (str, optional): Name of the robot
+
+        Returns:
+            iovariablemap.IOVariableMap: Map to Poll and SetValues on
+        """
+        from . import iovariablemap
+        return iovariablemap.IOVariableMap(self, ionames, dtypes=dtypes, robotname=robotname)
     
     def ComputeIkParamPosition(self, name, robotname=None, timeout=10, usewebapi=None, **kwargs):
         """Given the name of a Kinbody, computes the manipulator (TCP) position in the Kinbody frame to generate values for an IKParameterization.
@@ -1026,6 +1248,27 @@ class RealtimeRobotControllerClient(planningclient.PlanningControllerClient):
         taskparameters.update(kwargs)
         return self.ExecuteCommand(taskparameters, usewebapi=usewebapi, timeout=timeout, fireandforget=fireandforget)
 
+    def StartJogSession(self, rate=100.0, resendinterval=None, endtimeout=1.0, **kwargs):
+        """Starts a jog session sending SetJogModeVelocities at a fixed rate through its own zmq socket. Call SetVelocities on the session as often as needed, only the latest velocities are sent at each tick. Stop the session, or use it as a context manager, to bring the velocities to zero and end the jog mode.
+
+        Args:
+            rate (float, optional): Number of ticks per second. (Default: 100)
+            resendinterval (float, optional): If set, seconds after which the latest non-zero velocities are sent again even if unchanged.
+            endtimeout (float, optional): Timeout of the final EndJogMode call. (Default: 1)
+            robotname (str, optional): Name of the robot
+            toolname (str, optional): Name of the manipulator
+            robotspeed (float, optional): Value in (0,1] setting the percentage of robot speed to move at
+            robotaccelmult (float, optional): Value in (0,1] setting the percentage of robot acceleration to move at
+            jogtype (str): One of 'joints', 'world', 'robot', 'tool'
+
+        Returns:
+            jogsession.JogSession: Started session
+        """
+        from . import jogsession
+        session = jogsession.JogSession(self, rate=rate, resendinterval=resendinterval, endtimeout=endtimeout, **kwargs)
+        session.Start()
+        return session
+
     def SetRobotBridgeServoOn(self, servoon, robotname=None, timeout=3, fireandforget=False):
         """
 
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Record and replay of the traffic of a client, to reproduce slow cycles offline.
+
+TrafficRecorder appends one json line per ExecuteCommand, SendConfig, APICall and CallGraphAPI call, with its start time, duration, thread, request, response and their sizes. Enable it on a client with SetRecorder. Calls nested in a recorded call, e.g. the APICall of a command sent through the web api, are not recorded. Redaction hooks rewrite or drop each record before it is written; by default credentials are redacted.
+
+TrafficReplayer sends the recorded calls again, from one thread per recorded thread, at the original or an accelerated speed, e.g. against mujintestcontrollerclient.fakecontroller.FakeController configured with ConfigureStandInServer.
+"""
+
+import re
+import json as _stdlibjson
+import threading
+import time
+
+import six
+
+from . import GetMonotonicTime
+from .version import __version__
+
+import logging
+log = logging.getLogger(__name__)
+
+RECORD_COMMAND = 'command'  # ExecuteCommand
+RECORD_CONFIG = 'config'  # SendConfig
+RECORD_APICALL = 'api'  # ControllerWebClient.APICall
+RECORD_GRAPHQL = 'graphql'  # ControllerWebClient.CallGraphAPI
+
+REDACTED = '***'
+
+_graphOperationNameRegex = re.compile(r'^\s*(?:query|mutation|subscription)\s+(\w+)')
+
+_credentialKeywords = ('password', 'passwd', 'secret', 'token', 'authorization', 'credential', 'apikey', 'cookie')
+
+
+def _RedactValue(value):
+    if isinstance(value, dict):
+        return dict((key, REDACTED if isinstance(key, six.string_types) and any(keyword in key.lower() for keyword in _credentialKeywords) else _RedactValue(subvalue)) for key, subvalue in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_RedactValue(subvalue) for subvalue in value]
+    return value
+
+
+def RedactCredentials(record):
+    """Redaction hook replacing the values of the keys looking like credentials, e.g. password or token, in the request and the response
+    """
+    for key in ('request', 'response'):
+        if key in record:
+            record[key] = _RedactValue(record[key])
+    return record
+
+
+def _MakeSerializable(value):
+    if isinstance(value, dict):
+        return dict((key if isinstance(key, six.string_types) else str(key), _MakeSerializable(subvalue)) for key, subvalue in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_MakeSerializable(subvalue) for subvalue in value]
+    if hasattr(value, 'tolist'):
+        # numpy arrays and scalars
+        return value.tolist()
+    if value is None or isinstance(value, (bool, float) + six.integer_types + six.string_types):
+        return value
+    return repr(value)
+
+
+def _Dumps(value):
+    # always the standard json module, which keeps NaN and Infinity unlike some codecs selectable in jsoncodec, so that replays send the recorded values
+    try:
+        data = _stdlibjson.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    except (TypeError, ValueError, OverflowError):
+        data = _stdlibjson.dumps(_MakeSerializable(value), ensure_ascii=False, separators=(',', ':'))
+    if isinstance(data, six.text_type):
+        data = data.encode('utf-8')
+    return data
+
+
+def _Loads(data):
+    if not isinstance(data, six.text_type):
+        data = data.decode('utf-8')
+    return _stdlibjson.loads(data)
+
+
+class TrafficRecorder(object):
+    """Appends the calls of the clients it is set on to a json lines file. Thread-safe, can be shared by several clients.
+    """
+
+    _file = None  # File opened for appending
+    _ownfile = False  # If True, the file is closed by Close
+    _lock = None  # Serializes the writes
+    _threadlocal = None  # threading.local holding the record in progress of each thread, to skip nested calls
+    _redactionhooks = None  # List of functions(record) returning the record to write, or None to drop it
+    _maxresponsebytes = None  # Responses encoded larger than this are only recorded with their size
+    _seq = 0  # Sequence number of the last record
+    numrecords = 0  # Number of records written
+
+    def __init__(self, filename=None, fileobj=None, redactcredentials=True, maxresponsebytes=1000000):
+        """
+        :param filename: File to append the records to
+        :param fileobj: File object opened in binary mode to write the records to, instead of filename
+        :param redactcredentials: If True, adds RedactCredentials as first redaction hook
+        :param maxresponsebytes: Responses encoded larger than this are only recorded with their size. None to always record them
+        """
+        if fileobj is not None:
+            self._file = fileobj
+        else:
+            self._file = open(filename, 'ab')
+            self._ownfile = True
+        self._lock = threading.Lock()
+        self._threadlocal = threading.local()
+        self._redactionhooks = [RedactCredentials] if redactcredentials else []
+        self._maxresponsebytes = maxresponsebytes
+        self._WriteLine(_Dumps({'format': 'mujincontrollerclienttraffic', 'clientversion': __version__, 'time': time.time()}))
+
+    def __del__(self):
+        self.Close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.Close()
+
+    def Close(self):
+        if self._lock is None:
+            # __init__ failed, e.g. the file could not be opened
+            return
+        with self._lock:
+            if self._file is not None:
+                if self._ownfile:
+                    self._file.close()
+                else:
+                    self._file.flush()
+                self._file = None
+
+    def AddRedactionHook(self, hook):
+        """Adds a function(record) returning the record to write, or None to drop it. Hooks run in order, from the thread of the recorded call.
+        """
+        self._redactionhooks.append(hook)
+
+    def RemoveRedactionHook(self, hook):
+        self._redactionhooks = [redactionhook for redactionhook in self._redactionhooks if redactionhook is not hook]
+
+    def StartRecord(self, kind, request):
+        """Starts recording a call. Returns the record to pass to EndRecord, or None if the call is nested in another recorded call of the same thread.
+
+        :param kind: One of RECORD_COMMAND, RECORD_CONFIG, RECORD_APICALL, RECORD_GRAPHQL
+        :param request: Dict of the arguments needed to replay the call
+        """
+        if getattr(self._threadlocal, 'record', None) is not None:
+            return None
+        record = {
+            'kind': kind,
+            'time': time.time(),
+            'thread': threading.current_thread().name,
+            'request': request,
+            '_starttime': GetMonotonicTime(),
+        }
+        self._threadlocal.record = record
+        return record
+
+    def EndRecord(self, record, response=None, error=None):
+        """Writes the record of a call started with StartRecord. Errors while writing are logged, not raised.
+        """
+        if record is None:
+            return
+        self._threadlocal.record = None
+        try:
+            record['duration'] = GetMonotonicTime() - record.pop('_starttime')
+            if error is not None:
+                record['error'] = u'%s' % error
+                record['errortype'] = error.__class__.__name__
+            else:
+                record['response'] = response
+            for hook in self._redactionhooks:
+                record = hook(record)
+                if record is None:
+                    return
+
+            # encode the request and the response separately to know their sizes without encoding twice
+            requestdata = _Dumps(record.pop('request'))
+            record['requestsize'] = len(requestdata)
+            responsedata = None
+            if 'response' in record:
+                responsedata = _Dumps(record.pop('response'))
+                record['responsesize'] = len(responsedata)
+                if self._maxresponsebytes is not None and len(responsedata) > self._maxresponsebytes:
+                    responsedata = None
+                    record['responsetruncated'] = True
+            with self._lock:
+                if self._file is None:
+                    return
+                self._seq += 1
+                record['seq'] = self._seq
+                line = b'{"request":' + requestdata
+                if responsedata is not None:
+                    line += b',"response":' + responsedata
+                line += b',' + _Dumps(record)[1:]
+                self._WriteLine(line)
+                self.numrecords += 1
+        except Exception as e:
+            log.exception('failed to record %s call: %s', record.get('kind') if record is not None else None, e)
+
+    def _WriteLine(self, line):
+        self._file.write(line + b'\n')
+        self._file.flush()
+
+
+def LoadTraffic(filename):
+    """Returns the list of records of a file written by TrafficRecorder, in the order they were written. Lines that cannot be parsed, e.g. the last line of a recording interrupted while writing, are skipped.
+    """
+    records = []
+    with open(filename, 'rb') as f:
+        for iline, line in enumerate(f):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                record = _Loads(line)
+            except ValueError as e:
+                log.warn('skipping line %d of %s: %s', iline + 1, filename, e)
+                continue
+            if 'kind' in record:
+                records.append(record)
+    return records
+
+
+def ConfigureStandInServer(records, server):
+    """Makes a stand-in server such as FakeController answer each recorded command with its last recorded response, after the median recorded duration
+
+    :param server: Object with SetCommandHandler(command, handlefn) and SetCommandLatency(command, seconds)
+    """
+    durations = {}
+    responses = {}
+    for record in records:
+        if record['kind'] not in (RECORD_COMMAND, RECORD_CONFIG) or 'error' in record:
+            continue
+        command = (record['request'].get('taskparameters') or record['request'].get('command') or {}).get('command')
+        if command is None:
+            continue
+        durations.setdefault(command, []).append(record['duration'])
+        if 'response' in record:
+            responses[command] = record['response']
+    for command, commanddurations in durations.items():
+        commanddurations.sort()
+        server.SetCommandLatency(command, commanddurations[len(commanddurations) // 2])
+        if command in responses:
+            server.SetCommandHandler(command, lambda taskparameters, response=responses[command]: response)
+
+
+class TrafficReplayer(object):
+    """Replays recorded calls against a client, preserving the order and the concurrency of the recorded threads
+    """
+
+    _records = None  # List of records to replay
+    _cancelevent = None  # Set to stop replaying
+
+    def __init__(self, records):
+        """
+        :param records: List of records, e.g. from LoadTraffic
+        """
+        self._records = sorted(records, key=lambda record: (record['time'], record.get('seq', 0)))
+        self._cancelevent = threading.Event()
+
+    def Cancel(self):
+        self._cancelevent.set()
+
+    def Replay(self, client, speed=1.0, kinds=None, usewebapi=None):
+        """Sends the recorded calls through client and waits until all are done.
+
+        :param client: Client to send the calls through, a PlanningControllerClient or one of its subclasses
+        :param speed: Replay speed relative to the recording, e.g. 2 for twice faster. None to send each call as soon as the previous call of the same thread is done
+        :param kinds: Kinds of records to replay, defaults to all
+        :param usewebapi: Overrides the usewebapi of the recorded commands
+        :return: List of dicts with seq, kind, name, recordedduration, duration, delay (seconds the call started later than scheduled) and error, in the order of the records
+        """
+        records = [record for record in self._records if kinds is None or record['kind'] in kinds]
+        results = [None] * len(records)
+        if len(records) == 0:
+            return results
+        recordsbythread = {}
+        for index, record in enumerate(records):
+            recordsbythread.setdefault(record.get('thread'), []).append(index)
+
+        self._cancelevent.clear()
+        firsttime = records[0]['time']
+        starttime = GetMonotonicTime()
+
+        def _ReplayThread(indices):
+            commandsocket = None
+            if hasattr(client, 'CreateCommandSocket') and getattr(client, 'taskzmqport', None) is not None:
+                # ZmqClient must only be used from one thread, each replay thread has its own socket
+                commandsocket = client.CreateCommandSocket()
+            try:
+                for index in indices:
+                    if self._cancelevent.is_set():
+                        return
+                    record = records[index]
+                    delay = 0.0
+                    if speed is not None:
+                        scheduledtime = starttime + (record['time'] - firsttime) / speed
+                        if self._cancelevent.wait(max(0.0, scheduledtime - GetMonotonicTime())):
+                            return
+                        delay = GetMonotonicTime() - scheduledtime
+                    if commandsocket is not None:
+                        with client.UseCommandSocket(commandsocket):
+                            results[index] = self._ReplayRecord(client, record, usewebapi)
+                    else:
+                        results[index] = self._ReplayRecord(client, record, usewebapi)
+                    results[index]['delay'] = delay
+            finally:
+                if commandsocket is not None:
+                    commandsocket.Destroy()
+
+        threads = [threading.Thread(target=_ReplayThread, args=(indices,), name='replay-%s' % threadname) for threadname, indices in recordsbythread.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _ReplayRecord(self, client, record, usewebapi):
+        request = record['request']
+        kind = record['kind']
+        name = None
+        error = None
+        starttime = GetMonotonicTime()
+        try:
+            if kind == RECORD_COMMAND:
+                taskparameters = dict(request['taskparameters'])
+                taskparameters.pop('stamp', None)
+                name = taskparameters.get('command')
+                client.ExecuteCommand(taskparameters, usewebapi=request.get('usewebapi') if usewebapi is None else usewebapi, timeout=request.get('timeout'), fireandforget=request.get('fireandforget'))
+            elif kind == RECORD_CONFIG:
+                command = dict(request['command'])
+                name = command.get('command')
+                client.SendConfig(command, timeout=request.get('timeout'), fireandforget=request.get('fireandforget'))
+            elif kind == RECORD_APICALL:
+                name = '%s %s' % (request['method'], request['path'])
+                client._webclient.APICall(request['method'], request['path'], params=request.get('params'), fields=request.get('fields'), data=request.get('data'), expectedStatusCode=request.get('expectedStatusCode'), timeout=request.get('timeout') or 5)
+            elif kind == RECORD_GRAPHQL:
+                match = _graphOperationNameRegex.match(request['query'])
+                name = match.group(1) if match is not None else None
+                client._webclient.CallGraphAPI(request['query'], request.get('variables'), timeout=request.get('timeout') or 5.0)
+            else:
+                raise ValueError('unknown record kind %r' % kind)
+        except Exception as e:
+            error = u'%s' % e
+        return {
+            'seq': record.get('seq'),
+            'kind': kind,
+            'name': name,
+            'recordedduration': record.get('duration'),
+            'duration': GetMonotonicTime() - starttime,
+            'error': error,
+        }
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Subscriber receiving robot joint states published on a zmq PUB socket into a preallocated ring buffer, so that consumers can read the latest samples without polling the task server. Requires numpy, so only import this module where numpy is needed.
+"""
+
+import threading
+
+import numpy
+
+from . import zmq
+from . import binarycodec, jsoncodec
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def ExtractJointState(message):
+    """Default extraction of (timestamp, jointvalues) from a published message with keys timestamp (or stamp) and jointvalues (or currentjointvalues). Returns None if the message is not a joint state.
+    """
+    jointvalues = message.get('jointvalues')
+    if jointvalues is None:
+        jointvalues = message.get('currentjointvalues')
+    timestamp = message.get('timestamp', message.get('stamp'))
+    if jointvalues is None or timestamp is None:
+        return None
+    return timestamp, jointvalues
+
+
+class RobotStateRingBuffer(object):
+    """Fixed size buffer of timestamped joint values. Appending copies into preallocated arrays, so no memory is allocated per sample. Thread-safe.
+    """
+
+    _timestamps = None  # (capacity,) array of sample timestamps
+    _values = None  # (capacity, dof) array of joint values
+    _count = 0  # Total number of samples appended since the last Clear
+    _lock = None  # Protects the arrays and _count
+
+    def __init__(self, dof, capacity=1024):
+        self._timestamps = numpy.zeros(capacity, dtype=numpy.float64)
+        self._values = numpy.zeros((capacity, dof), dtype=numpy.float64)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return len(self._timestamps)
+
+    @property
+    def dof(self):
+        return self._values.shape[1]
+
+    @property
+    def count(self):
+        """Total number of samples appended, including the ones already overwritten
+        """
+        return self._count
+
+    def Append(self, timestamp, values):
+        with self._lock:
+            index = self._count % len(self._timestamps)
+            self._timestamps[index] = timestamp
+            self._values[index] = values
+            self._count += 1
+
+    def Clear(self):
+        with self._lock:
+            self._count = 0
+
+    def GetLatest(self, num=1, outtimestamps=None, outvalues=None):
+        """Returns the latest num samples, oldest first. Fewer samples are returned if fewer are available.
+
+        :param outtimestamps: Optional (num,) array to write the timestamps into, to avoid allocating
+        :param outvalues: Optional (num, dof) array to write the joint values into, to avoid allocating
+        :return: A tuple of (timestamps, values), views of the output arrays trimmed to the number of samples
+        """
+        capacity = len(self._timestamps)
+        if outtimestamps is None:
+            outtimestamps = numpy.empty(min(num, capacity), dtype=numpy.float64)
+        if outvalues is None:
+            outvalues = numpy.empty((min(num, capacity), self.dof), dtype=numpy.float64)
+        with self._lock:
+            num = min(num, capacity, self._count, len(outtimestamps), len(outvalues))
+            start = (self._count - num) % capacity
+            numfirst = min(num, capacity - start)
+            outtimestamps[:numfirst] = self._timestamps[start:start + numfirst]
+            outvalues[:numfirst] = self._values[start:start + numfirst]
+            if numfirst < num:
+                outtimestamps[numfirst:num] = self._timestamps[:num - numfirst]
+                outvalues[numfirst:num] = self._values[:num - numfirst]
+        return outtimestamps[:num], outvalues[:num]
+
+
+class RobotStateSubscriber(object):
+    """Runs a thread that subscribes to a zmq publisher of robot states and appends every joint state to a RobotStateRingBuffer
+    """
+
+    _url = None  # URL of the publisher, e.g. tcp://controller123:7115
+    _ctx = None  # zmq context
+    _ctxown = None  # zmq context owned by this class
+    _topic = None  # Topic to subscribe to, sent as the first frame by the publisher if not empty
+    _encoding = None  # Either binarycodec.ENCODING_JSON or binarycodec.ENCODING_MSGPACK
+    _extractfn = None  # Function converting a message to (timestamp, jointvalues) or None
+    _buffer = None  # RobotStateRingBuffer receiving the samples
+    _thread = None  # Subscriber thread
+    _isok = False  # If False, subscriber thread stops
+    _numreceived = 0  # Number of messages received
+    _numerrors = 0  # Number of messages that could not be decoded or extracted
+
+    def __init__(self, url, dof, capacity=1024, ctx=None, topic=b'', encoding=binarycodec.ENCODING_JSON, extractfn=None):
+        """
+        :param url: URL of the publisher, e.g. tcp://controller123:7115
+        :param dof: Number of joint values per sample
+        :param capacity: Number of samples kept in the ring buffer
+        :param topic: Topic to subscribe to. If not empty, the publisher sends it as the first frame of each message
+        :param encoding: binarycodec.ENCODING_JSON or binarycodec.ENCODING_MSGPACK
+        :param extractfn: Function converting a decoded message to (timestamp, jointvalues), or None to skip the message. Default: ExtractJointState
+        """
+        self._url = url
+        if ctx is None:
+            self._ctxown = ctx = zmq.Context()
+        self._ctx = ctx
+        self._topic = topic
+        self._encoding = encoding
+        self._extractfn = extractfn or ExtractJointState
+        self._buffer = RobotStateRingBuffer(dof, capacity=capacity)
+        self._isok = True
+        self._thread = threading.Thread(target=self._RunSubscriberThread, name='robotstatesubscriber')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __del__(self):
+        self.Destroy()
+
+    def Destroy(self):
+        self._isok = False
+        if self._thread is not None:
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+            self._thread = None
+        if self._ctxown is not None:
+            try:
+                self._ctxown.destroy()
+            except Exception:
+                pass
+            self._ctxown = None
+
+    @property
+    def buffer(self):
+        return self._buffer
+
+    @property
+    def numreceived(self):
+        return self._numreceived
+
+    @property
+    def numerrors(self):
+        return self._numerrors
+
+    def GetLatest(self, num=1, outtimestamps=None, outvalues=None):
+        """See RobotStateRingBuffer.GetLatest
+        """
+        return self._buffer.GetLatest(num, outtimestamps=outtimestamps, outvalues=outvalues)
+
+    def _DecodeMessage(self, frames):
+        if self._topic:
+            frames = frames[1:]
+        if self._encoding == binarycodec.ENCODING_MSGPACK:
+            return binarycodec.DecodeMessage(frames)
+        return jsoncodec.Loads(frames[0])
+
+    def _RunSubscriberThread(self):
+        log.debug('subscribing to robot states on %s', self._url)
+        socket = self._ctx.socket(zmq.SUB)
+        try:
+            socket.setsockopt(zmq.TCP_KEEPALIVE, 1)
+            socket.setsockopt(zmq.TCP_KEEPALIVE_IDLE, 2)
+            socket.setsockopt(zmq.TCP_KEEPALIVE_INTVL, 2)
+            socket.setsockopt(zmq.TCP_KEEPALIVE_CNT, 2)
+            socket.connect(self._url)
+            socket.setsockopt(zmq.SUBSCRIBE, self._topic)
+            while self._isok:
+                if socket.poll(50, zmq.POLLIN) != zmq.POLLIN:
+                    continue
+                # drain everything received since the last poll
+                while self._isok:
+                    try:
+                        frames = socket.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    self._numreceived += 1
+                    try:
+                        sample = self._extractfn(self._DecodeMessage(frames))
+                        if sample is not None:
+                            self._buffer.Append(sample[0], sample[1])
+                    except Exception as e:
+                        self._numerrors += 1
+                        if self._numerrors == 1:
+                            log.exception('failed to process robot state from %s: %s', self._url, e)
+        finally:
+            socket.close(linger=0)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Pluggable tracing of client calls. Spans follow the W3C trace context, so the traceparent sent in zmq commands and http headers ties a client call and its nested calls to the server logs. The trace id is the correlation id of all the calls made within one root span, e.g. one pick cycle.
+"""
+
+import random
+import threading
+
+from . import GetMonotonicTime
+
+import logging
+log = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'traceparent'  # Name of the http header and of the zmq command key carrying the traceparent
+
+
+def FormatTraceParent(traceid, spanid, sampled=True):
+    return '00-%s-%s-%s' % (traceid, spanid, '01' if sampled else '00')
+
+
+def ParseTraceParent(traceparent):
+    """Returns (traceid, spanid, sampled) from a traceparent string, or None if it is not valid
+    """
+    parts = (traceparent or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def _GenerateId(numbits):
+    return '%0*x' % (numbits // 4, random.getrandbits(numbits))
+
+
+class RatioSampler(object):
+    """Samples a fixed ratio of the traces. The decision only depends on the trace id, so every process seeing the same trace id takes the same decision.
+    """
+
+    _threshold = None  # Traces whose last 8 hex digits of the trace id are below are sampled
+
+    def __init__(self, ratio=1.0):
+        """
+        :param ratio: Ratio of the traces to sample, from 0 for none to 1 for all
+        """
+        self._threshold = int(max(0.0, min(1.0, ratio)) * 0x100000000)
+
+    def __call__(self, traceid, name, attributes):
+        return int(traceid[-8:], 16) < self._threshold
+
+
+class Span(object):
+    """One traced operation. Use it as a context manager, or call End. Attributes are only kept when sampled.
+    """
+
+    name = None
+    traceid = None  # Hex trace id shared by all the spans of the trace
+    spanid = None  # Hex id of this span
+    parentspanid = None  # Hex id of the parent span, None for a root span
+    sampled = False  # If True, the span is passed to the hooks of the tracer
+    attributes = None  # Dict of attributes, e.g. command, transport, payloadsize, outcome
+    starttime = None  # Monotonic time when the span started
+    duration = None  # Seconds between start and end, None until ended
+    error = None  # Exception that ended the span, if any
+    _tracer = None
+    _previousspan = None  # Current span of the thread before this span started, restored on End
+
+    def __init__(self, tracer, name, traceid, spanid, parentspanid, sampled, attributes):
+        self._tracer = tracer
+        self.name = name
+        self.traceid = traceid
+        self.spanid = spanid
+        self.parentspanid = parentspanid
+        self.sampled = sampled
+        self.attributes = dict(attributes or {}) if sampled else {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.End(error=excvalue)
+
+    def SetAttribute(self, key, value):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def GetTraceParent(self):
+        return FormatTraceParent(self.traceid, self.spanid, self.sampled)
+
+    def End(self, error=None, outcome=None):
+        """Ends the span, sets its outcome attribute and makes its parent the current span of the thread again. Ending twice is ignored.
+
+        :param error: Exception that ended the span, if any
+        :param outcome: Outcome attribute, defaults to ok, error or timeout depending on error
+        """
+        if self.duration is not None:
+            return
+        self.duration = GetMonotonicTime() - self.starttime
+        self.error = error
+        if outcome is None:
+            if error is None:
+                outcome = 'ok'
+            elif 'Timeout' in error.__class__.__name__:
+                outcome = 'timeout'
+            else:
+                outcome = 'error'
+        self.SetAttribute('outcome', outcome)
+        self._tracer._EndSpan(self)
+
+
+class Tracer(object):
+    """Creates spans and calls the start and end hooks for the sampled ones. Enable it on a client with SetTracer. Spans started from a thread are children of the span current in that thread.
+    """
+
+    _sampler = None  # Function(traceid, name, attributes) returning True to sample a new trace
+    _starthooks = None  # List of functions called with each sampled span when it starts
+    _endhooks = None  # List of functions called with each sampled span when it ends
+    _threadlocal = None  # threading.local holding the current span of each thread
+
+    def __init__(self, sampler=None, samplingratio=1.0):
+        """
+        :param sampler: Function(traceid, name, attributes) returning True to sample a new trace. Defaults to a RatioSampler
+        :param samplingratio: Ratio of the traces sampled by the default sampler
+        """
+        self._sampler = sampler or RatioSampler(samplingratio)
+        self._starthooks = []
+        self._endhooks = []
+        self._threadlocal = threading.local()
+
+    def AddSpanHooks(self, onstart=None, onend=None):
+        """Adds functions called with each sampled span when it starts and when it ends, e.g. to export spans. Hooks are called from the thread of the traced call and must be fast; their errors are logged.
+        """
+        if onstart is not None:
+            self._starthooks.append(onstart)
+        if onend is not None:
+            self._endhooks.append(onend)
+
+    def RemoveSpanHooks(self, onstart=None, onend=None):
+        self._starthooks = [hook for hook in self._starthooks if hook is not onstart]
+        self._endhooks = [hook for hook in self._endhooks if hook is not onend]
+
+    def GetCurrentSpan(self):
+        """Returns the span current in the calling thread, or None
+        """
+        return getattr(self._threadlocal, 'span', None)
+
+    def StartSpan(self, name, attributes=None, traceparent=None):
+        """Starts a span and makes it the current span of the calling thread until it ends
+
+        :param name: Name of the span, e.g. command or http
+        :param attributes: Dict of attributes
+        :param traceparent: traceparent string to continue a trace started elsewhere. Defaults to the current span of the thread
+        """
+        parent = self.GetCurrentSpan()
+        parsed = ParseTraceParent(traceparent) if traceparent is not None else None
+        if parsed is not None:
+            traceid, parentspanid, sampled = parsed
+        elif parent is not None:
+            traceid, parentspanid, sampled = parent.traceid, parent.spanid, parent.sampled
+        else:
+            traceid = _GenerateId(128)
+            parentspanid = None
+            sampled = bool(self._sampler(traceid, name, attributes))
+        span = Span(self, name, traceid, _GenerateId(64), parentspanid, sampled, attributes)
+        span._previousspan = parent
+        self._threadlocal.span = span
+        span.starttime = GetMonotonicTime()
+        if sampled:
+            self._CallHooks(self._starthooks, span)
+        return span
+
+    def _EndSpan(self, span):
+        if self.GetCurrentSpan() is span:
+            self._threadlocal.span = span._previousspan
+        if span.sampled:
+            self._CallHooks(self._endhooks, span)
+
+    def _CallHooks(self, hooks, span):
+        for hook in hooks:
+            try:
+                hook(span)
+            except Exception as e:
+                log.exception('tracing hook %r failed: %s', hook, e)
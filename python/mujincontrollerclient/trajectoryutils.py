@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Helpers to convert trajectory logs returned by GetTrajectoryLog into numpy arrays, page through them and cache them on disk. Requires numpy, so only import this module where numpy is needed.
+"""
+
+import numpy
+
+from . import json
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def ConvertTimedJointValues(timedjointvalues, numpoints):
+    """Converts the flat timedjointvalues list [J1, J2, J3, t, J1, J2, J3, t, ...] into a (numpoints, dof+1) float64 array, the last column being the trajectory time
+    """
+    if numpoints == 0:
+        return numpy.empty((0, 0), dtype=numpy.float64)
+    values = numpy.array(timedjointvalues, dtype=numpy.float64)
+    if len(values) % numpoints != 0:
+        raise ValueError('timedjointvalues of length %d cannot be split into %d points' % (len(values), numpoints))
+    return values.reshape(numpoints, -1)
+
+
+def ConvertTrajectory(trajectory):
+    """Returns a copy of a trajectory from GetTrajectoryLog with timedjointvalues converted to a (numpoints, dof+1) array
+    """
+    trajectory = dict(trajectory)
+    if 'timedjointvalues' in trajectory:
+        numpoints = trajectory.get('numpoints')
+        if numpoints is None:
+            raise ValueError('trajectory %r has no numpoints' % trajectory.get('name'))
+        trajectory['timedjointvalues'] = ConvertTimedJointValues(trajectory['timedjointvalues'], numpoints)
+    return trajectory
+
+
+def IterTrajectoryLog(client, startindex=0, pagesize=10, timeout=10):
+    """Fetches the trajectory log page by page with includejointvalues and yields the trajectories one by one, converted with ConvertTrajectory
+
+    The server drops trajectories older than 10 minutes, so trajectories can be skipped if the log shifts while paging.
+
+    :param client: RealtimeRobotControllerClient
+    :param startindex: Index of the first trajectory. If negative, counts from the end
+    :param pagesize: Number of trajectories fetched per GetTrajectoryLog call
+    """
+    assert pagesize > 0
+    while True:
+        response = client.GetTrajectoryLog(timeout=timeout, startindex=startindex, num=pagesize, includejointvalues=True)
+        trajectories = response.get('trajectories') or []
+        if startindex < 0:
+            # continue with absolute indices since the end of the log moves as new trajectories are executed
+            startindex = max(0, response.get('total', 0) + startindex)
+        for trajectory in trajectories:
+            yield ConvertTrajectory(trajectory)
+        startindex += len(trajectories)
+        if len(trajectories) < pagesize or startindex >= response.get('total', 0):
+            return
+
+
+def SaveTrajectories(filename, trajectories, metadata=None):
+    """Saves converted trajectories in a columnar .npz file: one array per field plus all timedjointvalues concatenated. All trajectories with joint values need the same dof.
+
+    :param metadata: Optional json serializable value saved with the trajectories, read back with LoadTrajectoriesMetadata, e.g. the query the trajectories were fetched with
+    """
+    timedjointvalues = [trajectory['timedjointvalues'] for trajectory in trajectories if 'timedjointvalues' in trajectory and len(trajectory['timedjointvalues']) > 0]
+    if len(set(values.shape[1] for values in timedjointvalues)) > 1:
+        raise ValueError('cannot save trajectories with different dof in one file')
+    offsets = numpy.zeros(len(trajectories) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(trajectory.get('timedjointvalues', ())) for trajectory in trajectories], out=offsets[1:])
+    extra = [dict((key, value) for key, value in trajectory.items() if key not in ('name', 'timestarted', 'duration', 'numpoints', 'timedjointvalues')) for trajectory in trajectories]
+    with open(filename, 'wb') as f:
+        numpy.savez(
+            f,
+            name=numpy.array([trajectory.get('name') or '' for trajectory in trajectories], dtype=numpy.str_),
+            timestarted=numpy.array([trajectory.get('timestarted', 0) for trajectory in trajectories], dtype=numpy.int64),
+            duration=numpy.array([trajectory.get('duration', 0) for trajectory in trajectories], dtype=numpy.float64),
+            numpoints=numpy.array([trajectory.get('numpoints', 0) for trajectory in trajectories], dtype=numpy.int64),
+            offsets=offsets,
+            timedjointvalues=numpy.concatenate(timedjointvalues) if timedjointvalues else numpy.empty((0, 0), dtype=numpy.float64),
+            extra=numpy.array(json.dumps(extra)),
+            metadata=numpy.array(json.dumps(metadata)),
+        )
+
+
+def LoadTrajectoriesMetadata(filename):
+    """Returns the metadata saved by SaveTrajectories, None if there was none
+    """
+    with numpy.load(filename) as data:
+        if 'metadata' not in data.files:
+            return None
+        return json.loads(str(data['metadata']))
+
+
+def LoadTrajectories(filename):
+    """Loads trajectories saved by SaveTrajectories. The timedjointvalues of each trajectory are views into one array.
+    """
+    with numpy.load(filename) as data:
+        timedjointvalues = data['timedjointvalues']
+        offsets = data['offsets']
+        extra = json.loads(str(data['extra']))
+        trajectories = []
+        for index in range(len(offsets) - 1):
+            trajectory = dict(extra[index])
+            trajectory.update({
+                'name': str(data['name'][index]),
+                'timestarted': int(data['timestarted'][index]),
+                'duration': float(data['duration'][index]),
+                'numpoints': int(data['numpoints'][index]),
+                'timedjointvalues': timedjointvalues[offsets[index]:offsets[index + 1]],
+            })
+            trajectories.append(trajectory)
+    return trajectories
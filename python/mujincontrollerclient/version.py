@@ -1,3 +1,3 @@
-__version__ = '0.17.1'
+__version__ = '0.18.0'
 
 # Do not forget to update CHANGELOG.md
@@ -6,6 +6,8 @@ import six
 
 from . import zmq
 from . import TimeoutError, UserInterrupt, GetMonotonicTime
+from . import binarycodec, jsoncodec
+from . import metrics as metricsmodule
 
 import logging
 log = logging.getLogger(__name__)
@@ -208,6 +210,19 @@ class ZmqSocketPool(object):
 
         raise UserInterrupt(u'Interrupted while acquiring socket, ZMQ socket pool is stopping')
 
+    def GetStatistics(self):
+        """Returns a dict with the numbers of sockets alive, polling and available, and the open, close, acquire and release counts
+        """
+        return {
+            'numsockets': len(self._sockets),
+            'numpollingsockets': len(self._pollingsockets),
+            'numavailablesockets': len(self._availablesockets),
+            'opencount': self._opencount,
+            'closecount': self._closecount,
+            'acquirecount': self._acquirecount,
+            'releasecount': self._releasecount,
+        }
+
     def ReleaseSocket(self, socket, reuse=True):
         """Release a socket after use. If caller did not call recv, the pool will take care of that
         """
@@ -229,8 +244,13 @@ class ZmqClient(object):
     _isok = False
     _callerthread = None  # Last caller thread
     _callercontext = None  # The context of the last caller
+    _checkcallerthread = True  # If True, log an error when the client is used from another thread than the last caller
+    _metrics = None  # metrics.MetricsRegistry recording the latency of each phase of the commands, None to not record
+    _metricscomponent = 'zmq'  # Component name of the recorded metrics
+    _metricsname = None  # Operation name of the command in flight
+    _metricsstarttime = None  # Monotonic time when the command in flight started
 
-    def __init__(self, hostname='', port=0, ctx=None, limit=100, url=None, checkpreemptfn=None, reusetimeout=10.0):
+    def __init__(self, hostname='', port=0, ctx=None, limit=100, url=None, checkpreemptfn=None, reusetimeout=10.0, checkcallerthread=True):
         """Creates a new zmq client. Uses zmq req socket over tcp.
 
         :param hostname: Hostname or ip to connect to
@@ -240,6 +260,7 @@ class ZmqClient(object):
         :param url: Allow passing of zmq socket url instead of hostname and port
         :param checkpreemptfn: A function handle to preempt the socket. The function should raise an exception if a preempt is desired.
         :param reusetimeout: Sets the "timeout" parameter of the ZmqSocketPool instance
+        :param checkcallerthread: If True (default), log an error when the client is used from multiple threads. Set to False only if the caller serializes all calls itself, e.g. with a lock
         """
 
         self._hostname = hostname
@@ -252,6 +273,7 @@ class ZmqClient(object):
         self._socket = None
         self._isok = True
         self._checkpreemptfn = checkpreemptfn
+        self._checkcallerthread = checkcallerthread
 
     def __del__(self):
         self.Destroy()
@@ -280,6 +302,11 @@ class ZmqClient(object):
         """
         return self._port
 
+    def GetPoolStatistics(self):
+        """Returns the statistics of the underlying socket pool, see ZmqSocketPool.GetStatistics
+        """
+        return self._pool.GetStatistics()
+
     # TODO(ziyan): this is for backward compatibility, remove once all callers are updated
     @property
     def hostname(self):
@@ -293,6 +320,8 @@ class ZmqClient(object):
     def _CheckCallerThread(self, context=None):
         """Catch bad callers who use zmq client from multiple threads and cause random race conditions.
         """
+        if not self._checkcallerthread:
+            return
         callerthread = repr(threading.current_thread())
         oldcallerthread = self._callerthread
         oldcallercontext = self._callercontext
@@ -313,21 +342,50 @@ class ZmqClient(object):
             self._pool.ReleaseSocket(self._socket)
             self._socket = None
     
+    def SetMetrics(self, metrics, component='zmq'):
+        """Records the latency of the socket acquire, send, server wait, receive and decode phases of each command, and error and timeout counts, into metrics
+
+        :param metrics: metrics.MetricsRegistry, or None to stop recording
+        :param component: Component name of the recorded metrics
+        """
+        self._metrics = metrics
+        self._metricscomponent = component
+
+    def _RecordMetricsError(self, e):
+        metrics = self._metrics
+        if metrics is not None:
+            metrics.RecordError(self._metricscomponent, self._metricsname, istimeout=isinstance(e, TimeoutError))
+
+    def Connect(self, timeout=None):
+        """Opens the underlying socket ahead of the first command, so that the first command does not pay for connecting
+        """
+        self._AcquireSocket(timeout=timeout, checkpreempt=False)
+        self._ReleaseSocket()
+
     def SetPreemptFn(self, checkpreemptfn):
         self._checkpreemptfn = checkpreemptfn
+
+    def CheckPreempt(self):
+        """Calls the preempt function of the client if any, which raises an exception if a preempt is desired
+        """
+        if self._checkpreemptfn is not None:
+            self._checkpreemptfn()
     
-    def SendCommand(self, command, timeout=10.0, blockwait=True, fireandforget=False, sendjson=True, recvjson=True, sendmultipart=False, recvmultipart=False, checkpreempt=None):
+    def SendCommand(self, command, timeout=10.0, blockwait=True, fireandforget=False, sendjson=True, recvjson=True, sendmultipart=False, recvmultipart=False, checkpreempt=None, sendmsgpack=False, recvmsgpack=False, metricsname=None):
         """Sends command via established zmq socket
 
         :param command: Command in json format
         :param timeout: If None, block. If >= 0, use as timeout. Default: 10.0
         :param blockwait: If True (default), will call receive also, otherwise, caller needs to call ReceiveCommand later
         :param fireandforget: If True, will send command and immediately return without trying to receive, and blockwait will be set to False. Default: False
-        :param sendjson: If True (default), will send data as json
+        :param sendjson: If True (default), will send data as json encoded by jsoncodec
         :param recvjson: If True (default), will parse received data as json
         :param sendmultipart: if True, will send multipart
         :param recvmultipart: if True, will receive multipart
         :param checkpreempt: (required) If True, calls the preempt function after each send.
+        :param sendmsgpack: If True, will send data encoded by binarycodec as multipart, numpy arrays are sent out-of-band
+        :param recvmsgpack: If True, will decode received multipart data with binarycodec
+        :param metricsname: Operation name of the command in the metrics, defaults to the fnname of the command
 
         :return: Returns the response from the zmq server in json format if blockwait is True
         """
@@ -340,8 +398,24 @@ class ZmqClient(object):
         if fireandforget:
             blockwait = False
 
+        metrics = self._metrics
+        if metrics is not None:
+            if metricsname is None:
+                metricsname = command.get('fnname', 'unknown') if isinstance(command, dict) else 'unknown'
+            self._metricsname = metricsname
+            self._metricsstarttime = GetMonotonicTime()
+            try:
+                return self._SendCommand(command, timeout, blockwait, fireandforget, sendjson, recvjson, sendmultipart, recvmultipart, checkpreempt, sendmsgpack, recvmsgpack, metrics)
+            except Exception as e:
+                self._RecordMetricsError(e)
+                raise
+        return self._SendCommand(command, timeout, blockwait, fireandforget, sendjson, recvjson, sendmultipart, recvmultipart, checkpreempt, sendmsgpack, recvmsgpack, None)
+
+    def _SendCommand(self, command, timeout, blockwait, fireandforget, sendjson, recvjson, sendmultipart, recvmultipart, checkpreempt, sendmsgpack, recvmsgpack, metrics):
         # Acquire a socket for sending
         self._AcquireSocket(timeout=timeout, checkpreempt=checkpreempt)
+        if metrics is not None:
+            acquiredtime = GetMonotonicTime()
 
         # We may be exiting, the pool refused to give us a socket
         if not self._isok:
@@ -365,16 +439,24 @@ class ZmqClient(object):
                 if (waitingevents & zmq.POLLOUT) != zmq.POLLOUT:
                     continue
 
-                if sendmultipart:
+                if sendmsgpack:
+                    self._socket.send_multipart(binarycodec.EncodeMessage(command), zmq.NOBLOCK, copy=False)
+                elif sendmultipart:
                     self._socket.send_multipart(command, zmq.NOBLOCK)
                 elif sendjson:
-                    self._socket.send_json(command, zmq.NOBLOCK)
+                    self._socket.send(jsoncodec.Dumps(command), zmq.NOBLOCK)
                 else:
                     self._socket.send(command, zmq.NOBLOCK)
 
                 # Break when successfully sent
                 break
 
+            if metrics is not None:
+                senttime = GetMonotonicTime()
+                metrics.RecordPhases(self._metricscomponent, self._metricsname, metricsmodule.PHASE_ACQUIRE, acquiredtime - self._metricsstarttime, metricsmodule.PHASE_SEND, senttime - acquiredtime)
+                if fireandforget:
+                    metrics.Record(self._metricscomponent, self._metricsname, metricsmodule.PHASE_TOTAL, senttime - self._metricsstarttime)
+
             # For fire and forget, no need to receive
             if fireandforget:
                 return None
@@ -385,7 +467,7 @@ class ZmqClient(object):
                 return None
 
             # Receive
-            return self.ReceiveCommand(timeout=timeout, recvjson=recvjson, recvmultipart=recvmultipart, checkpreempt=checkpreempt)
+            return self._ReceiveCommand(timeout=timeout, recvjson=recvjson, recvmultipart=recvmultipart, checkpreempt=checkpreempt, recvmsgpack=recvmsgpack)
 
         finally:
             # release socket
@@ -397,17 +479,26 @@ class ZmqClient(object):
     def IsWaitingReply(self):
         return self._socket is not None
 
-    def ReceiveCommand(self, timeout=10.0, recvjson=True, recvmultipart=False, checkpreempt=True):
+    def ReceiveCommand(self, timeout=10.0, recvjson=True, recvmultipart=False, checkpreempt=True, recvmsgpack=False):
         """Receive response to a previous SendCommand call. SendCommand must be called with blockwait=False and fireandforget=False
 
         :param timeout: If None, block. If >= 0, use as timeout. Default: 10.0
         :param recvjson: If True (default), will parse received data as json
         :param checkpreempt: (required) If True, calls the preempt function after each send.
+        :param recvmsgpack: If True, will decode received multipart data with binarycodec
 
         :return: Returns the recv or recv_json or recv_multipart response
         """
         self._CheckCallerThread('ReceiveCommand')
-        
+        if self._metrics is not None:
+            try:
+                return self._ReceiveCommand(timeout=timeout, recvjson=recvjson, recvmultipart=recvmultipart, checkpreempt=checkpreempt, recvmsgpack=recvmsgpack)
+            except Exception as e:
+                self._RecordMetricsError(e)
+                raise
+        return self._ReceiveCommand(timeout=timeout, recvjson=recvjson, recvmultipart=recvmultipart, checkpreempt=checkpreempt, recvmsgpack=recvmsgpack)
+
+    def _ReceiveCommand(self, timeout=10.0, recvjson=True, recvmultipart=False, checkpreempt=True, recvmsgpack=False):
         # Should have called SendCommand with blockwait=False first
         assert (self._socket is not None)
         releaseSocket = False
@@ -423,15 +514,23 @@ class ZmqClient(object):
                 if endpolltime - startpolltime > 0.2:  # Due to python delays sometimes this can be 0.11s
                     log.critical('Polling time took %fs!', endpolltime - startpolltime)
                 if (waitingevents & zmq.POLLIN) == zmq.POLLIN:
-                    if recvmultipart:
-                        releaseSocket = True
-                        return self._socket.recv_multipart(zmq.NOBLOCK)
-                    elif recvjson:
-                        releaseSocket = True
-                        return self._socket.recv_json(zmq.NOBLOCK)
+                    releaseSocket = True
+                    if recvmsgpack or recvmultipart:
+                        data = self._socket.recv_multipart(zmq.NOBLOCK)
+                    else:
+                        data = self._socket.recv(zmq.NOBLOCK)
+                    receivedtime = GetMonotonicTime()
+                    if recvmsgpack:
+                        response = binarycodec.DecodeMessage(data)
+                    elif recvmultipart or not recvjson:
+                        response = data
                     else:
-                        releaseSocket = True
-                        return self._socket.recv(zmq.NOBLOCK)
+                        response = jsoncodec.Loads(data)
+                    metrics = self._metrics
+                    if metrics is not None and self._metricsname is not None:
+                        decodedtime = GetMonotonicTime()
+                        metrics.RecordPhases(self._metricscomponent, self._metricsname, metricsmodule.PHASE_WAIT, endpolltime - starttime, metricsmodule.PHASE_RECEIVE, receivedtime - endpolltime, metricsmodule.PHASE_DECODE, decodedtime - receivedtime, metricsmodule.PHASE_TOTAL, decodedtime - (self._metricsstarttime or starttime))
+                    return response
                 
                 # Do timeout checking at the end
                 elapsedtime = GetMonotonicTime() - starttime
@@ -0,0 +1,582 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 MUJIN Inc
+"""
+Local stand-in for a mujin controller, to test and benchmark the clients without hardware. Serves in background threads:
+
+- the REST endpoints used by ControllerClient, backed by an in-memory store of resources
+- /api/v2/graphql, answering each operation with a value shaped by the typeDatabase of ControllerGraphClient
+- a zmq task server on the command port and on the config port (command port + 2), with configurable latency and response size
+- a heartbeat publisher on the heartbeat port (command port + 1)
+
+Usage::
+
+    with FakeController(commandlatency=0.001) as controller:
+        client = BinpickingControllerClient(tasktype='binpicking', scenepk='test.mujin.dae', **controller.GetClientKwargs())
+"""
+
+import inspect
+import re
+import random
+import threading
+import time
+import collections
+
+import six
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib import parse as urlparse
+
+from mujincontrollerclient import zmq
+from mujincontrollerclient import APIServerError, GetMonotonicTime
+from mujincontrollerclient import binarycodec, jsoncodec, controllergraphclient
+
+import logging
+log = logging.getLogger(__name__)
+
+# Values of the graphql scalar types
+_graphScalarValues = {
+    'String': '',
+    'ID': '',
+    'Int': 0,
+    'Float': 0.0,
+    'Boolean': False,
+    'DateTime': '1970-01-01T00:00:00Z',
+}
+
+_graphOperationReturnTypes = None  # Dict mapping graphql operation names to their return type, parsed from controllergraphclient
+
+
+def _GetGraphOperationReturnTypes():
+    global _graphOperationReturnTypes
+    if _graphOperationReturnTypes is None:
+        source = inspect.getsource(controllergraphclient)
+        _graphOperationReturnTypes = dict(re.findall(r"operationName='(\w+)',.*?returnType='(\w+)'", source))
+    return _graphOperationReturnTypes
+
+
+def _ParseGraphSelections(query):
+    """Returns the selection set of query as a dict mapping field names to their sub selections, None for leaf fields
+    """
+    tokens = re.findall(r'\(|\)|\{|\}|[_A-Za-z][_0-9A-Za-z]*', query[query.find('{'):])
+    index = [0]
+
+    def _ParseSelectionSet():
+        selections = collections.OrderedDict()
+        lastfield = None
+        depth = 0  # Depth of argument parentheses
+        while index[0] < len(tokens):
+            token = tokens[index[0]]
+            index[0] += 1
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+            elif depth > 0:
+                continue
+            elif token == '{':
+                if lastfield is None:
+                    return _ParseSelectionSet()
+                selections[lastfield] = _ParseSelectionSet()
+            elif token == '}':
+                break
+            else:
+                lastfield = token
+                selections[lastfield] = None
+        return selections
+
+    return _ParseSelectionSet()
+
+
+def _MakeGraphValue(typeDatabase, typeName, selections):
+    if typeName not in typeDatabase:
+        return _graphScalarValues.get(typeName)
+    value = {}
+    for fieldName, subSelections in (selections or {}).items():
+        value[fieldName] = _MakeGraphValue(typeDatabase, typeDatabase[typeName].get(fieldName), subSelections)
+    return value
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    controller = None  # FakeController serving the requests
+
+
+class _HTTPRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep the connections alive like the controller does
+    disable_nagle_algorithm = True  # Headers and body are written separately, do not delay the body
+
+    def version_string(self):
+        return 'mujinwebstack/%s' % self.server.controller.serverversion
+
+    def log_message(self, format, *args):
+        log.debug('%s - %s', self.address_string(), format % args)
+
+    def _Handle(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length > 0 else b''
+        statuscode, content, headers = self.server.controller._HandleHTTPRequest(method, self.path, self.headers, body)
+        if content is None:
+            data = b''
+        elif isinstance(content, six.binary_type):
+            data = content
+        else:
+            data = jsoncodec.Dumps(content)
+        self.send_response(statuscode)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if method != 'HEAD':
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        self._Handle('HEAD')
+
+    def do_GET(self):
+        self._Handle('GET')
+
+    def do_POST(self):
+        self._Handle('POST')
+
+    def do_PUT(self):
+        self._Handle('PUT')
+
+    def do_PATCH(self):
+        self._Handle('PATCH')
+
+    def do_DELETE(self):
+        self._Handle('DELETE')
+
+
+class _TaskServer(object):
+    """zmq task server with a ROUTER frontend dispatching to numworkers REP worker threads, so that commands are served concurrently when numworkers > 1
+    """
+
+    _ctx = None
+    _frontend = None  # ROUTER socket bound to the port
+    _backendurl = None  # inproc url of the DEALER socket the workers connect to
+    _handlefn = None  # Function(command) returning the response
+    _numworkers = None
+    _threads = None
+    _isok = False
+
+    def __init__(self, ctx, frontend, handlefn, numworkers=1):
+        self._ctx = ctx
+        self._frontend = frontend
+        self._backendurl = 'inproc://fakecontroller-%x' % id(self)
+        self._handlefn = handlefn
+        self._numworkers = numworkers
+        self._threads = []
+
+    def Start(self):
+        self._isok = True
+        backend = self._ctx.socket(zmq.DEALER)
+        backend.bind(self._backendurl)
+        self._threads.append(threading.Thread(target=self._RunProxyThread, args=(backend,), name='fakecontrollerproxy'))
+        for index in range(self._numworkers):
+            self._threads.append(threading.Thread(target=self._RunWorkerThread, name='fakecontrollerworker%d' % index))
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def Stop(self):
+        self._isok = False
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _RunProxyThread(self, backend):
+        poller = zmq.Poller()
+        poller.register(self._frontend, zmq.POLLIN)
+        poller.register(backend, zmq.POLLIN)
+        try:
+            while self._isok:
+                for socket, event in poller.poll(20):
+                    if socket is self._frontend:
+                        backend.send_multipart(self._frontend.recv_multipart(), copy=False)
+                    else:
+                        self._frontend.send_multipart(backend.recv_multipart(), copy=False)
+        finally:
+            backend.close(linger=0)
+            self._frontend.close(linger=0)
+
+    def _RunWorkerThread(self):
+        socket = self._ctx.socket(zmq.REP)
+        try:
+            socket.connect(self._backendurl)
+            while self._isok:
+                if socket.poll(20, zmq.POLLIN) != zmq.POLLIN:
+                    continue
+                frames = socket.recv_multipart()
+                usemsgpack = not (len(frames) == 1 and frames[0][:1] == b'{')
+                try:
+                    command = binarycodec.DecodeMessage(frames) if usemsgpack else jsoncodec.Loads(frames[0])
+                    response = self._handlefn(command)
+                except Exception as e:
+                    log.exception('failed to handle command: %s', e)
+                    response = {'error': {'errorcode': 'InternalError', 'description': u'%s' % e}}
+                if usemsgpack:
+                    socket.send_multipart(binarycodec.EncodeMessage(response))
+                else:
+                    socket.send(jsoncodec.Dumps(response))
+        finally:
+            socket.close(linger=0)
+
+
+class FakeController(object):
+    """Pure python stand-in for a mujin controller listening on 127.0.0.1. Use it as a context manager, or call Start and Stop.
+
+    Command handlers are functions(taskparameters) returning the output of the command, or raising APIServerError. Commands without a handler return {'command': name} plus a payload of responsesize bytes.
+    """
+
+    username = 'mujin'
+    password = 'mujin'
+    serverversion = '2.0.0.fakecontroller'  # Version reported in the Server header, see ControllerClient.GetServerVersion
+    commandlatency = 0.0  # Seconds each command takes unless overwritten with SetCommandLatency
+    httplatency = 0.0  # Seconds each http request takes
+    responsesize = 0  # Bytes of payload added to the output of the commands without handler
+    heartbeatinterval = 0.1  # Seconds between heartbeats
+
+    controllerurl = None  # URL of the http server
+    taskzmqport = None  # Port of the task server, the config port is taskzmqport + 2
+    taskheartbeatport = None  # Port of the heartbeat publisher
+
+    _ctx = None
+    _ctxown = None  # zmq context owned by this class
+    _numworkers = None  # Number of threads serving commands concurrently
+    _httpserver = None
+    _httpthread = None
+    _commandserver = None  # _TaskServer of the command port
+    _configserver = None  # _TaskServer of the config port
+    _heartbeatsocket = None
+    _heartbeatthread = None
+    _isok = False
+    _lock = None  # Protects the handlers, the store and the statistics
+    _commandhandlers = None  # Dict mapping command names to functions(taskparameters) returning the output
+    _commandlatencies = None  # Dict mapping command names to their latency in seconds
+    _httphandlers = None  # Dict mapping (method, path) to functions(method, path, params, body) returning (statuscode, content)
+    _graphhandlers = None  # Dict mapping graphql operation names to functions(variables) returning the data of the operation
+    _resources = None  # Dict mapping collection paths, e.g. scene/test.mujin.dae/instobject, to dicts mapping pks to resources
+    _slavestates = None  # Dict mapping slaverequestid-<id> to the published task states
+    _numcommands = None  # Dict mapping command names to the number of commands received
+    _receivedcommands = None  # deque of the last commands received on the command and config ports
+
+    def __init__(self, commandlatency=0.0, httplatency=0.0, responsesize=0, numworkers=1, heartbeatinterval=0.1, ctx=None, username='mujin', password='mujin'):
+        """
+        :param commandlatency: Seconds each command takes
+        :param httplatency: Seconds each http request takes
+        :param responsesize: Bytes of payload added to the output of the commands without handler
+        :param numworkers: Number of commands served concurrently on the command port. The controller serves one at a time
+        :param heartbeatinterval: Seconds between heartbeats
+        """
+        self.commandlatency = commandlatency
+        self.httplatency = httplatency
+        self.responsesize = responsesize
+        self.heartbeatinterval = heartbeatinterval
+        self.username = username
+        self.password = password
+        self._numworkers = numworkers
+        self._ctx = ctx
+        self._lock = threading.Lock()
+        self._commandhandlers = {
+            'negotiateencoding': self._NegotiateEncoding,
+        }
+        self._commandlatencies = {}
+        self._httphandlers = {}
+        self._graphhandlers = {}
+        self._resources = {}
+        self._slavestates = {}
+        self._numcommands = {}
+        self._receivedcommands = collections.deque(maxlen=1000)
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.Stop()
+
+    def Start(self):
+        if self._isok:
+            return
+        self._isok = True
+        if self._ctx is None:
+            self._ctx = self._ctxown = zmq.Context()
+
+        self._httpserver = _HTTPServer(('127.0.0.1', 0), _HTTPRequestHandler)
+        self._httpserver.controller = self
+        self.controllerurl = 'http://127.0.0.1:%d' % self._httpserver.server_address[1]
+        self._httpthread = threading.Thread(target=self._httpserver.serve_forever, kwargs={'poll_interval': 0.05}, name='fakecontrollerhttp')
+        self._httpthread.daemon = True
+        self._httpthread.start()
+
+        commandsocket, self._heartbeatsocket, configsocket = self._BindConsecutivePorts([zmq.ROUTER, zmq.PUB, zmq.ROUTER])
+        self._commandserver = _TaskServer(self._ctx, commandsocket, self._HandleCommand, numworkers=self._numworkers)
+        self._commandserver.Start()
+        self._configserver = _TaskServer(self._ctx, configsocket, self._HandleCommand)
+        self._configserver.Start()
+        self._heartbeatthread = threading.Thread(target=self._RunHeartbeatThread, name='fakecontrollerheartbeat')
+        self._heartbeatthread.daemon = True
+        self._heartbeatthread.start()
+
+    def Stop(self):
+        if not self._isok:
+            return
+        self._isok = False
+        self._httpserver.shutdown()
+        self._httpserver.server_close()
+        self._httpthread.join()
+        self._commandserver.Stop()
+        self._configserver.Stop()
+        self._heartbeatthread.join()
+        if self._ctxown is not None:
+            self._ctxown.destroy(linger=0)
+            self._ctx = self._ctxown = None
+
+    def _BindConsecutivePorts(self, sockettypes, numtries=100):
+        """The clients derive the heartbeat and config ports from the command port, so bind sockets on consecutive ports
+        """
+        for itry in range(numtries):
+            port = random.randint(20000, 60000)
+            sockets = []
+            try:
+                for index, sockettype in enumerate(sockettypes):
+                    socket = self._ctx.socket(sockettype)
+                    sockets.append(socket)
+                    socket.bind('tcp://127.0.0.1:%d' % (port + index))
+            except zmq.ZMQError:
+                for socket in sockets:
+                    socket.close(linger=0)
+                continue
+            self.taskzmqport = port
+            self.taskheartbeatport = port + 1
+            return sockets
+        raise zmq.ZMQError(zmq.EADDRINUSE, 'could not bind %d consecutive ports' % len(sockettypes))
+
+    def GetClientKwargs(self):
+        """Returns the keyword arguments to pass to the constructor of a PlanningControllerClient to connect to this controller
+        """
+        return {
+            'controllerurl': self.controllerurl,
+            'controllerusername': self.username,
+            'controllerpassword': self.password,
+            'taskzmqport': self.taskzmqport,
+            'taskheartbeatport': self.taskheartbeatport,
+            'taskheartbeattimeout': 10.0,
+        }
+
+    #
+    # Commands
+    #
+
+    def SetCommandHandler(self, command, handlefn):
+        """Sets the function(taskparameters) returning the output of command, None to use the default output
+        """
+        with self._lock:
+            if handlefn is None:
+                self._commandhandlers.pop(command, None)
+            else:
+                self._commandhandlers[command] = handlefn
+
+    def SetCommandLatency(self, command, latency):
+        """Sets the seconds command takes, None to use commandlatency
+        """
+        with self._lock:
+            if latency is None:
+                self._commandlatencies.pop(command, None)
+            else:
+                self._commandlatencies[command] = latency
+
+    def GetNumCommands(self):
+        """Returns a dict mapping command names to the number of commands received
+        """
+        with self._lock:
+            return dict(self._numcommands)
+
+    def GetReceivedCommands(self):
+        """Returns the last commands received on the command and config ports, as sent by the clients
+        """
+        with self._lock:
+            return list(self._receivedcommands)
+
+    def ResetStatistics(self):
+        with self._lock:
+            self._numcommands.clear()
+            self._receivedcommands.clear()
+
+    def _HandleCommand(self, command):
+        if 'taskparams' in command:
+            taskparameters = command['taskparams'].get('taskparameters') or {}
+        else:
+            taskparameters = command  # config commands are sent as is
+        name = taskparameters.get('command')
+        with self._lock:
+            self._numcommands[name] = self._numcommands.get(name, 0) + 1
+            self._receivedcommands.append(command)
+            handlefn = self._commandhandlers.get(name)
+            latency = self._commandlatencies.get(name, self.commandlatency)
+        if latency > 0:
+            self._Sleep(latency)
+        try:
+            if handlefn is not None:
+                output = handlefn(taskparameters)
+            else:
+                output = {'command': name}
+                if self.responsesize > 0:
+                    output['payload'] = 'x' * self.responsesize
+        except APIServerError as e:
+            return {'error': {'errorcode': e.errorcode or 'APIServerError', 'description': e.message}}
+        return {'output': output}
+
+    def _NegotiateEncoding(self, taskparameters):
+        encodings = [binarycodec.ENCODING_JSON]
+        if binarycodec.IsAvailable():
+            encodings.insert(0, binarycodec.ENCODING_MSGPACK)
+        for encoding in taskparameters.get('encodings') or []:
+            if encoding in encodings:
+                return {'encoding': encoding}
+        return {'encoding': binarycodec.ENCODING_JSON}
+
+    def _Sleep(self, seconds):
+        # sleeping in small steps keeps Stop responsive
+        endtime = GetMonotonicTime() + seconds
+        while self._isok:
+            remaining = endtime - GetMonotonicTime()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, 0.05))
+
+    #
+    # Heartbeat
+    #
+
+    def SetTaskState(self, slaverequestid, taskstate):
+        """Sets the task state published in the heartbeat for slaverequestid, see PlanningControllerClient.GetPublishedTaskState
+        """
+        with self._lock:
+            self._slavestates['slaverequestid-%s' % slaverequestid] = taskstate
+
+    def _RunHeartbeatThread(self):
+        try:
+            while self._isok:
+                with self._lock:
+                    heartbeat = {'slavestates': dict(self._slavestates)}
+                self._heartbeatsocket.send(jsoncodec.Dumps(heartbeat))
+                self._Sleep(self.heartbeatinterval)
+        finally:
+            self._heartbeatsocket.close(linger=0)
+
+    #
+    # Web
+    #
+
+    def SetHTTPHandler(self, method, path, handlefn):
+        """Sets the function(method, path, params, body) returning (statuscode, content) of requests to path, e.g. /api/v1/scene/test.mujin.dae/. None to use the default handling
+        """
+        with self._lock:
+            if handlefn is None:
+                self._httphandlers.pop((method, path), None)
+            else:
+                self._httphandlers[(method, path)] = handlefn
+
+    def SetGraphHandler(self, operationName, handlefn):
+        """Sets the function(variables) returning the data of the graphql operation, None to return a value shaped by the typeDatabase
+        """
+        with self._lock:
+            if handlefn is None:
+                self._graphhandlers.pop(operationName, None)
+            else:
+                self._graphhandlers[operationName] = handlefn
+
+    def SetResource(self, path, pk, resource):
+        """Stores resource, e.g. SetResource('scene', 'test.mujin.dae', {'name': 'test'}), so that it is returned by the REST endpoints
+        """
+        with self._lock:
+            self._resources.setdefault(path.strip('/'), collections.OrderedDict())[pk] = dict(resource, pk=pk)
+
+    def _HandleHTTPRequest(self, method, rawpath, headers, body):
+        """Returns (statuscode, content, headers)
+        """
+        if self.httplatency > 0:
+            self._Sleep(self.httplatency)
+        parsed = urlparse.urlparse(rawpath)
+        path = parsed.path
+        params = dict((key, values[-1]) for key, values in urlparse.parse_qs(parsed.query).items())
+        with self._lock:
+            handlefn = self._httphandlers.get((method, path))
+        if handlefn is not None:
+            statuscode, content = handlefn(method, path, params, body)
+            return statuscode, content, None
+        if path.startswith('/u/'):
+            return 200, None, None
+        if path in ('/restartserver/', '/flushcache/'):
+            return 200, None, None
+        if path == '/systeminfo/':
+            return 200, {'version': self.serverversion}, None
+        if path == '/api/v2/graphql':
+            return self._HandleGraphRequest(body)
+        if path.startswith('/api/v1/'):
+            return self._HandleRESTRequest(method, path[len('/api/v1/'):].strip('/'), params, body)
+        return 404, {'error_message': u'unknown path %s' % path}, None
+
+    def _HandleGraphRequest(self, body):
+        request = jsoncodec.Loads(body)
+        query = request.get('query') or ''
+        match = re.match(r'\s*(?:query|mutation)\s+(\w+)', query)
+        if match is None:
+            return 200, {'errors': [{'message': 'cannot parse operation of query'}]}, None
+        operationName = match.group(1)
+        with self._lock:
+            handlefn = self._graphhandlers.get(operationName)
+        if handlefn is not None:
+            try:
+                return 200, {'data': {operationName: handlefn(request.get('variables') or {})}}, None
+            except APIServerError as e:
+                return 200, {'errors': [{'message': e.message}]}, None
+        selections = _ParseGraphSelections(query).get(operationName)
+        returnType = _GetGraphOperationReturnTypes().get(operationName)
+        typeDatabase = controllergraphclient.ControllerGraphClient.typeDatabase
+        return 200, {'data': {operationName: _MakeGraphValue(typeDatabase, returnType, selections)}}, None
+
+    def _HandleRESTRequest(self, method, path, params, body):
+        segments = path.split('/')
+        data = jsoncodec.Loads(body) if len(body) > 0 and body[:1] in (b'{', b'[') else {}
+        if segments[-1] == 'resultget':
+            # ExecuteTaskSync sends the command through the web api
+            response = self._HandleCommand({'taskparams': {'taskparameters': data.get('taskparameters') or {}}})
+            if 'error' in response:
+                return 500, {'error_message': response['error']['description'], 'error_code': response['error']['errorcode']}, None
+            return 200, response['output'], None
+
+        # paths alternate between collections and pks, e.g. scene/test.mujin.dae/instobject
+        iscollection = len(segments) % 2 == 1
+        collectionpath = path if iscollection else '/'.join(segments[:-1])
+        with self._lock:
+            collection = self._resources.setdefault(collectionpath, collections.OrderedDict())
+            if iscollection:
+                if method == 'GET':
+                    offset = int(params.get('offset') or 0)
+                    limit = int(params.get('limit') or 0)
+                    objects = list(collection.values())[offset:offset + limit if limit > 0 else None]
+                    return 200, {'objects': objects, 'meta': {'total_count': len(collection), 'limit': limit, 'offset': offset}}, None
+                if method == 'POST':
+                    pk = data.get('pk') or data.get('id') or '%x' % random.getrandbits(64)
+                    collection[pk] = dict(data, pk=pk)
+                    return 201, {'id': pk, 'pk': pk}, None
+                if method == 'DELETE':
+                    collection.clear()
+                    return 204, None, None
+            else:
+                pk = segments[-1]
+                if pk not in collection:
+                    return 404, {'error_message': u'%s not found' % path}, None
+                if method == 'GET':
+                    return 200, collection[pk], None
+                if method in ('PUT', 'PATCH'):
+                    collection[pk].update(data)
+                    return 202, {}, None
+                if method == 'DELETE':
+                    del collection[pk]
+                    return 204, None, None
+        return 405, {'error_message': u'%s not allowed on %s' % (method, path)}, None
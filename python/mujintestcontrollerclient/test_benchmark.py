@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+_benchmarkScript = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'devbin', 'mujin_controllerclientpy_benchmark.py')
+
+
+@pytest.mark.skipif(not os.path.exists(_benchmarkScript), reason='benchmark script is only in the source tree')
+def test_Benchmark(tmpdir):
+    """Runs every benchmark briefly against FakeController, then compares with the results
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] + [path for path in [env.get('PYTHONPATH')] if path])
+    output = str(tmpdir.join('results.json'))
+    arguments = [sys.executable, _benchmarkScript, '--numcommands', '10', '--responsesizes', '0,1000', '--poolsizes', '1,2', '--repeat', '1', '--loglevel', 'WARNING']
+    subprocess.check_call(arguments + ['--output', output], env=env)
+    with open(output) as f:
+        report = json.load(f)
+    assert sorted(report['results']) == ['apicall', 'fireandforget', 'graphql', 'importtime', 'stringifyqueryfields', 'uriutils', 'zmqroundtrip']
+    assert sorted(report['results']['zmqroundtrip']) == ['0bytes', '1000bytes']
+    assert report['results']['fireandforget']['pool']['acquirecount'] >= 10
+    assert sorted(report['results']['apicall']) == ['poolsize1', 'poolsize2']
+
+    subprocess.check_call(arguments + ['--benchmarks', 'uriutils', '--output', str(tmpdir.join('compared.json')), '--compare', output], env=env)
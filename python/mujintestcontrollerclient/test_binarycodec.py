@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import pytest
+
+msgpack = pytest.importorskip('msgpack')
+numpy = pytest.importorskip('numpy')
+
+from mujincontrollerclient import binarycodec, zmq, zmqclient  # noqa: E402
+
+
+def test_EncodeDecodeMessage():
+    trajectory = numpy.arange(3000, dtype=numpy.float64).reshape(-1, 3)
+    message = {
+        'command': 'ExecuteTrajectory',
+        'trajectory': trajectory,
+        'small': numpy.array([1, 2, 3], dtype=numpy.int32),
+        'speed': numpy.float32(0.5),
+        1: [u'測試', None],
+    }
+    frames = binarycodec.EncodeMessage(message)
+    assert len(frames) == 2
+    decoded = binarycodec.DecodeMessage([bytes(frame) for frame in frames])
+    assert numpy.array_equal(decoded['trajectory'], trajectory)
+    assert decoded['small'].tolist() == [1, 2, 3]
+    assert decoded['speed'] == 0.5
+    assert decoded[1] == [u'測試', None]
+
+
+def test_ZmqClientMsgpack():
+    ctx = zmq.Context()
+    server = ctx.socket(zmq.REP)
+    server.bind('inproc://test_binarycodec')
+
+    def _Serve():
+        request = binarycodec.DecodeMessage(server.recv_multipart())
+        server.send_multipart(binarycodec.EncodeMessage({'output': request['values'] * 2}))
+
+    thread = threading.Thread(target=_Serve)
+    thread.start()
+    client = zmqclient.ZmqClient(url='inproc://test_binarycodec', ctx=ctx)
+    try:
+        response = client.SendCommand({'values': numpy.ones(1000)}, checkpreempt=False, sendmsgpack=True, recvmsgpack=True)
+        assert response['output'].shape == (1000,)
+        assert (response['output'] == 2).all()
+    finally:
+        thread.join()
+        client.Destroy()
+        server.close()
+        ctx.destroy()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+import pytest
+
+from mujincontrollerclient import envstatetracker
+
+
+class _FakeClient(object):
+    def __init__(self, supportsincremental=True):
+        self.calls = []
+        self.fail = False
+        self.supportsincremental = supportsincremental
+        self.objectnames = set()  # Names of the objects in the scene of the server
+
+    def UpdateObjects(self, envstate, **kwargs):
+        self.calls.append((envstate, kwargs))
+        if self.fail:
+            raise Exception('failed')
+        if self.supportsincremental and kwargs.get('incremental'):
+            self.objectnames.difference_update(kwargs['removedobjectnames'])
+            self.objectnames.update(envobject['name'] for envobject in envstate)
+        else:
+            self.objectnames = set(envobject['name'] for envobject in envstate)
+        return {'incremental': True} if self.supportsincremental else {}
+
+
+def _MakeObject(name, x=0.0, angle=0.0):
+    return {'name': name, 'translation_': [x, 0.0, 0.0], 'quat_': [math.cos(angle / 2), 0.0, 0.0, math.sin(angle / 2)], 'object_uri': u'mujin:/box.mujin.dae'}
+
+
+def test_ComputeQuaternionAngle():
+    assert envstatetracker.ComputeQuaternionAngle([1, 0, 0, 0], [-1, 0, 0, 0]) == pytest.approx(0.0)
+    assert envstatetracker.ComputeQuaternionAngle([1, 0, 0, 0], [math.cos(0.25), 0, 0, math.sin(0.25)]) == pytest.approx(0.5)
+
+
+def test_EnvStateTracker():
+    client = _FakeClient()
+    tracker = envstatetracker.EnvStateTracker(client, translationtolerance=1.0, rotationtolerance=0.01)
+
+    tracker.UpdateObjects([_MakeObject('a'), _MakeObject('b'), _MakeObject('c')], state={'key': 1})
+    envstate, kwargs = client.calls[-1]
+    assert [envobject['name'] for envobject in envstate] == ['a', 'b', 'c']
+    assert 'incremental' not in kwargs
+    assert kwargs['state'] == {'key': 1} and kwargs['encodestate']
+
+    # within tolerance and unchanged, nothing is sent
+    assert tracker.UpdateObjects([_MakeObject('a', x=0.5), _MakeObject('b', angle=0.005), _MakeObject('c')]) is None
+    assert len(client.calls) == 1
+
+    # drift is compared against the acknowledged pose
+    tracker.UpdateObjects([_MakeObject('a', x=1.5), _MakeObject('b', angle=0.02), _MakeObject('d')])
+    envstate, kwargs = client.calls[-1]
+    assert [envobject['name'] for envobject in envstate] == ['a', 'b', 'd']
+    assert kwargs['incremental'] and kwargs['removedobjectnames'] == ['c']
+
+    # failure forces a full resync
+    client.fail = True
+    with pytest.raises(Exception):
+        tracker.UpdateObjects([_MakeObject('a', x=3.0), _MakeObject('b', angle=0.02), _MakeObject('d')])
+    client.fail = False
+    tracker.UpdateObjects([_MakeObject('a', x=3.0), _MakeObject('b', angle=0.02), _MakeObject('d')])
+    envstate, kwargs = client.calls[-1]
+    assert len(envstate) == 3 and 'incremental' not in kwargs
+    assert tracker.numfullresyncs == 2 and tracker.numincremental == 1 and tracker.numskipped == 1
+    assert client.objectnames == set(['a', 'b', 'd'])
+
+
+def test_EnvStateTrackerWithoutIncrementalSupport():
+    client = _FakeClient(supportsincremental=False)
+    tracker = envstatetracker.EnvStateTracker(client, translationtolerance=1.0)
+    tracker.UpdateObjects([_MakeObject('a'), _MakeObject('b')])
+    assert tracker.UpdateObjects([_MakeObject('a'), _MakeObject('b')]) is None
+
+    # the server never confirmed incremental updates, so it gets the whole envstate
+    tracker.UpdateObjects([_MakeObject('a', x=2.0), _MakeObject('b'), _MakeObject('c')])
+    envstate, kwargs = client.calls[-1]
+    assert len(envstate) == 3 and 'incremental' not in kwargs
+    assert client.objectnames == set(['a', 'b', 'c'])
+    assert tracker.numincremental == 0 and tracker.numfullresyncs == 2
+
+    # an incremental update that is not confirmed, e.g. after the server was downgraded, is followed by a full resync
+    tracker._serversupportsincremental = True
+    tracker.UpdateObjects([_MakeObject('a', x=4.0), _MakeObject('b'), _MakeObject('c')])
+    assert client.calls[-2][1]['incremental']
+    envstate, kwargs = client.calls[-1]
+    assert len(envstate) == 3 and 'incremental' not in kwargs
+    assert client.objectnames == set(['a', 'b', 'c'])
+
+
+def test_EnvStateTrackerStateAsObject():
+    client = _FakeClient()
+    tracker = envstatetracker.EnvStateTracker(client, encodestate=False)
+    tracker.UpdateObjects([_MakeObject('a')], state={'key': 1})
+    envstate, kwargs = client.calls[-1]
+    assert kwargs['state'] == {'key': 1} and not kwargs['encodestate']
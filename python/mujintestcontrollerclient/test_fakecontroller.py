@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+from mujincontrollerclient import APIServerError, binarycodec
+from mujincontrollerclient.controllerclientbase import ControllerClient
+from mujincontrollerclient.planningclient import PlanningControllerClient
+
+from .fakecontroller import FakeController
+
+
+@pytest.fixture
+def controller():
+    with FakeController(heartbeatinterval=0.02) as controller:
+        yield controller
+
+
+def _CreatePlanningClient(controller, **kwargs):
+    clientkwargs = controller.GetClientKwargs()
+    clientkwargs.update(kwargs)
+    return PlanningControllerClient(tasktype='binpicking', scenepk='test.mujin.dae', **clientkwargs)
+
+
+def test_REST(controller):
+    client = ControllerClient(controller.controllerurl, controller.username, controller.password)
+    client.Login()
+    assert client.GetServerVersion() == (2, 0, 0, 'fakecontroller')
+
+    controller.SetResource('scene', 'test.mujin.dae', {'name': 'test'})
+    assert client.GetScene('test.mujin.dae')['name'] == 'test'
+    scenes = client.GetScenes()
+    assert scenes.totalCount == 1
+    with pytest.raises(APIServerError):
+        client.GetScene('missing.mujin.dae')
+    client.Destroy()
+
+
+def test_GraphQL(controller):
+    client = ControllerClient(controller.controllerurl, controller.username, controller.password)
+    body = client.graphApi.GetBody('body', 'test', fields={'id': None, 'isRobot': None, 'links': {'name': None}})
+    assert body == {'id': '', 'isRobot': False, 'links': {'name': ''}}
+
+    controller.SetGraphHandler('GetBody', lambda variables: {'id': variables['bodyId']})
+    assert client.graphApi.GetBody('body', 'test', fields=['id']) == {'id': 'body'}
+    client.Destroy()
+
+
+def _Fail(taskparameters):
+    raise APIServerError('failed', errorcode='Failed')
+
+
+def test_Commands(controller):
+    controller.SetCommandHandler('GetState', lambda taskparameters: {'value': taskparameters['value']})
+    controller.SetCommandHandler('Fail', _Fail)
+    client = _CreatePlanningClient(controller, usewebapi=False)
+    try:
+        assert client.ExecuteCommand({'command': 'GetState', 'value': 1}, timeout=5) == {'value': 1}
+        with pytest.raises(APIServerError):
+            client.ExecuteCommand({'command': 'Fail'}, timeout=5)
+        assert client.ExecuteCommand({'command': 'GetState', 'value': 2}, usewebapi=True, timeout=5) == {'value': 2}
+
+        controller.responsesize = 1000
+        assert len(client.ExecuteCommand({'command': 'Other'}, timeout=5)['payload']) == 1000
+
+        controller.SetCommandLatency('Slow', 0.2)
+        starttime = time.time()
+        client.ExecuteCommand({'command': 'Slow'}, timeout=5)
+        assert time.time() - starttime >= 0.2
+
+        if binarycodec.IsAvailable():
+            assert client.NegotiateCommandEncoding() == binarycodec.ENCODING_MSGPACK
+            assert client.ExecuteCommand({'command': 'GetState', 'value': 3}, timeout=5) == {'value': 3}
+        assert controller.GetNumCommands()['GetState'] == (3 if binarycodec.IsAvailable() else 2)
+    finally:
+        client.Destroy()
+
+
+def test_ConcurrentCommands():
+    with FakeController(commandlatency=0.2, numworkers=4) as controller:
+        clients = [_CreatePlanningClient(controller, usewebapi=False, taskheartbeatport=None) for index in range(4)]
+        try:
+            threads = [threading.Thread(target=client.ExecuteCommand, args=({'command': 'GetState'},), kwargs={'timeout': 5}) for client in clients]
+            starttime = time.time()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert time.time() - starttime < 0.6
+            assert controller.GetNumCommands()['GetState'] == 4
+        finally:
+            for client in clients:
+                client.Destroy()
+
+
+def test_Heartbeat(controller):
+    controller.SetTaskState('test', {'status': 'running'})
+    client = _CreatePlanningClient(controller, usewebapi=False, slaverequestid='test')
+    try:
+        for index in range(100):
+            if client.GetPublishedTaskState() is not None:
+                break
+            time.sleep(0.02)
+        assert client.GetPublishedTaskState() == {'status': 'running'}
+    finally:
+        client.Destroy()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import os
+import datetime
+import pytest
+
+from mujincontrollerclient import filesyncutils
+
+
+def test_ListLocalFiles(tmpdir):
+    tmpdir.join('a.txt').write('abc')
+    tmpdir.mkdir('sub').join('b.txt').write('defg')
+    files = filesyncutils.ListLocalFiles(str(tmpdir), usehash=True)
+    assert sorted(files.keys()) == ['a.txt', 'sub/b.txt']
+    assert files['sub/b.txt']['size'] == 4
+    assert files['a.txt']['hash'] == 'a9993e364706816aba3e25717850c26c9cd0d89d'
+
+
+@pytest.mark.parametrize('direction, delete, usehash, expectedtransfer, expecteddelete', [
+    (filesyncutils.SYNC_DIRECTION_UPLOAD, False, False, ['new', 'newer', 'resized'], []),
+    (filesyncutils.SYNC_DIRECTION_UPLOAD, True, False, ['new', 'newer', 'resized'], ['extra']),
+    (filesyncutils.SYNC_DIRECTION_UPLOAD, False, True, ['new', 'rehashed', 'resized'], []),
+    (filesyncutils.SYNC_DIRECTION_DOWNLOAD, True, False, ['extra', 'resized'], ['new']),
+])
+def test_ComputeSyncPlan(direction, delete, usehash, expectedtransfer, expecteddelete):
+    localfiles = {
+        'same': {'size': 1, 'modified': 100.0, 'hash': 'a'},
+        'new': {'size': 2, 'modified': 100.0, 'hash': 'b'},
+        'newer': {'size': 3, 'modified': 200.0, 'hash': 'c'},
+        'resized': {'size': 4, 'modified': 100.0, 'hash': 'd'},
+        'rehashed': {'size': 5, 'modified': 100.0, 'hash': 'e'},
+    }
+    remotefiles = {
+        'same': {'size': 1, 'modified': 100.5, 'hash': 'a'},
+        'newer': {'size': 3, 'modified': 100.0, 'hash': 'c'},
+        'resized': {'size': 40, 'modified': 100.0, 'hash': 'd'},
+        'rehashed': {'size': 5, 'modified': 100.0, 'hash': 'x'},
+        'extra': {'size': 6, 'modified': 100.0, 'hash': 'f'},
+    }
+    plan = filesyncutils.ComputeSyncPlan(localfiles, remotefiles, direction, delete=delete, usehash=usehash)
+    assert plan['transfer'] == expectedtransfer
+    assert plan['delete'] == expecteddelete
+    assert 'same' in plan['unchanged']
+
+
+def test_SyncDirectoryDryRun(tmpdir):
+    class FakeControllerClient(object):
+        def ListFiles(self, dirname='', timeout=2):
+            return {'files': [{'filename': 'a.txt', 'size': 3, 'modified': 0}]}
+
+    tmpdir.join('a.txt').write('abc')
+    tmpdir.join('b.txt').write('bcd')
+    os.utime(str(tmpdir.join('a.txt')), (0, 0))
+    summary = filesyncutils.SyncDirectory(FakeControllerClient(), str(tmpdir), 'scenes', dryrun=True)
+    assert summary['dryrun']
+    assert summary['plan']['transfer'] == ['b.txt']
+    assert summary['transferred'] == []
+
+
+def test_ComputeSyncPlanDestinationNewer():
+    localfiles = {'a': {'size': 1, 'modified': 100.0, 'hash': None}}
+    remotefiles = {'a': {'size': 1, 'modified': 200.0, 'hash': None}}
+    plan = filesyncutils.ComputeSyncPlan(localfiles, remotefiles, filesyncutils.SYNC_DIRECTION_UPLOAD)
+    assert plan['transfer'] == ['a'] and plan['verify'] == ['a']
+
+    remotefiles['a']['hash'] = localfiles['a']['hash'] = 'x'
+    plan = filesyncutils.ComputeSyncPlan(localfiles, remotefiles, filesyncutils.SYNC_DIRECTION_UPLOAD)
+    assert plan['unchanged'] == ['a'] and plan['verify'] == []
+
+
+class _FakeControllerClient(object):
+    def __init__(self, listings, heads=None):
+        self.listings = listings  # dict mapping remote directory to ListFiles response
+        self.heads = heads or {}  # dict mapping remote filename to HeadFile response
+        self.headfiles = []
+
+    def ListFiles(self, dirname='', timeout=2):
+        return self.listings[dirname]
+
+    def HeadFile(self, filename, timeout=5):
+        self.headfiles.append(filename)
+        return self.heads[filename]
+
+
+def test_ListRemoteFiles():
+    client = _FakeControllerClient({
+        'scenes': {'files': [
+            {'filename': 'a.mujin.dae', 'size': 3, 'modified': 100},
+            {'name': 'parts', 'isDirectory': True},
+            'b.mujin.dae',
+        ]},
+        'scenes/parts': ['c.stl', 'sub/'],
+        'scenes/parts/sub': [],
+    }, heads={
+        'scenes/b.mujin.dae': {'size': 4, 'modified': datetime.datetime(1970, 1, 1, 0, 1, 40), 'hash': 'b'},
+        'scenes/parts/c.stl': {'size': 5, 'modified': datetime.datetime(1970, 1, 1, 0, 3, 20), 'hash': 'c'},
+    })
+    files = filesyncutils.ListRemoteFiles(client, 'scenes')
+    assert files == {
+        'a.mujin.dae': {'size': 3, 'modified': 100, 'hash': None},
+        'b.mujin.dae': {'size': 4, 'modified': 100, 'hash': 'b'},
+        'parts/c.stl': {'size': 5, 'modified': 200, 'hash': 'c'},
+    }
+    assert sorted(client.headfiles) == ['scenes/b.mujin.dae', 'scenes/parts/c.stl']
+
+
+@pytest.mark.parametrize('remotehash, expectedtransfer', [
+    ('a9993e364706816aba3e25717850c26c9cd0d89d', []),  # sha1 of abc
+    ('other', ['a.txt']),
+])
+def test_SyncDirectoryVerifiesNewerDestination(tmpdir, remotehash, expectedtransfer):
+    tmpdir.join('a.txt').write('abc')
+    os.utime(str(tmpdir.join('a.txt')), (0, 0))
+    client = _FakeControllerClient({'scenes': {'files': [{'filename': 'a.txt', 'size': 3, 'modified': 100}]}}, heads={'scenes/a.txt': {'hash': remotehash}})
+    summary = filesyncutils.SyncDirectory(client, str(tmpdir), 'scenes', dryrun=True)
+    assert summary['plan']['transfer'] == expectedtransfer
+    assert summary['plan']['verify'] == []
+    assert client.headfiles == ['scenes/a.txt']
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from mujincontrollerclient import APIServerError
+from mujincontrollerclient.handeyecalibrationcontrollerclient import HandEyeCalibrationControllerClient
+
+
+class _FakeHandEyeCalibrationControllerClient(HandEyeCalibrationControllerClient):
+    def __init__(self):
+        super(_FakeHandEyeCalibrationControllerClient, self).__init__(robot='robot', taskzmqport=None, taskheartbeatport=None, taskheartbeattimeout=None, scenepk='test.mujin.dae', controllerurl='http://controller', controllerusername='mujin', controllerpassword='mujin')
+        self.sampledgridindices = []
+        self.lock = threading.Lock()
+        self.latency = 0.0
+
+    def ExecuteCommand(self, taskparameters, timeout=None, usewebapi=None, **kwargs):
+        assert taskparameters['command'] == 'SampleCalibrationConfiguration'
+        gridindex = taskparameters['gridindex']
+        with self.lock:
+            self.sampledgridindices.append(gridindex)
+        time.sleep(self.latency)
+        if gridindex % 3 == 0:
+            raise APIServerError('no valid configuration for grid index %d' % gridindex)
+        return {'gridindex': gridindex, 'visibility': taskparameters['calibboardvisibility'], 'score': gridindex % 2}
+
+
+def _Sample(client, gridindices, **kwargs):
+    return list(client.SampleCalibrationConfigurations('camera', 'sensor1', ['sensor2'], gridindices, {'visible': True}, maxworkers=2, **kwargs))
+
+
+def test_SampleCalibrationConfigurations():
+    client = _FakeHandEyeCalibrationControllerClient()
+    samples = _Sample(client, range(6))
+    assert sorted(sample['gridindex'] for sample in samples) == list(range(6))
+    assert sorted(sample['gridindex'] for sample in samples if sample['valid']) == [1, 2, 4, 5]
+    assert all(isinstance(sample['error'], APIServerError) for sample in samples if not sample['valid'])
+
+    # valid samples are cached
+    client.sampledgridindices = []
+    samples = _Sample(client, range(6))
+    assert sorted(sample['gridindex'] for sample in samples if sample['cached']) == [1, 2, 4, 5]
+    assert sorted(client.sampledgridindices) == [0, 3]
+
+    # other sampling parameters are not served from the cache
+    client.sampledgridindices = []
+    samples = client.SampleCalibrationConfigurations('camera', 'sensor1', ['sensor2'], range(6), {'visible': False}, maxworkers=2)
+    assert not any(sample['cached'] for sample in samples)
+    assert sorted(client.sampledgridindices) == list(range(6))
+    client.sampledgridindices = []
+    samples = _Sample(client, range(6), samplingoption=1)
+    assert not any(sample['cached'] for sample in samples)
+
+    # cached samples are checked with isvalidfn
+    client.sampledgridindices = []
+    samples = _Sample(client, range(6), isvalidfn=lambda result: result['score'] == 1)
+    assert sorted(sample['gridindex'] for sample in samples if sample['cached']) == [1, 5]
+    assert sorted(sample['gridindex'] for sample in samples if sample['valid']) == [1, 5]
+
+    client.ClearCalibrationSampleCache('camera', 'sensor1', ['sensor2'])
+    client.sampledgridindices = []
+    _Sample(client, range(6))
+    assert sorted(client.sampledgridindices) == list(range(6))
+
+
+def test_SampleCalibrationConfigurationsStopsEarly():
+    client = _FakeHandEyeCalibrationControllerClient()
+    client.latency = 0.01
+    samples = _Sample(client, range(30), numvalidsamples=3, usecache=False)
+    assert len([sample for sample in samples if sample['valid']]) == 3
+    # at most the requests in flight are sampled after the third valid sample
+    assert len(client.sampledgridindices) < 30
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import threading
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from mujincontrollerclient import APIServerError, ControllerClientError, TimeoutError
+from mujincontrollerclient import ikutils, poseutils
+
+
+class _FakeClient(object):
+    def __init__(self, supportsbatch, maxbatchsize=None):
+        self.supportsbatch = supportsbatch
+        self.maxbatchsize = maxbatchsize
+        self.batchsizes = []
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def UseWorkerCommandSocket(self):
+        yield None
+
+    def _ComputeIK(self, ikparam):
+        assert ikparam['iktype'] == 'Transform6D'
+        if ikparam['translation'][0] < 0:
+            return {'solutions': []}
+        return {'solutions': [[ikparam['translation'][0], 1.0, 2.0]]}
+
+    def ExecuteCommand(self, taskparameters, toolname=None, usewebapi=None, timeout=None):
+        if taskparameters['command'] == 'ComputeIKBatch':
+            if not self.supportsbatch:
+                raise APIServerError('unknown command')
+            with self.lock:
+                self.batchsizes.append(len(taskparameters['ikparams']))
+            if self.maxbatchsize is not None and len(taskparameters['ikparams']) > self.maxbatchsize:
+                raise TimeoutError('timed out')
+            return {'results': [self._ComputeIK(ikparam) for ikparam in taskparameters['ikparams']]}
+        return self._ComputeIK(taskparameters)
+
+
+def test_AdaptiveChunker():
+    chunker = ikutils.AdaptiveChunker(100, chunksize=10, maxchunksize=40, targetduration=1.0)
+    assert chunker.Next() == (0, 10)
+    chunker.Done(0, 10, 0.1)
+    assert chunker.chunksize == 40
+    assert chunker.Next() == (10, 50)
+    assert chunker.Split(10, 50)
+    assert chunker.Next() == (10, 30)
+    assert chunker.Next() == (30, 50)
+    assert chunker.Next() == (50, 70)
+    assert not chunker.Split(70, 71)
+
+
+@pytest.mark.parametrize('supportsbatch, maxbatchsize', [(True, None), (True, 3), (False, None)])
+def test_ComputeIKBatch(supportsbatch, maxbatchsize):
+    client = _FakeClient(supportsbatch, maxbatchsize=maxbatchsize)
+    ikparams = [{'iktype': 'Transform6D', 'translation': [index if index % 5 else -1, 0, 0], 'quaternion': [1, 0, 0, 0]} for index in range(50)]
+    results = ikutils.ComputeIKBatch(client, ikparams, chunksize=8, maxworkers=3, usewebapi=True)
+    expectedsuccess = numpy.array([index % 5 != 0 for index in range(50)])
+    assert numpy.array_equal(results['success'], expectedsuccess)
+    assert results['solutions'].shape == (50, 3)
+    assert numpy.all(numpy.isnan(results['solutions'][~expectedsuccess]))
+    assert numpy.array_equal(results['solutions'][expectedsuccess, 0], numpy.arange(50)[expectedsuccess])
+    assert all((error is None) == success for error, success in zip(results['errors'], expectedsuccess))
+    assert results['usedbatch'] == supportsbatch
+
+
+@pytest.mark.parametrize('supportsbatch', [True, False])
+def test_ComputeIKBatchPoses(supportsbatch):
+    client = _FakeClient(supportsbatch)
+    poses = numpy.zeros((10, 7))
+    poses[:, 0] = 1
+    poses[:, 4] = numpy.arange(10)
+    for ikparams in (poseutils.PoseBatch(poses), poses):
+        results = ikutils.ComputeIKBatch(client, ikparams, chunksize=4, maxworkers=2, usewebapi=True)
+        assert results['success'].all() and results['usedbatch'] == supportsbatch
+        assert numpy.array_equal(results['solutions'][:, 0], numpy.arange(10))
+
+    # dicts get the given iktype, and an iktype is required
+    results = ikutils.ComputeIKBatch(client, [{'translation': [1, 0, 0], 'quaternion': [1, 0, 0, 0]}], usewebapi=True, iktype='Transform6D')
+    assert results['success'].all()
+    with pytest.raises(ControllerClientError):
+        ikutils.ComputeIKBatch(client, [{'translation': [1, 0, 0], 'quaternion': [1, 0, 0, 0]}], usewebapi=True)
+
+
+def test_ComputeIKBatchReusesCommandSockets():
+    from mujincontrollerclient.realtimerobotclient import RealtimeRobotControllerClient
+    from .fakecontroller import FakeController
+
+    with FakeController(numworkers=2) as controller:
+        controller.SetCommandHandler('ComputeIKBatch', lambda taskparameters: {'results': [{'solutions': [[ikparam['translation'][0]]]} for ikparam in taskparameters['ikparams']]})
+        clientkwargs = controller.GetClientKwargs()
+        clientkwargs['taskheartbeatport'] = None
+        client = RealtimeRobotControllerClient(robotname='robot', tasktype='realtimerobottask3', scenepk='test.mujin.dae', usewebapi=False, **clientkwargs)
+        try:
+            ikparams = [{'iktype': 'Transform6D', 'translation': [index, 0, 0], 'quaternion': [1, 0, 0, 0]} for index in range(20)]
+            results = ikutils.ComputeIKBatch(client, ikparams, chunksize=2, maxworkers=2)
+            assert results['success'].all() and results['solutions'][:, 0].tolist() == list(range(20))
+            commandsockets = set(client._workercommandsockets)
+            assert 1 <= len(commandsockets) <= 2
+
+            # the next batch is sent through the same sockets
+            ikutils.ComputeIKBatch(client, ikparams, chunksize=2, maxworkers=2)
+            # more sockets are only created if more workers run at the same time than before
+            assert commandsockets <= set(client._workercommandsockets) and len(client._workercommandsockets) <= 2
+        finally:
+            client.Destroy()
+        assert all(commandsocket._pool is None for commandsocket in commandsockets)
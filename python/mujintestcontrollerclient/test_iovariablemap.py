@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from mujincontrollerclient import APIServerError
+from mujincontrollerclient import iovariablemap
+
+
+class _FakeClient(object):
+    def __init__(self, iovalues, supportsregistration=True):
+        self.iovalues = iovalues
+        self.supportsregistration = supportsregistration
+        self.requests = []
+        self.written = []
+        self.registered = None  # IO names registered as map1, None if the server lost the registration
+        self.nummaps = 0
+
+    def GetRobotBridgeIOVariables(self, ionames=None, robotname=None, timeout=10, **kwargs):
+        self.requests.append(dict(kwargs, ionames=ionames))
+        if 'iomapid' in kwargs:
+            if self.registered is None or kwargs['iomapid'] != 'map%d' % self.nummaps:
+                raise APIServerError('unknown IO map %s' % kwargs['iomapid'])
+            return {'iomapid': kwargs['iomapid'], 'iovalues': [self.iovalues[self.registered[index]] for index in kwargs['ioindices']]}
+        response = {'iovalues': [self.iovalues[ioname] for ioname in ionames]}
+        if kwargs.get('registeriomap') and self.supportsregistration:
+            self.registered = list(ionames)
+            self.nummaps += 1
+            response['iomapid'] = 'map%d' % self.nummaps
+        return response
+
+    def SetRobotBridgeIOVariables(self, iovalues, robotname=None, timeout=10):
+        self.written.append(iovalues)
+
+
+def test_EncodeDecodeIOValue():
+    assert iovariablemap.DecodeIOValue('0100', None) == b'\x01\x00'
+    assert iovariablemap.DecodeIOValue('01', '?') == True  # noqa: E712
+    assert iovariablemap.DecodeIOValue('2a000000', '<i4') == 42
+    assert iovariablemap.EncodeIOValue(42, '<i4') == '2a000000'
+    assert list(iovariablemap.DecodeIOValue(iovariablemap.EncodeIOValue([1.5, 2.5], '<f4'), '<f4')) == [1.5, 2.5]
+
+
+@pytest.mark.parametrize('supportsregistration', [True, False])
+def test_IOVariableMap(supportsregistration):
+    client = _FakeClient({'bReady': '00', 'nCount': '01000000', 'raw': 'ff'}, supportsregistration=supportsregistration)
+    iomap = iovariablemap.IOVariableMap(client, ['bReady', 'nCount', 'raw'], dtypes={'bReady': '?', 'nCount': '<i4'})
+    changes = []
+    iomap.AddCallback(lambda ioname, value, previousvalue: changes.append((ioname, value, previousvalue)), ionames=['nCount'])
+
+    assert iomap.Poll() == {'bReady': False, 'nCount': 1, 'raw': b'\xff'}
+    assert changes == [('nCount', 1, None)]
+    assert iomap.iomapid == ('map1' if supportsregistration else None)
+
+    client.iovalues['nCount'] = '02000000'
+    assert iomap.Poll() == {'nCount': 2}
+    assert changes[-1] == ('nCount', 2, 1)
+    assert iomap.Poll() == {}
+    if supportsregistration:
+        assert client.requests[-1]['ioindices'] == [0, 1, 2]
+        assert client.requests[-1]['ionames'] is None
+    assert list(iomap.GetArray(['bReady', 'nCount'], dtype=numpy.int32)) == [0, 2]
+
+    assert iomap.SetValues({'bReady': True, 'nCount': 2}) == ['bReady']
+    assert client.written == [[['bReady', '01']]]
+
+
+def test_IOVariableMapRegistersAgain():
+    client = _FakeClient({'bReady': '00', 'nCount': '01000000'})
+    iomap = iovariablemap.IOVariableMap(client, ['bReady', 'nCount'], dtypes={'bReady': '?', 'nCount': '<i4'})
+    iomap.Poll()
+    assert iomap.iomapid == 'map1'
+
+    # the controller restarted and lost the map
+    client.registered = None
+    client.iovalues['nCount'] = '02000000'
+    assert iomap.Poll() == {'nCount': 2}
+    assert iomap.iomapid == 'map2'
+    assert client.requests[-1]['registeriomap']
+
+    client.iovalues['nCount'] = '03000000'
+    assert iomap.Poll() == {'nCount': 3}
+    assert client.requests[-1]['iomapid'] == 'map2'
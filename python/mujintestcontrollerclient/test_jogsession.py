@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import threading
+import time
+
+from mujincontrollerclient import jogsession
+
+
+class _FakeCommandSocket(object):
+    destroyed = False
+
+    def Destroy(self):
+        self.destroyed = True
+
+
+class _FakeClient(object):
+    def __init__(self):
+        self.commands = []
+        self.commandsockets = []
+        self.sendevent = threading.Event()
+        self.usedcommandsocket = None  # Command socket used by the calling thread
+        self.endcommandsocket = None  # Command socket EndJogMode was sent through
+
+    def CreateCommandSocket(self):
+        commandsocket = _FakeCommandSocket()
+        self.commandsockets.append(commandsocket)
+        return commandsocket
+
+    @contextlib.contextmanager
+    def UseCommandSocket(self, commandsocket):
+        self.usedcommandsocket = commandsocket
+        try:
+            yield commandsocket
+        finally:
+            self.usedcommandsocket = None
+
+    def SetJogModeVelocities(self, movejointsigns, **kwargs):
+        self.commands.append(('SetJogModeVelocities', movejointsigns, kwargs))
+        self.sendevent.set()
+
+    def EndJogMode(self, **kwargs):
+        self.commands.append(('EndJogMode', None, kwargs))
+        self.endcommandsocket = self.usedcommandsocket
+
+
+def test_JogSession():
+    client = _FakeClient()
+    with jogsession.JogSession(client, rate=20, robotname='robot') as session:
+        # updates made between two ticks are coalesced
+        for index in range(5):
+            session.SetVelocities([index, 0, 0])
+        assert client.sendevent.wait(2.0)
+        time.sleep(0.2)
+
+    velocitycommands = [command for command in client.commands if command[0] == 'SetJogModeVelocities']
+    assert len(velocitycommands) <= 4
+    assert velocitycommands[-2][1] == [4, 0, 0]
+    assert velocitycommands[-1][1] == [0, 0, 0]
+    assert [command[2]['jogsequence'] for command in client.commands] == list(range(1, len(client.commands) + 1))
+    assert all(command[2]['fireandforget'] and command[2]['robotname'] == 'robot' for command in velocitycommands[:-1])
+    # the stop commands wait for their replies, through the session socket
+    assert not velocitycommands[-1][2]['fireandforget']
+    assert client.commands[-1][0] == 'EndJogMode'
+    assert not client.commands[-1][2]['fireandforget']
+    assert client.endcommandsocket is client.commandsockets[0]
+    assert client.commandsockets[0].destroyed
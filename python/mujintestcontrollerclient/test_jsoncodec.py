@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+import pytest
+
+from mujincontrollerclient import jsoncodec
+
+
+@pytest.mark.parametrize('codecname', jsoncodec.GetAvailableCodecs())
+def test_DumpsLoads(codecname):
+    previouscodecname = jsoncodec.GetCodecName()
+    try:
+        assert jsoncodec.SelectCodec([codecname]) == codecname
+        data = jsoncodec.Dumps({'name': u'測試', 'values': [1, 2.5, None, True]})
+        assert isinstance(data, bytes)
+        for encoded in (data, bytearray(data), memoryview(data), data.decode('utf-8')):
+            assert jsoncodec.Loads(encoded) == {'name': u'測試', 'values': [1, 2.5, None, True]}
+        with pytest.raises(ValueError):
+            jsoncodec.Loads(b'{"name":')
+    finally:
+        jsoncodec.SelectCodec([previouscodecname])
+
+
+@pytest.mark.parametrize('codecname', jsoncodec.GetAvailableCodecs())
+def test_NonFiniteAndWideNumbers(codecname):
+    previouscodecname = jsoncodec.GetCodecName()
+    try:
+        jsoncodec.SelectCodec([codecname])
+        value = jsoncodec.Loads(b'{"nan":NaN,"inf":Infinity,"ninf":-Infinity,"big":1180591620717411303424}')
+        assert math.isnan(value['nan']) and value['inf'] == float('inf') and value['ninf'] == -float('inf')
+        assert value['big'] == 2 ** 70
+        assert jsoncodec.Loads(jsoncodec.Dumps({'big': 2 ** 70, 'negbig': -2 ** 70}))['big'] == 2 ** 70
+        if codecname != jsoncodec.CODEC_ORJSON:
+            value = jsoncodec.Loads(jsoncodec.Dumps({'nan': float('nan'), 'inf': float('inf')}))
+            assert math.isnan(value['nan']) and value['inf'] == float('inf')
+    finally:
+        jsoncodec.SelectCodec([previouscodecname])
+
+
+def test_DefaultCodec():
+    previouscodecname = jsoncodec.GetCodecName()
+    try:
+        assert jsoncodec.SelectCodec() != jsoncodec.CODEC_ORJSON
+        value = jsoncodec.Loads(jsoncodec.Dumps({'nan': float('nan'), 'inf': float('inf'), 'big': 2 ** 70}))
+        assert math.isnan(value['nan']) and value['inf'] == float('inf') and value['big'] == 2 ** 70
+    finally:
+        jsoncodec.SelectCodec([previouscodecname])
+
+
+def test_SelectCodec():
+    previouscodecname = jsoncodec.GetCodecName()
+    try:
+        with pytest.raises(ValueError):
+            jsoncodec.SelectCodec(['simplejson'])
+        assert jsoncodec.SelectCodec([]) == jsoncodec.CODEC_STDLIB
+    finally:
+        jsoncodec.SelectCodec([previouscodecname])
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from mujincontrollerclient import meshutils  # noqa: E402
+
+
+def _EncodeGeometry(positions, indices):
+    return {
+        'positions_base64': base64.b64encode(numpy.asarray(positions, dtype=numpy.float64).tobytes()),
+        'indices_base64': base64.b64encode(numpy.asarray(indices, dtype=numpy.uint32).tobytes()),
+    }
+
+
+def test_DecodeGeometry():
+    geometry = meshutils.DecodeGeometry(_EncodeGeometry([[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0, 1, 2]]), dtype=numpy.float32)
+    assert geometry['positions'].shape == (3, 3)
+    assert geometry['positions'].dtype == numpy.float32
+    assert geometry['indices'].tolist() == [[0, 1, 2]]
+
+
+def test_DecodeGeometryWritable():
+    encodedGeometry = _EncodeGeometry([[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0, 1, 2]])
+    geometry = meshutils.DecodeGeometry(encodedGeometry)
+    geometry['positions'][0] = [1, 1, 1]
+    geometry['indices'][0, 0] = 1
+    assert geometry['positions'][0].tolist() == [1, 1, 1]
+
+    # zero-copy is opt-in
+    geometry = meshutils.DecodeGeometry(encodedGeometry, copy=False)
+    assert not geometry['positions'].flags.writeable and not geometry['indices'].flags.writeable
+    assert meshutils.LazyGeometry(encodedGeometry)['positions'].flags.writeable
+    assert not meshutils.LazyGeometry(encodedGeometry, copy=False)['indices'].flags.writeable
+
+
+def test_LazyGeometry():
+    geometry = meshutils.LazyGeometry(_EncodeGeometry([[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0, 1, 2]]))
+    assert repr(geometry) == "<LazyGeometry(decoded=[])>"
+    assert geometry['indices'].shape == (1, 3)
+    assert sorted(geometry.keys()) == ['indices', 'positions']
+    assert dict(geometry)['positions'][1].tolist() == [1, 0, 0]
+
+
+def test_MergeGeometries():
+    merged = meshutils.MergeGeometries([
+        _EncodeGeometry([[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0, 1, 2]]),
+        _EncodeGeometry([[0, 0, 1], [1, 0, 1], [0, 1, 1], [1, 1, 1]], [[0, 1, 2], [1, 3, 2]]),
+    ])
+    assert merged['positions'].shape == (7, 3)
+    assert merged['indices'].tolist() == [[0, 1, 2], [3, 4, 5], [4, 6, 5]]
+    assert merged['positionOffsets'].tolist() == [0, 3, 7]
+    assert merged['indexOffsets'].tolist() == [0, 1, 3]
+    assert meshutils.MergeGeometries([])['positions'].shape == (0, 3)
+
+
+def test_BinaryMeshRoundTrip():
+    vertices = numpy.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0]], dtype=numpy.float64)
+    indices = numpy.array([[0, 1, 2], [1, 3, 2]], dtype=numpy.uint32)
+
+    data = meshutils.EncodeBinarySTL(vertices, indices)
+    assert len(data) == 84 + 50 * 2
+    stlvertices, stlindices = meshutils.DecodeBinarySTL(data)
+    assert numpy.allclose(stlvertices[stlindices], vertices[indices])
+
+    packedvertices, packedindices = meshutils.DecodePackedMesh(meshutils.EncodePackedMesh(vertices, indices))
+    assert numpy.allclose(packedvertices, vertices)
+    assert packedindices.tolist() == indices.tolist()
+
+    graphvertices, graphindices = meshutils.DecodeGraphMesh(meshutils.EncodeGraphMeshInput(vertices, indices))
+    assert numpy.allclose(graphvertices, vertices)
+    assert graphindices.tolist() == indices.tolist()
+
+    with pytest.raises(ValueError):
+        meshutils.EncodePackedMesh(vertices, [[0, 1, 4]])
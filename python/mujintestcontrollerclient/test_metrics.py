@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+import requests_mock
+
+from mujincontrollerclient import APIServerError, jsoncodec, metrics, zmq
+from mujincontrollerclient.controllerclientbase import ControllerClient
+from mujincontrollerclient.planningclient import PlanningControllerClient
+
+
+def test_LatencyHistogram():
+    histogram = metrics.LatencyHistogram(subbucketbits=4, maxseconds=10.0)
+    assert histogram.GetPercentile(50) is None
+    for index in range(1, 1001):
+        histogram.Record(index * 0.001)
+    snapshot = histogram.GetSnapshot()
+    assert snapshot['count'] == 1000
+    assert snapshot['min'] == pytest.approx(0.001)
+    assert snapshot['max'] == pytest.approx(1.0)
+    assert snapshot['mean'] == pytest.approx(0.5005, rel=1e-3)
+    for percentile, key in [(50, 'p50'), (90, 'p90'), (99, 'p99'), (99.9, 'p99_9')]:
+        assert snapshot[key] == pytest.approx(percentile / 100.0, rel=1.0 / 16)
+    assert sum(count for upperbound, count in histogram.GetBuckets()) == 1000
+
+    # values out of range are clamped
+    histogram.Record(100.0)
+    histogram.Record(-1.0)
+    assert histogram.GetSnapshot()['max'] == pytest.approx(10.0)
+    assert histogram.GetSnapshot()['min'] == 0
+
+    histogram.Reset()
+    assert histogram.GetSnapshot()['count'] == 0
+
+
+def test_MetricsRegistry():
+    registry = metrics.MetricsRegistry()
+    registry.RecordPhases('zmq', 'GetState', metrics.PHASE_SEND, 0.001, metrics.PHASE_TOTAL, 0.01)
+    registry.Record('zmq', 'PickAndPlace', metrics.PHASE_TOTAL, 1.0)
+    registry.RecordError('zmq', 'PickAndPlace', istimeout=True)
+    registry.RecordError('zmq', 'PickAndPlace')
+
+    exported = []
+    registry.AddExportHook(exported.append)
+    snapshot = registry.Export(reset=True)
+    assert exported == [snapshot]
+    assert snapshot['zmq']['GetState']['phases']['send']['count'] == 1
+    assert snapshot['zmq']['PickAndPlace']['numtimeouts'] == 1
+    assert snapshot['zmq']['PickAndPlace']['numerrors'] == 1
+    assert registry.GetSnapshot()['zmq']['PickAndPlace']['phases']['total']['count'] == 0
+
+    registry.Record('zmq', 'GetState', metrics.PHASE_TOTAL, 0.01)
+    registry.Record('zmq', 'PickAndPlace', metrics.PHASE_TOTAL, 1.0)
+    assert [name for component, name, seconds in registry.GetSlowestOperations()] == ['PickAndPlace', 'GetState']
+
+
+def test_WebClientMetrics():
+    with requests_mock.Mocker() as mock:
+        mock.get('http://controller/api/v1/scene/?format=json&limit=0&offset=0', json={'objects': [], 'meta': {'total_count': 0, 'limit': 0, 'offset': 0}})
+        mock.get('http://controller/api/v1/scene/missing/?format=json', status_code=404, json={'error_message': 'not found'})
+        controllerclient = ControllerClient('http://controller', 'mujin', 'mujin')
+        registry = controllerclient.EnableMetrics()
+        controllerclient.GetScenes()
+        with pytest.raises(APIServerError):
+            controllerclient.GetScene('missing')
+        snapshot = registry.GetSnapshot()['web']
+        assert set(snapshot['GET /api/v1/scene/']['phases']) == set([metrics.PHASE_WAIT, metrics.PHASE_DECODE, metrics.PHASE_TOTAL])
+        assert snapshot['GET /api/v1/scene/missing/']['numerrors'] == 1
+
+        controllerclient.DisableMetrics()
+        controllerclient.GetScenes()
+        assert registry.GetSnapshot()['web']['GET /api/v1/scene/']['phases']['total']['count'] == 1
+
+
+def _RunReplyServer(socket, stopevent):
+    while not stopevent.is_set():
+        if socket.poll(20, zmq.POLLIN) != zmq.POLLIN:
+            continue
+        request = jsoncodec.Loads(socket.recv())
+        taskparameters = request['taskparams']['taskparameters']
+        if taskparameters['command'] == 'Fail':
+            socket.send(jsoncodec.Dumps({'error': {'errorcode': 'failed', 'description': 'failed'}}))
+        else:
+            time.sleep(0.01)
+            socket.send(jsoncodec.Dumps({'output': {}}))
+
+
+def test_CommandMetrics():
+    ctx = zmq.Context()
+    stopevent = threading.Event()
+    socket = ctx.socket(zmq.REP)
+    port = socket.bind_to_random_port('tcp://127.0.0.1')
+    server = threading.Thread(target=_RunReplyServer, args=(socket, stopevent))
+    server.start()
+    client = PlanningControllerClient(taskzmqport=port, taskheartbeatport=None, taskheartbeattimeout=None, tasktype='binpicking', scenepk='test.mujin.dae', usewebapi=False, ctx=ctx, controllerurl='http://127.0.0.1', controllerusername='mujin', controllerpassword='mujin')
+    try:
+        registry = client.EnableMetrics()
+        for index in range(3):
+            client.ExecuteCommand({'command': 'GetState'}, timeout=5)
+        with pytest.raises(APIServerError):
+            client.ExecuteCommand({'command': 'Fail'}, timeout=5)
+        snapshot = registry.GetSnapshot()
+        assert snapshot['command']['GetState']['phases']['total']['count'] == 3
+        assert snapshot['command']['GetState']['phases']['total']['min'] >= 0.01
+        assert snapshot['command']['Fail']['numerrors'] == 1
+        zmqphases = snapshot['zmq']['GetState']['phases']
+        assert set(zmqphases) == set([metrics.PHASE_ACQUIRE, metrics.PHASE_SEND, metrics.PHASE_WAIT, metrics.PHASE_RECEIVE, metrics.PHASE_DECODE, metrics.PHASE_TOTAL])
+        assert zmqphases['wait']['min'] >= 0.01
+        assert registry.GetSlowestOperations(num=1)[0][1] == 'GetState'
+    finally:
+        client.Destroy()
+        stopevent.set()
+        server.join()
+        socket.close(linger=0)
+        ctx.destroy()
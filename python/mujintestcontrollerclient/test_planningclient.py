@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+from mujincontrollerclient import APIServerError, TimeoutError
+from mujincontrollerclient.planningclient import PlanningControllerClient
+
+
+class _FakePlanningControllerClient(PlanningControllerClient):
+    def __init__(self):
+        super(_FakePlanningControllerClient, self).__init__(taskzmqport=None, taskheartbeatport=None, taskheartbeattimeout=None, tasktype='binpicking', scenepk='test.mujin.dae', controllerurl='http://controller', controllerusername='mujin', controllerpassword='mujin')
+        self.numrequests = 0
+        self.fail = False
+        self.latency = 0.1
+        self.lock = threading.Lock()
+
+    def _ExecuteCommand(self, taskparameters, usewebapi, slaverequestid, timeout=None, fireandforget=None, respawnopts=None):
+        with self.lock:
+            self.numrequests += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise APIServerError('failed', errorcode='Failed')
+        return {'command': taskparameters['command'], 'numrequests': self.numrequests}
+
+
+def _ExecuteConcurrently(client, taskparameterslist):
+    outputs = [None] * len(taskparameterslist)
+    errors = [None] * len(taskparameterslist)
+
+    def _Execute(index):
+        try:
+            outputs[index] = client.ExecuteCommand(dict(taskparameterslist[index]))
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=_Execute, args=(index,)) for index in range(len(taskparameterslist))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outputs, errors
+
+
+def test_CommandCoalescing():
+    client = _FakePlanningControllerClient()
+    _ExecuteConcurrently(client, [{'command': 'GetState'}] * 4)
+    assert client.numrequests == 4
+
+    client.EnableCommandCoalescing(['GetState'])
+    client.numrequests = 0
+    outputs, errors = _ExecuteConcurrently(client, [{'command': 'GetState'}] * 4 + [{'command': 'GetState', 'key': 1}])
+    assert client.numrequests == 2
+    assert outputs[0] is outputs[3]
+
+    # not reused after finishing without freshness
+    client.ExecuteCommand({'command': 'GetState'})
+    assert client.numrequests == 3
+
+    # errors are shared with the waiting calls only
+    client.fail = True
+    outputs, errors = _ExecuteConcurrently(client, [{'command': 'GetState'}] * 3)
+    assert client.numrequests == 4
+    assert all(isinstance(error, APIServerError) and error.errorcode == 'Failed' for error in errors)
+    # each thread raises its own exception
+    assert len(set(id(error) for error in errors)) == 3
+    client.fail = False
+
+    client.EnableCommandCoalescing({'GetState': 1.0})
+    first = client.ExecuteCommand({'command': 'GetState'})
+    assert client.ExecuteCommand({'command': 'GetState'}) is first
+    assert client.numrequests == 5
+
+    client.DisableCommandCoalescing()
+    client.ExecuteCommand({'command': 'GetState'})
+    assert client.numrequests == 6
+    client.Destroy()
+
+
+def test_CommandCoalescingTimeout():
+    client = _FakePlanningControllerClient()
+    client.latency = 0.5
+    client.EnableCommandCoalescing(['GetState'])
+    leaderthread = threading.Thread(target=client.ExecuteCommand, args=({'command': 'GetState'},))
+    leaderthread.start()
+    time.sleep(0.1)
+    starttime = time.time()
+    with pytest.raises(TimeoutError):
+        client.ExecuteCommand({'command': 'GetState'}, timeout=0.1)
+    assert time.time() - starttime < 0.4
+    leaderthread.join()
+    assert client.numrequests == 1
+    client.Destroy()
+
+
+def test_CommandCoalescingFireAndForget():
+    client = _FakePlanningControllerClient()
+    client.EnableCommandCoalescing(['GetState'], freshness=10)
+    client.ExecuteCommand({'command': 'GetState'})
+    client.ExecuteCommand({'command': 'GetState'}, fireandforget=True)
+    assert client.numrequests == 2
+    client.Destroy()
+
+
+@pytest.mark.parametrize('freshness', [0, 10])
+def test_CommandCoalescingUnserializable(freshness):
+    client = _FakePlanningControllerClient()
+    client.EnableCommandCoalescing(['GetState'], freshness=freshness)
+    client.ExecuteCommand({'command': 'GetState', 'value': object()})
+    client.ExecuteCommand({'command': 'GetState', 'value': object()})
+    assert client.numrequests == 2
+    client.Destroy()
+
+
+def _RunReplyServer(socket, delay, stopevent):
+    from mujincontrollerclient import jsoncodec, zmq
+    while not stopevent.is_set():
+        if socket.poll(20, zmq.POLLIN) != zmq.POLLIN:
+            continue
+        request = jsoncodec.Loads(socket.recv())
+        time.sleep(delay)
+        socket.send(jsoncodec.Dumps({'output': {'command': request['taskparams']['taskparameters']['command']}}))
+
+
+def test_HighPriorityCommands():
+    from mujincontrollerclient import zmq
+    ctx = zmq.Context()
+    stopevent = threading.Event()
+    sockets = [ctx.socket(zmq.REP), ctx.socket(zmq.REP)]
+    ports = [socket.bind_to_random_port('tcp://127.0.0.1') for socket in sockets]
+    servers = [threading.Thread(target=_RunReplyServer, args=(socket, delay, stopevent)) for socket, delay in zip(sockets, [1.0, 0.0])]
+    for server in servers:
+        server.start()
+    client = PlanningControllerClient(taskzmqport=ports[0], taskhighpriorityport=ports[1], taskheartbeatport=None, taskheartbeattimeout=None, tasktype='binpicking', scenepk='test.mujin.dae', usewebapi=False, ctx=ctx, controllerurl='http://127.0.0.1', controllerusername='mujin', controllerpassword='mujin')
+    try:
+        assert 'PausePickPlace' in client.GetHighPriorityCommands()
+        bulkthread = threading.Thread(target=client.ExecuteCommand, args=({'command': 'PickAndPlace'},), kwargs={'timeout': 5})
+        bulkthread.start()
+        time.sleep(0.1)
+        starttime = time.time()
+        assert client.ExecuteCommand({'command': 'PausePickPlace'}, timeout=5) == {'command': 'PausePickPlace'}
+        assert time.time() - starttime < 0.5
+        bulkthread.join()
+    finally:
+        client.Destroy()
+        stopevent.set()
+        for server in servers:
+            server.join()
+        for socket in sockets:
+            socket.close(linger=0)
+        ctx.destroy()
+
+
+def test_HighPriorityCommandTimeout():
+    from mujincontrollerclient import UserInterrupt, zmq
+    ctx = zmq.Context()
+    stopevent = threading.Event()
+    sockets = [ctx.socket(zmq.REP), ctx.socket(zmq.REP)]
+    ports = [socket.bind_to_random_port('tcp://127.0.0.1') for socket in sockets]
+    servers = [threading.Thread(target=_RunReplyServer, args=(socket, 1.0, stopevent)) for socket in sockets]
+    for server in servers:
+        server.start()
+    client = PlanningControllerClient(taskzmqport=ports[0], taskhighpriorityport=ports[1], taskheartbeatport=None, taskheartbeattimeout=None, tasktype='binpicking', scenepk='test.mujin.dae', usewebapi=False, ctx=ctx, controllerurl='http://127.0.0.1', controllerusername='mujin', controllerpassword='mujin')
+    try:
+        slowerrors = []
+
+        def _ExecuteSlowCommand():
+            try:
+                client.ExecuteCommand({'command': 'PausePickPlace'}, timeout=5)
+            except UserInterrupt as e:
+                # the preempt function below also preempts the command in flight
+                slowerrors.append(e)
+        slowthread = threading.Thread(target=_ExecuteSlowCommand)
+        slowthread.start()
+        time.sleep(0.1)
+        # waiting behind the high priority command in flight is bounded by the timeout
+        starttime = time.time()
+        with pytest.raises(TimeoutError):
+            client.ExecuteCommand({'command': 'StopGripper'}, timeout=0.1)
+        assert time.time() - starttime < 0.5
+
+        def _Preempt():
+            raise UserInterrupt('preempted')
+        client._highprioritysocket.SetPreemptFn(_Preempt)
+        with pytest.raises(UserInterrupt):
+            client.ExecuteCommand({'command': 'StopGripper'}, timeout=5)
+        slowthread.join()
+    finally:
+        client.Destroy()
+        stopevent.set()
+        for server in servers:
+            server.join()
+        for socket in sockets:
+            socket.close(linger=0)
+        ctx.destroy()
+
+
+@pytest.mark.parametrize('taskhighpriorityport', [None, 'taskzmqport'])
+def test_HighPriorityCommandsWithoutPort(taskhighpriorityport, caplog):
+    from mujincontrollerclient import zmq
+    ctx = zmq.Context()
+    stopevent = threading.Event()
+    socket = ctx.socket(zmq.REP)
+    port = socket.bind_to_random_port('tcp://127.0.0.1')
+    server = threading.Thread(target=_RunReplyServer, args=(socket, 0.0, stopevent))
+    server.start()
+    client = PlanningControllerClient(taskzmqport=port, taskhighpriorityport=port if taskhighpriorityport else None, taskheartbeatport=None, taskheartbeattimeout=None, tasktype='binpicking', scenepk='test.mujin.dae', usewebapi=False, ctx=ctx, controllerurl='http://127.0.0.1', controllerusername='mujin', controllerpassword='mujin')
+    try:
+        # no high priority channel without a separate port, the commands are sent like other commands
+        assert client._highprioritysocket is None
+        assert ('high priority' in caplog.text) == bool(taskhighpriorityport)
+        assert client.ExecuteCommand({'command': 'PausePickPlace'}, timeout=5) == {'command': 'PausePickPlace'}
+    finally:
+        client.Destroy()
+        stopevent.set()
+        server.join()
+        socket.close(linger=0)
+        ctx.destroy()
+
+
+def test_ExecuteCommandsConcurrentlyReusesCommandSockets():
+    from .fakecontroller import FakeController
+
+    with FakeController(numworkers=4) as controller:
+        controller.SetCommandHandler('GetState', lambda taskparameters: {'value': taskparameters['value']})
+        clientkwargs = controller.GetClientKwargs()
+        clientkwargs['taskheartbeatport'] = None
+        client = PlanningControllerClient(tasktype='binpicking', scenepk='test.mujin.dae', usewebapi=False, **clientkwargs)
+        try:
+            taskparameterslist = [{'command': 'GetState', 'value': index} for index in range(8)]
+            assert client._ExecuteCommandsConcurrently(taskparameterslist, maxworkers=4) == [{'value': index} for index in range(8)]
+            commandsockets = set(client._workercommandsockets)
+            assert 1 <= len(commandsockets) <= 4
+            client._ExecuteCommandsConcurrently(taskparameterslist, maxworkers=4)
+            # more sockets are only created if more workers run at the same time than before
+            assert commandsockets <= set(client._workercommandsockets) and len(client._workercommandsockets) <= 4
+        finally:
+            client.Destroy()
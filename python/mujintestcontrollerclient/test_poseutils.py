@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from mujincontrollerclient import ControllerClientError
+from mujincontrollerclient import poseutils
+
+
+def _RandomQuaternions(num):
+    quaternions = numpy.random.RandomState(0).normal(size=(num, 4))
+    quaternions /= numpy.linalg.norm(quaternions, axis=1)[:, None]
+    quaternions[quaternions[:, 0] < 0] *= -1
+    return quaternions
+
+
+def test_QuaternionMatrixRoundTrip():
+    quaternions = _RandomQuaternions(100)
+    rotations = poseutils.ComputeMatricesFromQuaternions(quaternions)
+    assert numpy.allclose(numpy.matmul(rotations, rotations.transpose(0, 2, 1)), numpy.eye(3))
+    assert numpy.allclose(poseutils.ComputeQuaternionsFromMatrices(rotations), quaternions)
+
+
+def test_PoseBatch():
+    quaternions = _RandomQuaternions(3)
+    translations = numpy.arange(9, dtype=numpy.float64).reshape((3, 3))
+    posebatch = poseutils.PoseBatch.FromQuaternionsTranslations(quaternions, translations)
+    posebatch.ValidateQuaternions()
+    assert numpy.allclose(poseutils.PoseBatch(posebatch.GetMatrices()).poses, posebatch.poses)
+    assert numpy.array_equal(poseutils.PoseBatch.FromBytes(posebatch.ToBytes()).poses, posebatch.poses)
+
+    envstate = posebatch.ToEnvState(['a', 'b', 'c'], object_uri=u'mujin:/box.mujin.dae', perobject={'isPickable': [True, False, True], 'extents': numpy.ones((3, 3))}, size=[1, 2, 3])
+    assert envstate[1]['name'] == 'b' and envstate[1]['translation_'] == [3.0, 4.0, 5.0] and not envstate[1]['isPickable']
+    assert envstate[1]['extents'] == [1.0, 1.0, 1.0]
+    assert envstate[2]['object_uri'] == u'mujin:/box.mujin.dae'
+    # lists in kwargs are the same value for all objects, even if their length is the number of objects
+    assert all(envobject['size'] == [1, 2, 3] for envobject in envstate)
+    with pytest.raises(ControllerClientError):
+        posebatch.ToEnvState(['a', 'b', 'c'], perobject={'isPickable': [True, False]})
+    frombatch, names = poseutils.PoseBatch.FromEnvState(envstate)
+    assert names == ['a', 'b', 'c'] and numpy.array_equal(frombatch.poses, posebatch.poses)
+
+    identity = poseutils.PoseBatch([[1, 0, 0, 0, 10, 20, 30]])
+    assert identity.ToGoals('translationdirection5d') == [10, 20, 30, 0, 0, 1]
+    assert identity.ToGoals('transform6d') == [1, 0, 0, 0, 10, 20, 30]
+    assert len(posebatch.ToGoals()) == 21
+    ikparams = posebatch[[0, 2]].ToIKParameters()
+    assert ikparams[1]['translation'] == [6.0, 7.0, 8.0] and ikparams[1]['iktype'] == 'Transform6D'
+
+    with pytest.raises(ControllerClientError):
+        poseutils.PoseBatch([[2, 0, 0, 0, 0, 0, 0], [numpy.nan, 0, 0, 0, 0, 0, 0]]).ValidateQuaternions()
+    assert numpy.allclose(poseutils.PoseBatch([[-2, 0, 0, 0, 0, 0, 0]]).Normalize().quaternions, [[1, 0, 0, 0]])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pstats
+import threading
+import time
+
+from mujincontrollerclient import profiler
+
+
+def _BusyLoop(stopevent):
+    while not stopevent.is_set():
+        sum(range(1000))
+
+
+def _ProfileBusyLoop(sampler, duration=0.3):
+    stopevent = threading.Event()
+    thread = threading.Thread(target=_BusyLoop, args=(stopevent,))
+    thread.start()
+    sampler.Start()
+    time.sleep(duration)
+    stopevent.set()
+    thread.join()
+
+
+def test_SamplingProfiler(tmpdir):
+    sampler = profiler.SamplingProfiler(interval=0.005, scopes=('mujintestcontrollerclient',))
+    _ProfileBusyLoop(sampler)
+    collapsedstacks = sampler.GetCollapsedStacks()
+    sampler.Stop()
+    assert sum(count for stack, count in collapsedstacks.items() if stack.endswith('test_profiler:_BusyLoop')) > 10
+    assert all('test_profiler' in stack for stack in collapsedstacks)
+
+    collapsedfilename = str(tmpdir.join('profile.collapsed'))
+    sampler.Dump(collapsedfilename)
+    with open(collapsedfilename) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == len(collapsedstacks)
+
+    pstatsfilename = str(tmpdir.join('profile.prof'))
+    sampler.Dump(pstatsfilename, format=profiler.FORMAT_PSTATS, reset=True)
+    stats = pstats.Stats(pstatsfilename)
+    busyloop = [function for function in stats.stats if function[2] == '_BusyLoop']
+    assert len(busyloop) == 1
+    assert stats.stats[busyloop[0]][3] > 0
+    assert sampler.GetCollapsedStacks() == {}
+
+
+def test_SamplingProfilerScope():
+    sampler = profiler.SamplingProfiler(interval=0.005)
+    _ProfileBusyLoop(sampler, duration=0.1)
+    sampler.Stop()
+    assert not any(stack.endswith('test_profiler:_BusyLoop') for stack in sampler.GetCollapsedStacks())
+
+
+def test_SamplingProfilerWindows(tmpdir):
+    outputdir = str(tmpdir.join('profiles'))
+    sampler = profiler.SamplingProfiler(interval=0.005, scopes=None, outputdir=outputdir, windowduration=0.1, format=profiler.FORMAT_PSTATS)
+    _ProfileBusyLoop(sampler, duration=0.35)
+    sampler.Stop()
+    filenames = os.listdir(outputdir)
+    assert len(filenames) >= 2
+    assert all(filename.endswith('.prof') for filename in filenames)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from mujincontrollerclient import APIServerError, ControllerClientError, TimeoutError
+from mujincontrollerclient.realtimeitlplanning3client import RealtimeITLPlanning3ControllerClient
+
+
+class _FakeStreamingServer(object):
+    """Answers the streaming commands like the realtimeitlplanning3 task, queueing at most maxqueuedsegments segments
+    """
+
+    def __init__(self, supportsstreaming=True, maxqueuedsegments=2):
+        self.supportsstreaming = supportsstreaming
+        self.maxqueuedsegments = maxqueuedsegments
+        self.queuedsegments = 0
+        self.stalled = False  # If True, the robot does not execute the queued segments
+        self.executedtrajectories = []
+        self.aborted = []
+
+    def Handle(self, taskparameters):
+        command = taskparameters['command']
+        if command == 'GetTrajectoryStreamCapabilities':
+            if not self.supportsstreaming:
+                raise APIServerError('unknown command GetTrajectoryStreamCapabilities')
+            return {'streaming': True, 'maxqueuedsegments': self.maxqueuedsegments}
+        if command == 'AbortTrajectoryStream':
+            self.aborted.append(taskparameters['identifier'])
+            return {}
+        assert command == 'ExecuteTrajectory'
+        if not self.supportsstreaming:
+            # an old server executes whatever it receives
+            self.executedtrajectories.extend(taskparameters['trajectories'])
+            return {}
+        if self.queuedsegments >= self.maxqueuedsegments:
+            if not self.stalled:
+                # the robot finishes executing one segment while the client waits
+                self.queuedsegments -= 1
+            return {'segmentindex': taskparameters['segmentindex'], 'accepted': False, 'retryafter': 0.001}
+        self.queuedsegments += 1
+        self.executedtrajectories.extend(taskparameters['trajectories'])
+        return {'segmentindex': taskparameters['segmentindex'], 'accepted': True}
+
+
+class _FakeRealtimeITLPlanning3ControllerClient(RealtimeITLPlanning3ControllerClient):
+    def __init__(self, server):
+        super(_FakeRealtimeITLPlanning3ControllerClient, self).__init__(robotname='robot', taskzmqport=None, taskheartbeatport=None, taskheartbeattimeout=None, scenepk='test.mujin.dae', controllerurl='http://controller', controllerusername='mujin', controllerpassword='mujin')
+        self.server = server
+        self.commands = []
+        self.lock = threading.Lock()
+
+    def ExecuteCommand(self, taskparameters, usewebapi=None, timeout=None, **kwargs):
+        with self.lock:
+            self.commands.append(taskparameters)
+        return self.server.Handle(taskparameters)
+
+
+def _GenerateSegments(numsegments, failat=None):
+    for index in range(numsegments):
+        if index == failat:
+            raise RuntimeError('failed to generate segment %d' % index)
+        yield ['traj%d' % index]
+
+
+def test_ExecuteTrajectoryStream():
+    server = _FakeStreamingServer()
+    client = _FakeRealtimeITLPlanning3ControllerClient(server)
+    stats = client.ExecuteTrajectoryStream('program', _GenerateSegments(5))
+    assert server.executedtrajectories == ['traj0', 'traj1', 'traj2', 'traj3', 'traj4']
+    assert stats['numsegments'] == 5
+    assert stats['ack'] == {'segmentindex': 5, 'accepted': True}
+    assert stats['timeToFirstAck'] is not None
+    # backpressure, the queue is full from the third segment on
+    assert stats['numretries'] > 0
+    assert server.aborted == []
+
+    # the capabilities are only asked once
+    client.ExecuteTrajectoryStream('program', _GenerateSegments(1))
+    assert len([command for command in client.commands if command['command'] == 'GetTrajectoryStreamCapabilities']) == 1
+
+
+def test_ExecuteTrajectoryStreamUnsupported():
+    server = _FakeStreamingServer(supportsstreaming=False)
+    client = _FakeRealtimeITLPlanning3ControllerClient(server)
+    with pytest.raises(ControllerClientError):
+        client.ExecuteTrajectoryStream('program', _GenerateSegments(3))
+    # no motion was sent
+    assert server.executedtrajectories == []
+    assert [command['command'] for command in client.commands] == ['GetTrajectoryStreamCapabilities']
+
+
+def test_ExecuteTrajectoryStreamAborts():
+    server = _FakeStreamingServer(maxqueuedsegments=10)
+    client = _FakeRealtimeITLPlanning3ControllerClient(server)
+    with pytest.raises(RuntimeError):
+        client.ExecuteTrajectoryStream('program', _GenerateSegments(5, failat=2))
+    assert server.executedtrajectories == ['traj0', 'traj1']
+    assert server.aborted == ['program']
+
+    # the server never accepts the segment
+    server.stalled = True
+    server.maxqueuedsegments = server.queuedsegments
+    server.aborted = []
+    with pytest.raises(ControllerClientError):
+        client.ExecuteTrajectoryStream('program', _GenerateSegments(5), maxretries=3)
+    assert server.aborted == ['program']
+
+    server.aborted = []
+    with pytest.raises(TimeoutError):
+        client.ExecuteTrajectoryStream('program', _GenerateSegments(5), timeout=0.01)
+    assert server.aborted == ['program']
+
+
+class _FakeExecutionGraphClient(RealtimeITLPlanning3ControllerClient):
+    def __init__(self, supportsprevious=True, supportsbatch=True):
+        super(_FakeExecutionGraphClient, self).__init__(robotname='robot', taskzmqport=None, taskheartbeatport=None, taskheartbeattimeout=None, scenepk='test.mujin.dae', controllerurl='http://controller', controllerusername='mujin', controllerpassword='mujin')
+        self.supportsprevious = supportsprevious
+        self.supportsbatch = supportsbatch
+        self.program = {'name': 'program', 'commands': ['a', 'b', 'c']}
+        self.commands = []
+
+    def GetITLProgram(self, programName, fields=None, usewebapi=True, timeout=5):
+        return dict(self.program)
+
+    def ExecuteCommand(self, taskparameters, usewebapi=None, timeout=None, **kwargs):
+        self.commands.append(taskparameters)
+        if taskparameters['command'] == 'GenerateExecutionGraph':
+            executiongraph = {'commands': list(self.program['commands']), 'robotname': taskparameters.get('robotname')}
+            if self.supportsprevious:
+                executiongraph['supportsPreviousExecutionGraph'] = True
+            return executiongraph
+        assert taskparameters['command'] == 'ComputeRobotConfigsForCommandVisualization'
+        if 'commandindices' in taskparameters:
+            if not self.supportsbatch:
+                raise APIServerError('commandindices is not supported')
+            return {'results': [{'index': index} for index in taskparameters['commandindices']]}
+        return {'index': taskparameters['commandindex']}
+
+
+@pytest.mark.parametrize('supportsprevious', [True, False])
+def test_GetExecutionGraph(supportsprevious):
+    client = _FakeExecutionGraphClient(supportsprevious=supportsprevious)
+    executiongraph = client.GetExecutionGraph('program', robotname='robot0')
+    assert client.GetExecutionGraph('program', robotname='robot0') is executiongraph
+    assert len(client.commands) == 1
+
+    # other arguments are other graphs
+    assert client.GetExecutionGraph('program', robotname='robot1')['robotname'] == 'robot1'
+    assert len(client.commands) == 2
+
+    # the previous graph is only sent to servers that support it
+    client.program['commands'] = ['a', 'b', 'd']
+    client.GetExecutionGraph('program', robotname='robot0')
+    taskparameters = client.commands[-1]
+    if supportsprevious:
+        assert taskparameters['previousExecutionGraph'] == executiongraph and taskparameters['unchangedCommandCount'] == 2
+    else:
+        assert 'previousExecutionGraph' not in taskparameters and 'unchangedCommandCount' not in taskparameters
+
+
+@pytest.mark.parametrize('supportsbatch', [True, False])
+def test_ComputeRobotConfigsForCommandVisualizationBatch(supportsbatch):
+    client = _FakeExecutionGraphClient(supportsbatch=supportsbatch)
+    assert client.ComputeRobotConfigsForCommandVisualizationBatch({}, [0, 1, 2]) == [{'index': 0}, {'index': 1}, {'index': 2}]
+    assert len(client.commands) == (1 if supportsbatch else 4)
+
+    # an unsupported batch is not retried
+    client.commands = []
+    client.ComputeRobotConfigsForCommandVisualizationBatch({}, [0, 1, 2])
+    assert len(client.commands) == (1 if supportsbatch else 3)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from mujincontrollerclient import APIServerError, ControllerClientError
+from mujincontrollerclient.realtimerobotclient import RealtimeRobotControllerClient
+
+
+class _FakeRealtimeRobotControllerClient(RealtimeRobotControllerClient):
+    def __init__(self, supportsbatch):
+        super(_FakeRealtimeRobotControllerClient, self).__init__(robotname='robot', taskzmqport=None, taskheartbeatport=None, taskheartbeattimeout=None, tasktype='realtimerobot', scenepk='test.mujin.dae', controllerurl='http://controller', controllerusername='mujin', controllerpassword='mujin')
+        self.supportsbatch = supportsbatch
+        self.commands = []
+        self.lock = threading.Lock()
+
+    def ExecuteCommand(self, taskparameters, usewebapi=None, timeout=None, **kwargs):
+        with self.lock:
+            self.commands.append(taskparameters)
+        if taskparameters['command'] == 'GetTransforms':
+            if not self.supportsbatch:
+                raise APIServerError('unknown command GetTransforms')
+            return {'results': dict((name, self._GetTransform(name)) for name in taskparameters['targetnames'])}
+        assert taskparameters['command'] == 'GetTransform'
+        return self._GetTransform(taskparameters['targetname'])
+
+    def _GetTransform(self, name):
+        return {'translation': [len(name), 0, 0], 'quaternion': [1, 0, 0, 0]}
+
+
+@pytest.mark.parametrize('supportsbatch', [True, False])
+def test_GetTransforms(supportsbatch):
+    client = _FakeRealtimeRobotControllerClient(supportsbatch)
+    names = ['a', 'bb', 'ccc', 'dddd', 'eeeee']
+    transforms = client.GetTransforms(names)
+    assert transforms['ccc'] == {'translation': [3, 0, 0], 'quaternion': [1, 0, 0, 0]}
+    assert len(client.commands) == (1 if supportsbatch else 1 + len(names))
+
+    # unsupported batch commands are not retried
+    client.commands = []
+    client.GetTransforms(names)
+    assert len(client.commands) == (1 if supportsbatch else len(names))
+
+    if not supportsbatch:
+        with pytest.raises(ControllerClientError):
+            client.GetTransforms(targetnamepattern='a.*')
+
+
+def test_GetTransformsAsArrays():
+    pytest.importorskip('numpy')
+    client = _FakeRealtimeRobotControllerClient(True)
+    arrays = client.GetTransforms(['a', 'bb'], asarrays=True)
+    assert arrays['names'] == ['a', 'bb']
+    assert arrays['translation'].shape == (2, 3) and arrays['translation'][1, 0] == 2
+    assert arrays['quaternion'].shape == (2, 4)
+
+
+def test_GetTrajectoryLogArraysCache(tmpdir):
+    pytest.importorskip('numpy')
+    client = _FakeRealtimeRobotControllerClient(True)
+    calls = []
+
+    def _GetTrajectoryLog(timeout=10, startindex=0, num=0, includejointvalues=False):
+        calls.append((startindex, num))
+        trajectories = [{'name': 'traj%d' % index, 'timestarted': index, 'duration': 0.008, 'numpoints': 2, 'timedjointvalues': [index, 0, index, 0.008]} for index in range(5)]
+        return {'trajectories': trajectories[startindex:startindex + num if num else None]}
+
+    client.GetTrajectoryLog = _GetTrajectoryLog
+    cachefilename = str(tmpdir.join('trajectories.npz'))
+    assert [trajectory['name'] for trajectory in client.GetTrajectoryLogArrays(cachefilename=cachefilename, startindex=1, num=2)] == ['traj1', 'traj2']
+    # the log may have changed on the server, so the cache is only reused when asked for
+    assert [trajectory['name'] for trajectory in client.GetTrajectoryLogArrays(cachefilename=cachefilename, startindex=1, num=2)] == ['traj1', 'traj2']
+    assert calls == [(1, 2), (1, 2)]
+    assert [trajectory['name'] for trajectory in client.GetTrajectoryLogArrays(cachefilename=cachefilename, usecache=True, startindex=1, num=2)] == ['traj1', 'traj2']
+    assert calls == [(1, 2), (1, 2)]
+
+    # another query is not served from the cache
+    assert [trajectory['name'] for trajectory in client.GetTrajectoryLogArrays(cachefilename=cachefilename, usecache=True, startindex=3, num=2)] == ['traj3', 'traj4']
+    assert calls == [(1, 2), (1, 2), (3, 2)]
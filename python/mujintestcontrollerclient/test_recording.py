@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+import pytest
+
+from mujincontrollerclient import APIServerError
+from mujincontrollerclient import recording
+from mujincontrollerclient.planningclient import PlanningControllerClient
+
+from .fakecontroller import FakeController
+
+
+def _Fail(taskparameters):
+    raise APIServerError('failed', errorcode='Failed')
+
+
+@pytest.fixture
+def controller():
+    with FakeController() as controller:
+        controller.SetCommandHandler('GetState', lambda taskparameters: {'value': taskparameters['value']})
+        controller.SetCommandHandler('Fail', _Fail)
+        yield controller
+
+
+def _CreatePlanningClient(controller, **kwargs):
+    clientkwargs = controller.GetClientKwargs()
+    clientkwargs.update(kwargs, taskheartbeatport=None)
+    return PlanningControllerClient(tasktype='binpicking', scenepk='test.mujin.dae', **clientkwargs)
+
+
+def test_RecordAndReplay(controller, tmpdir):
+    filename = str(tmpdir.join('traffic.jsonl'))
+    recorder = recording.TrafficRecorder(filename)
+    recorder.AddRedactionHook(lambda record: None if record['kind'] == recording.RECORD_COMMAND and record['request']['taskparameters']['command'] == 'Skipped' else record)
+    client = _CreatePlanningClient(controller, usewebapi=False)
+    client.SetRecorder(recorder)
+    try:
+        client.ExecuteCommand({'command': 'GetState', 'value': 1, 'password': 'secret'}, timeout=5)
+        client.ExecuteCommand({'command': 'Skipped'}, timeout=5)
+        with pytest.raises(APIServerError):
+            client.ExecuteCommand({'command': 'Fail'}, timeout=5)
+        # the APICall of the command sent through the web api is not recorded separately
+        client.ExecuteCommand({'command': 'GetState', 'value': 2}, usewebapi=True, timeout=5)
+        controller.SetResource('scene', 'test.mujin.dae', {'name': 'test'})
+        client.GetScene('test.mujin.dae')
+        client.graphApi.GetBody('body', 'test', fields=['id'])
+    finally:
+        client.Destroy()
+    recorder.Close()
+
+    records = recording.LoadTraffic(filename)
+    assert [record['kind'] for record in records] == [recording.RECORD_COMMAND, recording.RECORD_COMMAND, recording.RECORD_COMMAND, recording.RECORD_APICALL, recording.RECORD_GRAPHQL]
+    assert [record['seq'] for record in records] == [1, 2, 3, 4, 5]
+    assert records[0]['request']['taskparameters']['password'] == recording.REDACTED
+    assert records[0]['response'] == {'value': 1}
+    assert records[0]['responsesize'] == len(b'{"value":1}')
+    assert records[0]['requestsize'] > 0 and records[0]['duration'] > 0
+    assert records[1]['errortype'] == 'APIServerError' and 'response' not in records[1]
+    assert records[2]['request']['usewebapi']
+    assert records[3]['response']['name'] == 'test'
+
+    controller.ResetStatistics()
+    client = _CreatePlanningClient(controller, usewebapi=False)
+    try:
+        results = recording.TrafficReplayer(records).Replay(client, speed=None)
+    finally:
+        client.Destroy()
+    assert [result['name'] for result in results] == ['GetState', 'Fail', 'GetState', 'GET scene/test.mujin.dae/', 'GetBody']
+    assert [result['error'] is not None for result in results] == [False, True, False, False, False]
+    assert controller.GetNumCommands()['GetState'] == 2
+
+
+def test_ConfigureStandInServer(controller):
+    records = [
+        {'kind': recording.RECORD_COMMAND, 'time': 1.0, 'thread': 'main', 'duration': duration, 'request': {'taskparameters': {'command': 'Plan'}}, 'response': {'trajectory': 'traj'}}
+        for duration in (0.05, 0.01, 0.02)
+    ]
+    recording.ConfigureStandInServer(records, controller)
+    client = _CreatePlanningClient(controller, usewebapi=False)
+    try:
+        results = recording.TrafficReplayer(records).Replay(client, speed=10.0)
+        assert client.ExecuteCommand({'command': 'Plan'}, timeout=5) == {'trajectory': 'traj'}
+    finally:
+        client.Destroy()
+    assert all(result['error'] is None and result['duration'] >= 0.02 for result in results)
+
+
+def test_RecordNaN(tmpdir):
+    filename = str(tmpdir.join('traffic.jsonl'))
+    with recording.TrafficRecorder(filename) as recorder:
+        record = recorder.StartRecord(recording.RECORD_COMMAND, {'taskparameters': {'command': 'Move', 'values': [float('nan'), float('inf')]}})
+        recorder.EndRecord(record, response={'value': float('-inf')})
+    records = recording.LoadTraffic(filename)
+    values = records[0]['request']['taskparameters']['values']
+    assert math.isnan(values[0]) and values[1] == float('inf')
+    assert records[0]['response'] == {'value': float('-inf')}
+
+
+def test_RecorderFailsToOpen(tmpdir):
+    with pytest.raises((IOError, OSError)):
+        recording.TrafficRecorder(str(tmpdir.join('missing', 'traffic.jsonl')))
+    # __del__ of the partially initialized recorder
+    recording.TrafficRecorder.__new__(recording.TrafficRecorder).Close()
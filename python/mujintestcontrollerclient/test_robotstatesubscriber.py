@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import time
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from mujincontrollerclient import jsoncodec, robotstatesubscriber, zmq  # noqa: E402
+
+
+def test_RobotStateRingBuffer():
+    buffer = robotstatesubscriber.RobotStateRingBuffer(2, capacity=4)
+    assert buffer.GetLatest(3)[0].tolist() == []
+    for index in range(6):
+        buffer.Append(index, [index, -index])
+    timestamps, values = buffer.GetLatest(3)
+    assert timestamps.tolist() == [3, 4, 5]
+    assert values[:, 1].tolist() == [-3, -4, -5]
+
+    outtimestamps = numpy.empty(10)
+    outvalues = numpy.empty((10, 2))
+    timestamps, values = buffer.GetLatest(10, outtimestamps=outtimestamps, outvalues=outvalues)
+    assert timestamps.tolist() == [2, 3, 4, 5]
+    assert values.base is outvalues
+
+
+def test_RobotStateSubscriber():
+    ctx = zmq.Context()
+    publisher = ctx.socket(zmq.PUB)
+    publisher.bind('inproc://test_robotstatesubscriber')
+    subscriber = robotstatesubscriber.RobotStateSubscriber('inproc://test_robotstatesubscriber', 3, capacity=8, ctx=ctx)
+    try:
+        # wait for the subscription to reach the publisher
+        starttime = time.time()
+        while subscriber.buffer.count == 0 and time.time() - starttime < 5:
+            publisher.send(jsoncodec.Dumps({'timestamp': 0, 'jointvalues': [0, 0, 0]}))
+            time.sleep(0.01)
+        for index in range(1, 4):
+            publisher.send(jsoncodec.Dumps({'timestamp': index, 'jointvalues': [index, index, index]}))
+        publisher.send(b'invalid')
+        while subscriber.numerrors == 0 and time.time() - starttime < 5:
+            time.sleep(0.01)
+        timestamps, values = subscriber.GetLatest(3)
+        assert timestamps.tolist() == [1, 2, 3]
+        assert values[-1].tolist() == [3, 3, 3]
+        assert subscriber.numerrors == 1
+    finally:
+        subscriber.Destroy()
+        publisher.close()
+        ctx.destroy()
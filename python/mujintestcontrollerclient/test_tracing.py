@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+import requests_mock
+
+from mujincontrollerclient import APIServerError, jsoncodec, tracing, zmq
+from mujincontrollerclient.controllerclientbase import ControllerClient
+from mujincontrollerclient.planningclient import PlanningControllerClient
+
+
+def test_ParseTraceParent():
+    traceparent = tracing.FormatTraceParent('0af7651916cd43dd8448eb211c80319c', 'b7ad6b7169203331')
+    assert traceparent == '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'
+    assert tracing.ParseTraceParent(traceparent) == ('0af7651916cd43dd8448eb211c80319c', 'b7ad6b7169203331', True)
+    assert tracing.ParseTraceParent('00-xyz-b7ad6b7169203331-01') is None
+    assert tracing.ParseTraceParent(None) is None
+
+
+def test_Tracer():
+    tracer = tracing.Tracer()
+    started = []
+    ended = []
+    tracer.AddSpanHooks(onstart=started.append, onend=ended.append)
+    with tracer.StartSpan('pickcycle', {'cycle': 1}) as root:
+        with tracer.StartSpan('command') as child:
+            assert tracer.GetCurrentSpan() is child
+        with pytest.raises(APIServerError):
+            with tracer.StartSpan('command'):
+                raise APIServerError('failed')
+        assert tracer.GetCurrentSpan() is root
+    assert tracer.GetCurrentSpan() is None
+    assert [span.name for span in started] == ['pickcycle', 'command', 'command']
+    assert [span.attributes['outcome'] for span in ended] == ['ok', 'error', 'ok']
+    assert child.traceid == root.traceid
+    assert child.parentspanid == root.spanid
+    assert root.parentspanid is None
+
+    continued = tracer.StartSpan('remote', traceparent=root.GetTraceParent())
+    assert continued.traceid == root.traceid
+    continued.End()
+
+
+def test_RatioSampler():
+    tracer = tracing.Tracer(samplingratio=0)
+    ended = []
+    tracer.AddSpanHooks(onend=ended.append)
+    with tracer.StartSpan('pickcycle') as root:
+        with tracer.StartSpan('command') as child:
+            child.SetAttribute('command', 'GetState')
+    assert not root.sampled and not child.sampled
+    assert child.attributes == {}
+    assert ended == []
+    assert root.GetTraceParent().endswith('-00')
+
+    sampler = tracing.RatioSampler(0.5)
+    traceids = ['%032x' % (index * 0x1000000) for index in range(256)]
+    decisions = [sampler(traceid, 'command', None) for traceid in traceids]
+    assert decisions == [sampler(traceid, 'command', None) for traceid in traceids]
+    assert sum(decisions) == 128
+
+
+def test_WebClientTracing():
+    with requests_mock.Mocker() as mock:
+        mock.post('http://controller/restartserver/')
+        controllerclient = ControllerClient('http://controller', 'mujin', 'mujin')
+        tracer = tracing.Tracer()
+        ended = []
+        tracer.AddSpanHooks(onend=ended.append)
+        controllerclient.SetTracer(tracer)
+        with tracer.StartSpan('restart') as root:
+            controllerclient.RestartController()
+        traceparent = mock.request_history[0].headers[tracing.TRACEPARENT_HEADER]
+        assert tracing.ParseTraceParent(traceparent) == (root.traceid, ended[0].spanid, True)
+        assert ended[0].attributes['statuscode'] == 200
+        assert ended[0].parentspanid == root.spanid
+
+
+def _RunReplyServer(socket, traceparents, stopevent):
+    while not stopevent.is_set():
+        if socket.poll(20, zmq.POLLIN) != zmq.POLLIN:
+            continue
+        request = jsoncodec.Loads(socket.recv())
+        traceparents.append(request.get(tracing.TRACEPARENT_HEADER))
+        socket.send(jsoncodec.Dumps({'output': {}}))
+
+
+def test_CommandTracing():
+    ctx = zmq.Context()
+    stopevent = threading.Event()
+    socket = ctx.socket(zmq.REP)
+    port = socket.bind_to_random_port('tcp://127.0.0.1')
+    traceparents = []
+    server = threading.Thread(target=_RunReplyServer, args=(socket, traceparents, stopevent))
+    server.start()
+    client = PlanningControllerClient(taskzmqport=port, taskheartbeatport=None, taskheartbeattimeout=None, tasktype='binpicking', scenepk='test.mujin.dae', usewebapi=False, ctx=ctx, controllerurl='http://127.0.0.1', controllerusername='mujin', controllerpassword='mujin')
+    try:
+        client.ExecuteCommand({'command': 'GetState'}, timeout=5)
+        tracer = tracing.Tracer()
+        ended = []
+        tracer.AddSpanHooks(onend=ended.append)
+        client.SetTracer(tracer)
+        with tracer.StartSpan('pickcycle') as root:
+            client.ExecuteCommand({'command': 'GetState'}, timeout=5)
+        assert traceparents[0] is None
+        assert tracing.ParseTraceParent(traceparents[1]) == (root.traceid, ended[0].spanid, True)
+        assert ended[0].attributes['command'] == 'GetState'
+        assert ended[0].attributes['transport'] == 'zmq'
+        assert ended[0].attributes['outcome'] == 'ok'
+        assert ended[0].attributes['payloadsize'] > 0
+    finally:
+        client.Destroy()
+        stopevent.set()
+        server.join()
+        socket.close(linger=0)
+        ctx.destroy()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from mujincontrollerclient import trajectoryutils  # noqa: E402
+
+
+class FakeRobotClient(object):
+    def __init__(self, trajectories):
+        self.trajectories = trajectories
+        self.calls = []
+
+    def GetTrajectoryLog(self, timeout=10, startindex=0, num=0, includejointvalues=False):
+        self.calls.append((startindex, num))
+        if startindex < 0:
+            startindex += len(self.trajectories)
+        return {
+            'total': len(self.trajectories),
+            'trajectories': self.trajectories[startindex:startindex + num if num else None],
+        }
+
+
+def _MakeTrajectory(index, numpoints=3, dof=2):
+    values = []
+    for ipoint in range(numpoints):
+        values += [index] * dof + [ipoint * 0.008]
+    return {'name': 'traj%d' % index, 'timestarted': 1000 + index, 'duration': 0.016, 'numpoints': numpoints, 'timedjointvalues': values}
+
+
+def test_IterTrajectoryLog():
+    client = FakeRobotClient([_MakeTrajectory(index) for index in range(5)])
+    trajectories = list(trajectoryutils.IterTrajectoryLog(client, startindex=-4, pagesize=2))
+    assert [trajectory['name'] for trajectory in trajectories] == ['traj1', 'traj2', 'traj3', 'traj4']
+    assert client.calls == [(-4, 2), (3, 2)]
+    assert trajectories[0]['timedjointvalues'].shape == (3, 3)
+    assert trajectories[0]['timedjointvalues'][:, -1].tolist() == [0, 0.008, 0.016]
+
+
+def test_SaveLoadTrajectories(tmpdir):
+    trajectories = [trajectoryutils.ConvertTrajectory(_MakeTrajectory(index, numpoints=index + 1)) for index in range(3)]
+    filename = str(tmpdir.join('trajectories.npz'))
+    trajectoryutils.SaveTrajectories(filename, trajectories)
+    loaded = trajectoryutils.LoadTrajectories(filename)
+    assert [trajectory['name'] for trajectory in loaded] == ['traj0', 'traj1', 'traj2']
+    for trajectory, loadedtrajectory in zip(trajectories, loaded):
+        assert numpy.array_equal(trajectory['timedjointvalues'], loadedtrajectory['timedjointvalues'])
+        assert trajectory['timestarted'] == loadedtrajectory['timestarted']
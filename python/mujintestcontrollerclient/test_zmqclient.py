@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from mujincontrollerclient import zmqclient
+
+from .fakecontroller import FakeController
+
+
+def _MakeCommand(command):
+    return {'fnname': 'RunCommand', 'taskparams': {'taskparameters': {'command': command}}}
+
+
+@pytest.fixture
+def controller():
+    with FakeController() as controller:
+        yield controller
+
+
+def test_GetPoolStatistics(controller):
+    controller.SetCommandLatency('Slow', 0.2)
+    client = zmqclient.ZmqClient('127.0.0.1', controller.taskzmqport)
+    try:
+        assert client.GetPoolStatistics() == {'numsockets': 0, 'numpollingsockets': 0, 'numavailablesockets': 0, 'opencount': 0, 'closecount': 0, 'acquirecount': 0, 'releasecount': 0}
+
+        # the socket is reused once the reply is received
+        client.SendCommand(_MakeCommand('GetState'), timeout=5)
+        client.SendCommand(_MakeCommand('GetState'), timeout=5)
+        statistics = client.GetPoolStatistics()
+        assert statistics['opencount'] == 1 and statistics['numsockets'] == 1
+        assert statistics['acquirecount'] == 2 and statistics['releasecount'] == 2
+        assert statistics['numpollingsockets'] + statistics['numavailablesockets'] == 1
+
+        # a socket waiting for the reply of a fire and forget command cannot be reused yet
+        for index in range(2):
+            client.SendCommand(_MakeCommand('Slow'), timeout=5, fireandforget=True)
+        statistics = client.GetPoolStatistics()
+        assert statistics['opencount'] == 2 and statistics['numsockets'] == 2
+        assert statistics['numpollingsockets'] >= 1
+        assert statistics['acquirecount'] == statistics['releasecount'] == 4
+        assert statistics['closecount'] == 0
+    finally:
+        client.Destroy()
+
+
+def test_ZmqSocketPoolStatistics(controller):
+    pool = zmqclient.ZmqSocketPool('tcp://127.0.0.1:%d' % controller.taskzmqport)
+    try:
+        socket = pool.AcquireSocket(timeout=1)
+        assert pool.GetStatistics()['acquirecount'] == 1
+        pool.ReleaseSocket(socket, reuse=False)
+        statistics = pool.GetStatistics()
+        assert statistics['opencount'] == statistics['closecount'] == 1
+        assert statistics['releasecount'] == 1 and statistics['numsockets'] == 0
+    finally:
+        pool.Destroy()